@@ -1,7 +1,22 @@
 import time
 import os
-from litellm import completion, token_counter
-from utils import strip_think_tags
+import copy
+import asyncio
+from utils import strip_think_tags, ThinkTagFilter
+from cache import get_response_cache
+from llm_runtime import acompletion_pooled, iterate_sync
+from rate_limit import get_rate_limiter, is_transient_error, max_retries, backoff_delay
+from tokens import count_text_tokens, count_message_tokens, prompt_reduction
+from retrieval import scoped_paper_context
+from paper_digest import PAPER_CONTEXT_MODES, DIGEST_NOTE, format_digest_block, digest_excerpts
+
+def supports_prompt_caching(model: str) -> bool:
+    # litellm is imported on first use (agent construction), not when the UI starts
+    try:
+        from litellm.utils import supports_prompt_caching as litellm_supports_prompt_caching
+    except ImportError:  # Older litellm releases
+        return False
+    return litellm_supports_prompt_caching(model)
 
 # ------------------------------------------------------------------
 # DEFAULT SYSTEM PROMPTS (Fallback)
@@ -47,103 +62,605 @@ Read the Teacher's Feedback. Make highly targeted, localized revisions to your D
 3. **ONLY ENGLISH**: Your response must be purely the review text in English. NO conversational filler.
 """
 
+DEFAULT_MODE3_PATCH_PROMPT = """
+# Role
+Student Reviewer (Adversarial Mode, Patch Revisions).
+
+# Task
+Read the Teacher's Feedback. Fix your Draft Review with the smallest set of targeted edits.
+
+# Directives
+1. **Fix Errors**: 100% strictly eliminate facts/hallucinations criticized by the Teacher.
+2. **Edits Only**: Do NOT repeat the review. Output ONLY a JSON object in a ```json block:
+   {"edits": [
+     {"op": "replace", "section": "<section heading>", "find": "<exact text from the draft>", "text": "<new text>"},
+     {"op": "delete", "section": "<section heading>", "find": "<exact text from the draft>"},
+     {"op": "insert", "section": "<section heading>", "after": "<exact text from the draft, optional>", "text": "<new text>"}
+   ]}
+   Omit "find" to replace or delete a whole section. "find"/"after" must be copied verbatim from the draft.
+3. **ONLY ENGLISH**: All inserted text must be in English.
+"""
+
+# Reviewer panel (Mode 4): each member gets one persona appended to the Student prompt, in order
+DEFAULT_PANEL_PERSONAS = [
+    "Methodology expert: scrutinize assumptions, derivations and whether the method actually supports the claims.",
+    "Experimentalist: scrutinize baselines, datasets, ablations, statistical significance and reproducibility.",
+    "Senior area expert: judge novelty and significance against related work, and flag missing comparisons.",
+    "Clarity reviewer: judge presentation, structure, notation and whether a reader could reimplement the work.",
+]
+
+DEFAULT_PANEL_MERGE_PROMPT = """
+# Role
+Area Chair. You receive several independent reviews of the same paper.
+
+# Task
+Write ONE consolidated review following the same template structure.
+
+# Directives
+1. **Merge, do not invent**: Keep every well-grounded point raised by any reviewer; drop duplicates and anything the paper text does not support.
+2. **Resolve disagreements**: Where reviewers disagree, state the disagreement and side with the evidence in the paper.
+3. **ONLY ENGLISH**: Output only the consolidated Markdown review. NO conversational filler.
+"""
+
+DEFAULT_DIGEST_PROMPT = """
+# Role
+Meticulous research assistant preparing a digest of the paper for reviewers who will only see the digest and a few excerpts.
+
+# Task
+Condense the <original_paper> faithfully. Copy every number exactly as printed and say where it appears. NEVER add facts, numbers or judgements that are not in the paper.
+
+# Output Format (Markdown, English ONLY)
+## Claims
+- One line per main contribution or claim.
+## Reported Numbers
+- metric: value (setting/dataset) [Section/Table/Figure]
+## Datasets
+- Name, size or split if stated.
+## Baselines
+- Compared methods, and which results they are compared on.
+## Section Summaries
+- **Section title**: 1-3 sentences.
+NO conversational filler.
+"""
+
+DEFAULT_PANEL_SELECT_PROMPT = """
+# Role
+Area Chair. You receive several independent reviews of the same paper.
+
+# Task
+Pick the single best review: the most accurate (no hallucinated facts), specific and actionable one.
+
+# Output Format (English ONLY)
+2-4 sentences justifying the choice, then ONLY this token on the last line: `[Best: Reviewer N]`
+"""
+
 # ------------------------------------------------------------------
 # AGENT CLASSES
 # ------------------------------------------------------------------
 
+def build_paper_prefix(paper_text: str) -> str:
+    """
+    The paper block that opens every agent's system message. It must stay byte-identical
+    across roles and rounds so providers can serve it from their prompt prefix cache.
+    """
+    return f"### Context Data\n<original_paper>\n{paper_text}\n</original_paper>"
+
+def parse_fallback_models(spec: str) -> list:
+    """
+    Parse an ordered fallback list such as "openai/gpt-4o-mini, openai/backup@https://backup.example/v1"
+    into [{"model_name", "base_url"}]. Entries without "@base_url" reuse the primary endpoint.
+    """
+    fallbacks = []
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        model_name, _, base_url = entry.partition("@")
+        fallbacks.append({"model_name": model_name.strip(), "base_url": base_url.strip() or None})
+    return fallbacks
+
+CASCADE_ROLES = ("student", "teacher", "approval", "digest")
+
+def parse_model_cascade(spec: str) -> list:
+    """
+    Parse per-role, per-round model overrides such as
+    "student=openai/gpt-4o-mini, teacher:1-2=openai/gpt-4o-mini, approval=openai/gpt-4o"
+    into [{"role", "first_round", "last_round", "model_name", "base_url"}].
+    Rounds are "N", "N-M" or "N+" (omitted: every round); models may carry "@base_url".
+    The "approval" model confirms Approved verdicts given by a cheaper Teacher model and
+    re-evaluates replies without a well-formed verdict (default: the primary model);
+    the "digest" model writes the one-time paper digest in digest context mode.
+    Rounds without a matching rule use the primary model.
+    """
+    cascade = []
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        target, _, model = entry.partition("=")
+        role, _, rounds = target.strip().lower().partition(":")
+        if role not in CASCADE_ROLES or not model.strip():
+            raise Exception(f"Invalid model cascade entry: {entry!r}")
+        first, last = 1, None
+        try:
+            if rounds.endswith("+"):
+                first = int(rounds[:-1])
+            elif "-" in rounds:
+                first, last = (int(r) for r in rounds.split("-", 1))
+            elif rounds:
+                first = last = int(rounds)
+        except ValueError:
+            raise Exception(f"Invalid rounds in model cascade entry: {entry!r}")
+        model_name, _, base_url = model.strip().partition("@")
+        cascade.append({
+            "role": role, "first_round": first, "last_round": last,
+            "model_name": model_name.strip(), "base_url": base_url.strip() or None
+        })
+    return cascade
+
+def cascade_rule(cascade: list, role: str, round_num: int) -> dict:
+    """First cascade rule covering `role` in `round_num`, or None."""
+    for rule in cascade:
+        if rule["role"] == role and rule["first_round"] <= round_num and (rule["last_round"] is None or round_num <= rule["last_round"]):
+            return rule
+    return None
+
+def _add_tokens(counted: tuple, extra: int) -> tuple:
+    tokens, estimated = counted
+    return tokens + (extra or 0), estimated
+
+def _usage_to_dict(usage) -> dict:
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    return dict(usage) if isinstance(usage, dict) else None
+
 class BaseAgent:
-    def __init__(self, model_name: str, api_key: str, base_url: str = None, group_id: str = None):
+    # Role name used to look up this agent's entries in the model cascade
+    cascade_role = None
+
+    def __init__(self, model_name: str, api_key: str, base_url: str = None, group_id: str = None, response_cache=None,
+                 fallbacks: list = None, cascade: list = None, paper_context: str = None):
         self.model_name = model_name
         self.api_key = api_key
         self.base_url = base_url
         self.group_id = group_id
+        # Optional ResponseCache; defaults to the LLM_CACHE_MODE-configured one (None when off)
+        self.response_cache = response_cache if response_cache is not None else get_response_cache()
+        # Ordered backup endpoints ({"model_name", "base_url", "api_key"}), tried once the primary gives up
+        self.fallbacks = fallbacks if fallbacks is not None else parse_fallback_models(os.getenv("LLM_FALLBACK_MODELS"))
+        # Per-role/per-round model overrides (see parse_model_cascade)
+        self.cascade = cascade if cascade is not None else parse_model_cascade(os.getenv("LLM_MODEL_CASCADE"))
+        self.last_usage = None
+        self.last_cache_status = None
+        # Limiter wait, retries and the model that actually answered, for the last call
+        self.last_call_stats = {}
+        # How the paper context of the last built prompt was scoped (empty for the full paper)
+        self.last_context_stats = {}
+        # <think> / reasoning_content text of the last call, kept apart from the answer stream
+        self.last_reasoning = ""
+        # Extra sampling parameters (e.g. seed, temperature) sent with every request
+        self.sampling = {}
+        # "full" paper text in every prompt, or "digest": the cached paper digest plus relevant excerpts
+        # (see paper_digest.py); the pipeline attaches the digest with with_digest()
+        self.paper_context = paper_context or os.getenv("PAPER_CONTEXT", "full")
+        if self.paper_context not in PAPER_CONTEXT_MODES:
+            raise Exception(f"Unknown paper context mode: {self.paper_context}")
+        self.paper_digest = None
+        try:
+            self.cache_control = supports_prompt_caching(model_name) and os.getenv("PROMPT_CACHING", "1") != "0"
+        except Exception:
+            self.cache_control = False
 
-    def _call_llm_stream(self, messages: list):
+    def with_model(self, model_name: str, base_url: str = None):
+        """A copy of this agent calling `model_name` (at `base_url`, default: the same endpoint)."""
+        if model_name == self.model_name and (base_url or self.base_url) == self.base_url:
+            return self
+        agent = copy.copy(self)
+        agent.model_name = model_name
+        agent.base_url = base_url or self.base_url
+        agent.last_usage, agent.last_cache_status = None, None
+        agent.last_call_stats, agent.last_context_stats = {}, {}
+        agent.last_reasoning = ""
+        try:
+            agent.cache_control = supports_prompt_caching(model_name) and os.getenv("PROMPT_CACHING", "1") != "0"
+        except Exception:
+            agent.cache_control = False
+        return agent
+
+    def for_round(self, round_num: int):
+        """The agent to run `round_num` with: self, or a copy on the model the cascade assigns to this role and round."""
+        rule = cascade_rule(self.cascade, self.cascade_role, round_num)
+        return self.with_model(rule["model_name"], rule["base_url"]) if rule else self
+
+    def with_sampling(self, **params):
+        """A copy of this agent sending the given sampling parameters (None values are dropped)."""
+        agent = copy.copy(self)
+        agent.sampling = {**self.sampling, **{k: v for k, v in params.items() if v is not None}}
+        return agent
+
+    def with_digest(self, digest: str):
+        """A copy of this agent that sends `digest` plus relevant excerpts instead of the full paper."""
+        agent = copy.copy(self)
+        agent.paper_digest = digest
+        return agent
+
+    def digest_agent(self):
+        """The agent that writes the paper digest: the cascade's "digest" model, else this one."""
+        rule = cascade_rule(self.cascade, "digest", 1)
+        return self.with_model(rule["model_name"], rule["base_url"]) if rule else self
+
+    def digest_paper_stream(self, paper_text: str, system_prompt: str = None) -> tuple:
+        """Returns (sync text-chunk generator, messages) for the one-time digest pre-pass."""
+        messages = self._build_messages(
+            paper_text, system_prompt or DEFAULT_DIGEST_PROMPT, "### Instruction\nWrite the digest of the <original_paper>."
+        )
+        self.last_context_stats = {}
+        return self._call_llm_stream(messages), messages
+
+    def primary(self):
+        """A copy that runs every round on the primary model (cascade approval rules are kept)."""
+        agent = copy.copy(self)
+        agent.cascade = [rule for rule in self.cascade if rule["role"] == "approval"]
+        return agent
+
+    def _build_messages(self, paper_text: str, system_prompt: str, user_prompt: str) -> list:
         """
-        Calls LiteLLM with stream=True and yields the text chunks.
+        Stable-prefix layout: [paper block][role system prompt] as the system message, then the
+        per-round user content. Everything that changes between calls comes after the paper.
         """
-        if self.group_id:
-            os.environ["MINIMAX_GROUP_ID"] = self.group_id
-            
+        paper_prefix = build_paper_prefix(paper_text)
+        if self.cache_control:
+            system_content = [
+                {"type": "text", "text": paper_prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": system_prompt.strip()}
+            ]
+        else:
+            system_content = f"{paper_prefix}\n\n{system_prompt.strip()}"
+        return [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _scoped_messages(self, mode: str, stats: dict, paper_text: str, system_prompt: str, user_prompt: str,
+                         paper_block: str, scoped_user_prompt: str) -> list:
+        """
+        _build_messages with `paper_block` (retrieved passages, or the paper digest) in place of the full
+        paper and `scoped_user_prompt` in place of `user_prompt`. The prompt size against the same request
+        with the full paper goes into last_context_stats as {"mode", **stats, **prompt_reduction(...)}.
+        """
+        messages = self._build_messages(paper_block, system_prompt, scoped_user_prompt)
+        full_tokens = count_message_tokens(self.model_name, self._build_messages(paper_text, system_prompt, user_prompt))[0]
+        prompt_tokens = count_message_tokens(self.model_name, messages)[0]
+        self.last_context_stats = {"mode": mode, **stats, **prompt_reduction(full_tokens, prompt_tokens)}
+        return messages
+
+    def _digest_messages(self, paper_text: str, system_prompt: str, user_prompt: str, query_text: str) -> list:
+        """Digest-plus-excerpts messages: the digest is the (stable) paper block, the passages relevant to `query_text` open the user message."""
+        excerpts, stats = digest_excerpts(paper_text, query_text)
+        return self._scoped_messages(
+            "digest", stats, paper_text, system_prompt, user_prompt,
+            format_digest_block(self.paper_digest), f"{excerpts}\n\n{user_prompt}\n{DIGEST_NOTE}"
+        )
+
+    def _request_args(self, messages: list) -> dict:
         args = {
             "model": self.model_name,
             "messages": messages,
             "api_key": self.api_key,
-            "stream": True
+            "stream": True,
+            # Final chunk carries usage (incl. cached prompt tokens) where the provider supports it
+            "stream_options": {"include_usage": True},
+            "drop_params": True,
+            **self.sampling
         }
         if self.base_url:
             args["api_base"] = self.base_url
-            
-        try:
-            response_stream = completion(**args)
-            for chunk in response_stream:
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    if delta.content:
-                        yield delta.content
-        except Exception as e:
-            raise Exception(f"LiteLLM API Error/Connection Error: {str(e)}")
+        if self.group_id:
+            # Sent per request; never written to the process-wide environment
+            args["extra_headers"] = {"GroupId": self.group_id}
+        return args
+
+    def _endpoint_args(self, args: dict) -> list:
+        """Request args for the primary endpoint followed by each fallback, in order."""
+        endpoints = [args]
+        for fallback in self.fallbacks:
+            fallback_args = dict(args, model=fallback["model_name"], api_key=fallback.get("api_key") or self.api_key)
+            base_url = fallback.get("base_url") or self.base_url
+            fallback_args.pop("api_base", None)
+            if base_url:
+                fallback_args["api_base"] = base_url
+            endpoints.append(fallback_args)
+        return endpoints
+
+    async def _acall_llm_stream(self, messages: list):
+        """
+        Calls LiteLLM asynchronously with stream=True and yields the answer text chunks.
+        <think> blocks (even when a tag is split across chunks) and provider reasoning_content
+        are diverted into self.last_reasoning, so renderers, saved files and later prompts only
+        see the answer. With a response cache, identical requests are replayed from disk instead.
+        Every request waits on the shared per-model rate limiter; transient errors raised
+        before the first chunk are retried with jittered exponential backoff, then the
+        fallback endpoints are tried in order. Errors after streaming has started are raised.
+        """
+        args = self._request_args(messages)
+        self.last_usage = None
+        self.last_cache_status = None
+        self.last_call_stats = {}
+        self.last_reasoning = ""
+        cache = self.response_cache
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(args)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                self.last_cache_status = "hit"
+                self.last_usage = entry.get("usage")
+                # Entries recorded before reasoning was split off may still contain <think> blocks
+                think_filter = ThinkTagFilter()
+                reasoning = []
+                async for text in cache.areplay(entry):
+                    answer, thought = think_filter.feed(text)
+                    reasoning.append(thought)
+                    if answer:
+                        yield answer
+                answer, thought = think_filter.flush()
+                self.last_reasoning = "".join(reasoning) + thought
+                if answer:
+                    yield answer
+                return
+            self.last_cache_status = "miss"
+            if cache.mode == "replay_only":
+                raise Exception(f"LLM response cache miss in replay-only mode (key {cache_key[:12]})")
+
+        # Tokenizing a whole paper takes a while; keep it off the shared event loop
+        est_tokens = (await asyncio.to_thread(count_message_tokens, self.model_name, messages))[0]
+        stats = {"limiter_wait_s": 0.0, "retries": 0}
+        self.last_call_stats = stats
+        retries_per_endpoint = max_retries()
+        errors = []
+        for endpoint_args in self._endpoint_args(args):
+            limiter = get_rate_limiter(endpoint_args["model"], endpoint_args.get("api_base"))
+            for attempt in range(retries_per_endpoint + 1):
+                stats["limiter_wait_s"] = round(stats["limiter_wait_s"] + await limiter.acquire(est_tokens), 3)
+                recorded = []
+                reasoning = []
+                think_filter = ThinkTagFilter()
+                # All generated text (for the limiter) vs. answer text already handed to the caller
+                completion_chars = answer_chars = 0
+                start_time = time.time()
+                try:
+                    response_stream = await acompletion_pooled(**endpoint_args)
+                    async for chunk in response_stream:
+                        usage = getattr(chunk, "usage", None)
+                        if usage:
+                            self.last_usage = _usage_to_dict(usage)
+                        if chunk.choices and len(chunk.choices) > 0:
+                            delta = chunk.choices[0].delta
+                            reasoning_content = getattr(delta, "reasoning_content", None)
+                            if reasoning_content:
+                                completion_chars += len(reasoning_content)
+                                reasoning.append(reasoning_content)
+                            if delta.content:
+                                completion_chars += len(delta.content)
+                                answer, thought = think_filter.feed(delta.content)
+                                if thought:
+                                    reasoning.append(thought)
+                                if answer:
+                                    answer_chars += len(answer)
+                                    if cache_key:
+                                        recorded.append([round(time.time() - start_time, 4), answer])
+                                    yield answer
+                    answer, thought = think_filter.flush()
+                    reasoning.append(thought)
+                    if answer:
+                        if cache_key:
+                            recorded.append([round(time.time() - start_time, 4), answer])
+                        yield answer
+                except Exception as e:
+                    if answer_chars:
+                        # Part of the response has already been shown; a silent retry would duplicate it
+                        raise Exception(f"LiteLLM API Error/Connection Error: {str(e)}")
+                    errors.append(f"{endpoint_args['model']}: {str(e)}")
+                    if is_transient_error(e) and attempt < retries_per_endpoint:
+                        stats["retries"] += 1
+                        await asyncio.sleep(backoff_delay(attempt))
+                        continue
+                    break
+
+                self.last_reasoning = "".join(reasoning)
+                limiter.record_completion((self.last_usage or {}).get("completion_tokens") or completion_chars // 4)
+                if endpoint_args is not args:
+                    stats["model"] = endpoint_args["model"]
+                    stats["fallback_errors"] = errors
+                # Only complete streams from the endpoint the key describes are recorded: a fallback's
+                # answer stored under the primary key would be replayed after the primary recovers
+                if cache_key and endpoint_args is args:
+                    cache.put(cache_key, endpoint_args["model"], recorded, self.last_usage)
+                return
+
+        raise Exception(f"LiteLLM API Error/Connection Error: {errors[-1] if errors else 'no endpoint available'}")
+
+    def _call_llm_stream(self, messages: list):
+        """
+        Sync wrapper over _acall_llm_stream: yields the same text chunks as a plain generator,
+        driven on the shared background event loop.
+        """
+        return iterate_sync(self._acall_llm_stream(messages))
+
+    def _cached_prompt_tokens(self) -> int:
+        """Prompt tokens served from the provider's prefix cache in the last call, or None if not reported."""
+        usage = self.last_usage
+        if usage is None:
+            return None
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if cached is None:
+            # Anthropic-style usage
+            cached = usage.get("cache_read_input_tokens")
+        return cached
 
     def calculate_tokens(self, messages: list, response_text: str) -> dict:
         """
-        Since we stream, we might not get token usage directly from the endpoint in a standard way across all providers.
-        We can use litellm's local token_counter as an accurate estimation.
+        Token counts of the last call. Provider-reported usage (requested via stream_options)
+        is used as is; whatever the provider did not report is counted locally with memoized
+        tokenizer calls, or the 1 token ≈ 4 chars heuristic if the model has no tokenizer.
+        `prompt_source` / `completion_source` say where each number came from
+        ("provider", "tokenizer" or "heuristic"); `measured` is True only if both are provider-reported.
         """
-        try:
-            prompt_tokens = token_counter(model=self.model_name, messages=messages)
-            completion_tokens = token_counter(model=self.model_name, text=response_text)
-            return {
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": prompt_tokens + completion_tokens
-            }
-        except Exception:
-            # Fallback if the token counter doesn't support the raw model name 
-            # (e.g., custom openai endpoints might fail exact tokenizer lookup)
-            return {
-                "prompt_tokens": len(str(messages)) // 4,
-                "completion_tokens": len(response_text) // 4,
-                "total_tokens": (len(str(messages)) + len(response_text)) // 4,
-                "note": "Estimated assuming 1 token ≈ 4 chars"
-            }
+        usage = self.last_usage or {}
+        sources = {}
+        counts = {}
+        reasoning_tokens, reasoning_estimated = None, False
+        if self.last_reasoning:
+            reasoning_tokens, reasoning_estimated = count_text_tokens(self.model_name, self.last_reasoning)
+        for field, count_local in (
+            ("prompt_tokens", lambda: count_message_tokens(self.model_name, messages)),
+            # The answer stream no longer carries the reasoning, but it was generated (and billed)
+            ("completion_tokens", lambda: _add_tokens(count_text_tokens(self.model_name, response_text), reasoning_tokens))
+        ):
+            source = field.split("_")[0] + "_source"
+            if usage.get(field) is not None:
+                counts[field], sources[source] = usage[field], "provider"
+            else:
+                tokens, estimated = count_local()
+                counts[field], sources[source] = tokens, "heuristic" if estimated else "tokenizer"
+
+        tokens = {
+            "prompt_tokens": counts["prompt_tokens"],
+            "completion_tokens": counts["completion_tokens"],
+            "total_tokens": counts["prompt_tokens"] + counts["completion_tokens"],
+            **sources,
+            "measured": all(v == "provider" for v in sources.values())
+        }
+        cached = self._cached_prompt_tokens()
+        if cached is not None:
+            tokens["cached_prompt_tokens"] = cached
+            tokens["uncached_prompt_tokens"] = max(0, counts["prompt_tokens"] - cached)
+        reported_reasoning = (usage.get("completion_tokens_details") or {}).get("reasoning_tokens")
+        if reported_reasoning:
+            tokens["reasoning_tokens"], tokens["reasoning_source"] = reported_reasoning, "provider"
+        elif reasoning_tokens is not None:
+            tokens["reasoning_tokens"] = reasoning_tokens
+            tokens["reasoning_source"] = "heuristic" if reasoning_estimated else "tokenizer"
+        return tokens
 
 class StudentReviewerAgent(BaseAgent):
-    def generate_review_stream(self, paper_text: str, template_text: str, system_prompt: str, previous_feedback: str = None, mode3_prompt: str = None, previous_draft: str = None) -> tuple:
+    cascade_role = "student"
+
+    def __init__(self, *args, memory_top_k: int = None, **kwargs):
+        """
+        `memory_top_k` past approved reviews and Teacher criticisms of similar papers are recalled
+        for the first draft (see review_memory.py). Defaults to REVIEW_MEMORY_TOP_K, then 0 (off).
+        """
+        super().__init__(*args, **kwargs)
+        self.memory_top_k = memory_top_k if memory_top_k is not None else int(os.getenv("REVIEW_MEMORY_TOP_K", 0))
+
+    def build_review_messages(self, paper_text: str, template_text: str, system_prompt: str, previous_feedback: str = None, mode3_prompt: str = None, previous_draft: str = None, revision_mode: str = "full", memory_context: str = "") -> list:
+        """
+        `revision_mode="patch"` asks for JSON section edits against the previous draft
+        (see review_patch) instead of the full revised review.
+        `memory_context` (a <review_memory> block) is only used for a first draft.
+        """
         if previous_feedback and previous_draft:
             # Adversarial Mode (Mode 3, Round >= 2)
-            sys_msg = mode3_prompt.strip() if mode3_prompt else DEFAULT_MODE3_PROMPT.strip()
-            messages = [{"role": "system", "content": sys_msg}]
-            
             clean_draft = strip_think_tags(previous_draft)
             clean_feedback = strip_think_tags(previous_feedback)
             
-            user_prompt = f"### Context Data\n"
-            user_prompt += f"<original_paper>\n{paper_text}\n</original_paper>\n\n"
-            user_prompt += f"<your_previous_draft>\n{clean_draft}\n</your_previous_draft>\n\n"
+            user_prompt = f"<your_previous_draft>\n{clean_draft}\n</your_previous_draft>\n\n"
             user_prompt += f"<teacher_feedback>\n{clean_feedback}\n</teacher_feedback>\n\n"
-            user_prompt += "### Instruction\nPlease provide the FULL revised Markdown review in English, applying the teacher's feedback to your draft."
-            messages.append({"role": "user", "content": user_prompt})
-        else:
-            # Standard Mode 1 or Mode 3 Round 1
-            messages = [{"role": "system", "content": system_prompt.strip()}]
-            user_prompt = f"### Context Data\n<paper_text>\n{paper_text}\n</paper_text>\n\n"
-            user_prompt += f"### Instruction\nCritique the paper adhering to the following template:\n<template>\n{template_text}\n</template>\n\n"
-            messages.append({"role": "user", "content": user_prompt})
-            
+            if revision_mode == "patch":
+                sys_msg = DEFAULT_MODE3_PATCH_PROMPT.strip()
+                user_prompt += "### Instruction\nPlease output ONLY the JSON edits that apply the teacher's feedback to your draft."
+            else:
+                sys_msg = mode3_prompt.strip() if mode3_prompt else DEFAULT_MODE3_PROMPT.strip()
+                user_prompt += "### Instruction\nPlease provide the FULL revised Markdown review in English, applying the teacher's feedback to your draft."
+            if self.paper_digest:
+                return self._digest_messages(paper_text, sys_msg, user_prompt, clean_feedback)
+            return self._build_messages(paper_text, sys_msg, user_prompt)
+
+        # Standard Mode 1 or Mode 3 Round 1
+        user_prompt = f"{memory_context}\n\n" if memory_context else ""
+        user_prompt += f"### Instruction\nCritique the <original_paper> adhering to the following template:\n<template>\n{template_text}\n</template>\n\n"
+        if self.paper_digest:
+            # The template headings alone rarely make useful queries; the digest's claims and numbers do
+            return self._digest_messages(paper_text, system_prompt, user_prompt, f"{template_text}\n{self.paper_digest}")
+        return self._build_messages(paper_text, system_prompt, user_prompt)
+
+    def generate_review_stream(self, *args, **kwargs) -> tuple:
+        """Returns (sync text-chunk generator, messages). Takes the same arguments as build_review_messages."""
+        messages = self.build_review_messages(*args, **kwargs)
         return self._call_llm_stream(messages), messages
 
+    def agenerate_review_stream(self, *args, **kwargs) -> tuple:
+        """Async variant: returns (async text-chunk generator, messages)."""
+        messages = self.build_review_messages(*args, **kwargs)
+        return self._acall_llm_stream(messages), messages
+
 class TeacherEvaluatorAgent(BaseAgent):
-    def evaluate_review_stream(self, paper_text: str, draft_review: str, system_prompt: str) -> tuple:
-        messages = [
-            {"role": "system", "content": system_prompt.strip()}
-        ]
-        
+    cascade_role = "teacher"
+
+    def __init__(self, *args, context_mode: str = None, retrieval_top_k: int = None, **kwargs):
+        """
+        `context_mode` is "full" (the whole truncated paper every round) or "retrieval" (only
+        the BM25 top-k passages relevant to the current draft, see retrieval.py). Defaults to
+        TEACHER_CONTEXT, then "full".
+        """
+        super().__init__(*args, **kwargs)
+        self.context_mode = context_mode or os.getenv("TEACHER_CONTEXT", "full")
+        if self.context_mode not in ("full", "retrieval"):
+            raise Exception(f"Unknown Teacher context mode: {self.context_mode}")
+        self.retrieval_top_k = retrieval_top_k
+
+    def build_evaluation_messages(self, paper_text: str, draft_review: str, system_prompt: str, grounding_hints: str = "") -> list:
+        """`grounding_hints` is the local pre-check's list of unmatched claims (see grounding.py), if any."""
         clean_draft = strip_think_tags(draft_review)
         
-        user_prompt = f"### Context Data\n<original_paper>\n{paper_text}\n</original_paper>\n\n"
-        user_prompt += f"<current_draft_review>\n{clean_draft}\n</current_draft_review>\n\n"
+        user_prompt = f"<current_draft_review>\n{clean_draft}\n</current_draft_review>\n\n"
+        if grounding_hints:
+            user_prompt += f"{grounding_hints}\n\n"
         user_prompt += "### Instruction\nPlease critique the <current_draft_review> against the <original_paper> for hallucinations and logical flaws, and provide actionable points."
-        
-        messages.append({"role": "user", "content": user_prompt})
-        
+
+        self.last_context_stats = {}
+        if self.paper_digest:
+            return self._digest_messages(paper_text, system_prompt, user_prompt, clean_draft)
+        if self.context_mode == "retrieval":
+            excerpts, stats = scoped_paper_context(paper_text, clean_draft, self.retrieval_top_k)
+            return self._scoped_messages(
+                "retrieval", stats, paper_text, system_prompt, user_prompt, excerpts, user_prompt + (
+                    "\nThe <original_paper> block only holds the passages retrieved for this draft; \"[...]\" marks omitted text. "
+                    "Do not call a claim hallucinated merely because its support is not among these passages."
+                )
+            )
+        return self._build_messages(paper_text, system_prompt, user_prompt)
+
+    def approval_agent(self, round_num: int):
+        """The model that has the final word in `round_num`: the cascade's approval model, else the primary one."""
+        rule = cascade_rule(self.cascade, "approval", round_num)
+        return self.with_model(rule["model_name"], rule["base_url"]) if rule else self
+
+    def evaluate_review_stream(self, paper_text: str, draft_review: str, system_prompt: str, grounding_hints: str = "") -> tuple:
+        """Returns (sync text-chunk generator, messages)."""
+        messages = self.build_evaluation_messages(paper_text, draft_review, system_prompt, grounding_hints)
+        return self._call_llm_stream(messages), messages
+
+    def aevaluate_review_stream(self, paper_text: str, draft_review: str, system_prompt: str, grounding_hints: str = "") -> tuple:
+        """Async variant: returns (async text-chunk generator, messages)."""
+        messages = self.build_evaluation_messages(paper_text, draft_review, system_prompt, grounding_hints)
+        return self._acall_llm_stream(messages), messages
+
+    def build_panel_messages(self, paper_text: str, reviews: list, system_prompt: str) -> list:
+        """Area-chair prompt over the panel's reviews, given as [(reviewer_number, review_text)]."""
+        user_prompt = "".join(
+            f"<review reviewer=\"{n}\">\n{strip_think_tags(text)}\n</review>\n\n" for n, text in reviews
+        )
+        user_prompt += "### Instruction\nCompare the reviews above against the <original_paper> as instructed."
+        self.last_context_stats = {}
+        if self.paper_digest:
+            return self._digest_messages(paper_text, system_prompt, user_prompt, "\n".join(text for _, text in reviews))
+        return self._build_messages(paper_text, system_prompt, user_prompt)
+
+    def merge_reviews_stream(self, paper_text: str, reviews: list, system_prompt: str) -> tuple:
+        """Returns (sync text-chunk generator, messages)."""
+        messages = self.build_panel_messages(paper_text, reviews, system_prompt)
         return self._call_llm_stream(messages), messages
@@ -1,16 +1,26 @@
 import streamlit as st
 import os
+import copy
 import time
+import hashlib
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from datetime import datetime
 from utils import (
-    parse_uploaded_file, truncate_text, generate_output_filename, 
-    save_review, create_session_folder, save_origin_file, save_metadata, 
-    format_file_link, strip_think_tags
+    parse_file, create_session_folder, save_origin_file, format_file_link
 )
 from agents import (
     StudentReviewerAgent, TeacherEvaluatorAgent, 
-    DEFAULT_STUDENT_PROMPT, DEFAULT_TEACHER_PROMPT, DEFAULT_MODE3_PROMPT
+    DEFAULT_STUDENT_PROMPT, DEFAULT_TEACHER_PROMPT, DEFAULT_MODE3_PROMPT, parse_fallback_models, parse_model_cascade
 )
+from cache import get_text_cache
+from truncation import truncate_paper, extraction_char_limit
+from pipeline import (
+    run_mode1, run_mode2, run_mode3, run_panel, resume_mode3, find_resumable_sessions, finalize_session, DEFAULT_TEMPLATE_TEXT
+)
+from tracing import SessionTrace
+from job_queue import JobQueue, save_job_upload, read_live_output
+from batch_review import MODES
 from dotenv import load_dotenv
 
 # Load environment variables securely from .env file
@@ -69,6 +79,120 @@ def log_to_console(msg: str):
     ts = time.strftime("%H:%M:%S")
     st.session_state.logs.append(f"[{ts}] {msg}")
 
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    return JobQueue()
+
+# ------------------------------------------------------------------
+# CACHED RESOURCES
+# ------------------------------------------------------------------
+# Streamlit re-executes this script on every interaction. Agents and parsed
+# uploads are kept across reruns (and runs), keyed by config and file hash.
+
+@st.cache_resource(max_entries=8)
+def get_agents(model_name: str, api_key: str, base_url: str, group_id: str, fallback_models: str,
+               model_cascade: str, teacher_context: str, memory_top_k: int, paper_context: str) -> tuple:
+    """Student/Teacher agents for one provider config, built once (model capability lookups, cache setup)."""
+    fallbacks = parse_fallback_models(fallback_models)
+    cascade = parse_model_cascade(model_cascade)
+    return (
+        StudentReviewerAgent(model_name, api_key, base_url or None, group_id or None, fallbacks=fallbacks, cascade=cascade,
+                             memory_top_k=memory_top_k, paper_context=paper_context),
+        TeacherEvaluatorAgent(model_name, api_key, base_url or None, group_id or None, fallbacks=fallbacks,
+                              context_mode=teacher_context, cascade=cascade, paper_context=paper_context)
+    )
+
+def make_agents(*config) -> tuple:
+    """Per-run copies of the cached agents, so runs never share per-call state (usage, reasoning)."""
+    student_agent, teacher_agent = get_agents(*config)
+    return copy.copy(student_agent), copy.copy(teacher_agent)
+
+def upload_sha256(uploaded_file) -> str:
+    # Hashes the upload's buffer in place (getvalue() could copy it)
+    with uploaded_file.getbuffer() as view:
+        return hashlib.sha256(view).hexdigest()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_upload_text(file_sha256: str, max_chars: int, _saved_path: str, _call_stats: dict) -> str:
+    _call_stats["parsed"] = True
+    return parse_file(_saved_path, get_text_cache(), _call_stats, max_chars=max_chars, sha256_hex=file_sha256)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_truncated_paper(paper_sha256: str, model_name: str, _paper_text: str) -> tuple:
+    return truncate_paper(_paper_text, model_name)
+
+def parse_upload(uploaded_file, saved_path: str, cache_stats: dict, max_chars: int = None) -> str:
+    """
+    parse_file on the upload's saved origin copy, memoized by content hash for the server process.
+    Uploads served from memory count as "memo_hits" in cache_stats (the disk TextCache is not consulted then).
+    """
+    call_stats = {}
+    text = load_upload_text(upload_sha256(uploaded_file), max_chars, saved_path, call_stats)
+    if not call_stats.pop("parsed", False):
+        call_stats = {"memo_hits": 1}
+    for outcome, count in call_stats.items():
+        cache_stats[outcome] = cache_stats.get(outcome, 0) + count
+    return text
+
+def make_mode3_renderer(stream_container):
+    """Renders each Mode 3 turn in its own expander, under one header per round."""
+    rendered_rounds = set()
+
+    def render_mode3(agent_role, round_num, stream_generator):
+        with stream_container:
+            if round_num not in rendered_rounds:
+                rendered_rounds.add(round_num)
+                st.divider()
+                st.subheader(f"🔄 Iteration Round {round_num}")
+            if agent_role == "Student":
+                label = f"🤔 🎓 Round {round_num}: Student Generation (Click to collapse)"
+            else:
+                label = f"🤔 🧑‍🏫 Round {round_num}: Teacher Evaluation (Click to collapse)"
+            with st.expander(label, expanded=True):
+                return st.write_stream(stream_generator)
+    return render_mode3
+
+def make_panel_renderer(panel_size: int):
+    """
+    Renders the panel's reviewers side by side, one column each, and the Area Chair below them.
+    Reviewers stream from worker threads, which get this script run's context attached.
+    """
+    ctx = get_script_run_ctx()
+    columns = st.columns(panel_size)
+    for n, column in enumerate(columns, start=1):
+        column.markdown(f"**🎓 Reviewer {n}**")
+    chair_container = st.container()
+
+    def render_panel(agent_role, round_num, stream_generator):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        if agent_role == "Chair":
+            return chair_container.expander("🧑‍⚖️ Area Chair (Click to collapse)", expanded=True).write_stream(stream_generator)
+        n = int(agent_role.split()[-1])
+        return columns[n - 1].write_stream(stream_generator)
+    return render_panel
+
+def show_mode3_result(result: dict):
+    if result["status"] == "approved":
+        st.balloons()
+        st.success(f"🎉 恭喜！审稿过程在第 {result['round']} 轮正式通过 (Passed)！")
+        st.session_state.final_result = {
+            "text": result["text"],
+            "filename": result["filename"],
+            "label": "📥 Download Final Approved Review (.md)"
+        }
+    elif result["status"] == "error":
+        if result["error_agent"] == "Student":
+            st.error(f"Student Agent Generation Error: {result['error']}")
+        else:
+            st.error(f"Teacher Evaluator API Error: {result['error']}")
+        st.error("🚨 Adversarial iteration was aborted due to critical API errors. Please check your network or provider limits, then use ♻️ Resume Session to continue.")
+    elif result["status"] == "stalled":
+        st.warning(f"⏹️ Stopped at round {result['round']}: the review stopped improving ({result['stop_reason']}). The last draft is still Needs Revision; ♻️ Resume Session runs another round.")
+    elif result["status"] == "budget_exhausted":
+        st.warning(f"⏹️ Stopped at round {result['round']}: another round would exceed the session budget ({result['stop_reason']}). The last draft is still Needs Revision.")
+    else:
+        st.warning(f"⚠️ Adversarial mode reached the maximum iteration limit ({result['max_iters']}) without passing the Teacher's review (Status: Needs Revision).")
+
 # ------------------------------------------------------------------
 # GLOBAL CONFIGURATION EXPANDER
 # ------------------------------------------------------------------
@@ -84,11 +208,26 @@ with st.expander("⚙️ Provider & Model Configuration", expanded=True):
         base_url = st.text_input("Base URL (Optional)", value=os.getenv("BASE_URL", "https://api.minimax.chat/v1"), help="Custom API Endpoint")
     with col_c4:
         group_id = st.text_input("Group ID (Optional)", value=os.getenv("GROUP_ID", ""), help="Required only for some Minimax endpoints")
+    fallback_models = st.text_input(
+        "Fallback Models (Optional)", value=os.getenv("LLM_FALLBACK_MODELS", ""),
+        help="Comma-separated, tried in order when the primary model keeps failing, e.g. openai/gpt-4o-mini, openai/backup@https://backup.example/v1"
+    )
+    model_cascade = st.text_input(
+        "Model Cascade (Optional)", value=os.getenv("LLM_MODEL_CASCADE", ""),
+        help="Per-role / per-round models, e.g. student=openai/gpt-4o-mini, teacher:1-2=openai/gpt-4o-mini. "
+             "Rounds without a rule use Model Name. A cheap Teacher's approval, or a reply without a verdict, is re-checked by "
+             "approval=MODEL (default: Model Name)."
+    )
+    try:
+        cascade = parse_model_cascade(model_cascade)
+    except Exception as e:
+        st.error(f"Model cascade ignored: {e}")
+        cascade = []
 
 # ------------------------------------------------------------------
 # UI TABS
 # ------------------------------------------------------------------
-tab_exec, tab_prompts, tab_logs = st.tabs(["🚀 Execution Area", "🛠️ Prompt Engineering", "📊 System Logs"])
+tab_exec, tab_jobs, tab_prompts, tab_logs = st.tabs(["🚀 Execution Area", "📬 Background Jobs", "🛠️ Prompt Engineering", "📊 System Logs"])
 
 with tab_prompts:
     st.header("Customize System Prompts")
@@ -124,17 +263,17 @@ with tab_exec:
         st.subheader("📂 Uploads & Mode")
         mode = st.radio(
             "Select Working Mode:",
-            ["Mode 1: Student Reviewer", "Mode 2: Teacher Evaluator", "Mode 3: Adversarial Mode"]
+            list(MODES.values())
         )
         st.divider()
         pdf_file = st.file_uploader("1. Upload Paper (PDF) - 必填", type=["pdf"])
         
         # 动态控制组件启用/禁用状态
-        disable_template = (mode == "Mode 2: Teacher Evaluator")
-        disable_draft = (mode == "Mode 1: Student Reviewer")
+        disable_template = (mode == MODES[2])
+        disable_draft = mode in (MODES[1], MODES[4])
         
         template_file = st.file_uploader(
-            "2. Upload Template (TXT/MD) - Mode1/3需要", 
+            "2. Upload Template (TXT/MD) - Mode1/3/4需要", 
             type=["txt", "md"], 
             disabled=disable_template,
             help="在 Mode 2 中不需要此文件" if disable_template else ""
@@ -147,13 +286,151 @@ with tab_exec:
             help="在 Mode 1 中不需要此文件" if disable_draft else ""
         )
         
+        patch_revisions = st.checkbox(
+            "🩹 Patch-based revisions (Mode 3)",
+            value=False,
+            disabled=(mode != MODES[3]),
+            help="Student revisions send only targeted section edits, applied locally to the previous draft. Falls back to a full rewrite if the edits cannot be applied."
+        )
+        
+        grounding = st.selectbox(
+            "🔍 Grounding pre-check (Mode 3)",
+            options=["off", "hints", "shortcircuit"],
+            index=["off", "hints", "shortcircuit"].index(os.getenv("GROUNDING_PRECHECK", "off")),
+            disabled=(mode != MODES[3]),
+            help="Locally checks numbers, table/figure references, dataset names and quotes of each Student draft against the paper. "
+                 "hints: unmatched claims are passed to the Teacher. shortcircuit: a revision that repeats last round's flagged claims is sent straight back without a Teacher call."
+        )
+
+        col_conv, col_budget = st.columns(2)
+        with col_conv:
+            convergence = st.selectbox(
+                "⏹️ On stall (Mode 3)",
+                options=["off", "stop", "escalate"],
+                index=["off", "stop", "escalate"].index(os.getenv("MODE3_CONVERGENCE", "off")),
+                disabled=(mode != MODES[3]),
+                help="When consecutive drafts or Teacher feedbacks are near-identical: keep iterating (off), stop, or first switch cascade roles to the primary model (escalate)."
+            )
+        with col_budget:
+            max_tokens_budget = st.number_input(
+                "💰 Token budget (Mode 3)",
+                min_value=0, step=10000,
+                value=int(os.getenv("MODE3_MAX_TOKENS", "0") or 0),
+                disabled=(mode != MODES[3]),
+                help="Stop before a round that would push the session past this many tokens; replaces the 3-round limit. 0 = no token budget."
+            )
+        budget = {"max_tokens": int(max_tokens_budget) or None}
+
+        col_panel_size, col_panel_merge = st.columns(2)
+        with col_panel_size:
+            panel_size = st.number_input(
+                "👥 Panel size (Mode 4)",
+                min_value=2, max_value=6,
+                value=int(os.getenv("PANEL_SIZE", 3)),
+                disabled=(mode != MODES[4]),
+                help="Number of Student reviewers run concurrently, each with its own persona and seed."
+            )
+        with col_panel_merge:
+            panel_merge = st.selectbox(
+                "🧑‍⚖️ Panel merge (Mode 4)",
+                options=["consolidate", "select"],
+                index=["consolidate", "select"].index(os.getenv("PANEL_MERGE", "consolidate")),
+                disabled=(mode != MODES[4]),
+                help="The Teacher, as Area Chair, merges all reviews into one (consolidate) or picks the best one (select)."
+            )
+
+        retrieval_context = st.checkbox(
+            "🔎 Retrieval-scoped Teacher context",
+            value=os.getenv("TEACHER_CONTEXT", "full") == "retrieval",
+            disabled=(mode not in (MODES[2], MODES[3])),
+            help="The Teacher gets only the paper passages relevant to the current draft (local BM25 index) instead of the whole paper (Modes 2 and 3; the Mode 4 Area Chair compares the reviews against the whole paper). The token saving is recorded in the session metadata."
+        )
+        teacher_context = "retrieval" if retrieval_context else "full"
+
+        digest_context = st.checkbox(
+            "📑 Paper digest context",
+            value=os.getenv("PAPER_CONTEXT", "full") == "digest",
+            help="One cached pre-pass condenses the paper (claims, numbers with their locations, datasets, baselines, section summaries); agents then get the digest plus the passages relevant to each call instead of the full text. Token and latency figures are recorded in the session metadata."
+        )
+        paper_context = "digest" if digest_context else "full"
+
+        memory_top_k = st.number_input(
+            "🧠 Review memory (top-k)",
+            min_value=0, max_value=10,
+            value=int(os.getenv("REVIEW_MEMORY_TOP_K", 0)),
+            disabled=(mode == MODES[2]),
+            help="Give the Student's first draft the k most similar past approved reviews and Teacher criticisms from earlier sessions (local index, 0 = off)."
+        )
+
+        background_job = st.checkbox(
+            "📬 Run as background job",
+            value=False,
+            help="Queue the review for the worker pool (python job_worker.py) instead of running it in this page. Progress survives closing the tab; follow it in the Background Jobs tab."
+        )
+
         run_button = st.button("🚀 Run Agent", type="primary", use_container_width=True)
+
+        with st.expander("♻️ Resume Session (Mode 3)"):
+            # Listed on demand, not on every rerun of the page
+            show_resumable = st.toggle("Show interrupted sessions", key="show_resumable_sessions")
+            resumable_sessions = find_resumable_sessions() if show_resumable else []
+            resume_choice = st.selectbox(
+                "Interrupted sessions",
+                resumable_sessions,
+                format_func=lambda s: f"{s['session_id']} · {s['paper_title']} · R{s['next_round']} {s['next_agent']} ({s['status']})",
+                help="Continues from the last completed turn; finished turns are not sent to the model again."
+            )
+            resume_button = st.button("♻️ Resume Session", disabled=not resumable_sessions, use_container_width=True)
     
     with col_right:
         st.subheader("🖥️ Live Execution Stream")
         output_placeholder = st.empty()
         
-        if run_button:
+        if run_button and background_job:
+            if not pdf_file:
+                st.error("Please upload the target Paper (PDF).")
+                st.stop()
+            if mode in (MODES[1], MODES[4]) and not template_file:
+                st.error(f"Please upload a Template for {mode.split(':')[0]}.")
+                st.stop()
+            if mode == MODES[2] and not draft_file:
+                st.error("Please upload a Draft Review for Mode 2.")
+                st.stop()
+            if mode == MODES[3] and not template_file and not draft_file:
+                st.error("Please upload either a Template or a Draft Review.")
+                st.stop()
+
+            mode_number = next(k for k, v in MODES.items() if v == mode)
+            job_id = get_job_queue().submit({
+                "mode": mode_number,
+                "paper_path": save_job_upload(pdf_file),
+                "template_path": save_job_upload(template_file) if mode_number != 2 else None,
+                "draft_path": save_job_upload(draft_file) if mode_number in (2, 3) else None,
+                "config": {
+                    "model_name": model_name, "base_url": base_url or None,
+                    "group_id": group_id or None, "fallbacks": parse_fallback_models(fallback_models),
+                    "teacher_context": teacher_context, "cascade": cascade, "memory_top_k": int(memory_top_k),
+                    "paper_context": paper_context
+                },
+                "prompts": {
+                    "student": st.session_state.sys_prompt_student,
+                    "teacher": st.session_state.sys_prompt_teacher,
+                    "mode3": st.session_state.sys_prompt_mode3
+                },
+                "max_iters": 3,
+                "revision_mode": "patch" if patch_revisions else "full",
+                "grounding": grounding,
+                "convergence": convergence,
+                "budget": budget,
+                "panel_size": int(panel_size),
+                "panel_merge": panel_merge
+            })
+            log_to_console(f"📬 Queued job #{job_id} ({mode}, {pdf_file.name})")
+            if api_key != os.getenv("API_KEY", ""):
+                st.warning("Background jobs run with the workers' own API_KEY (from their environment or .env), not the key entered here.")
+            st.success(f"📬 Job #{job_id} queued (position {get_job_queue().position(job_id)}). Follow it in the Background Jobs tab.")
+
+        elif run_button:
             if not api_key:
                 st.error("Please enter your API Key in the settings.")
                 st.stop()
@@ -180,221 +457,173 @@ with tab_exec:
                 "base_url": base_url,
                 "files": {
                     "paper": pdf_file.name if pdf_file else None,
+                    "paper_sha256": upload_sha256(pdf_file),
                     "template": template_file.name if template_file else None,
                     "draft": draft_file.name if draft_file else None
                 },
                 "iterations": [],
+                "text_cache": {"hits": 0, "misses": 0},
                 "total_cost_note": "Token tracking per iteration."
             }
 
-            student_agent = StudentReviewerAgent(model_name, api_key, base_url if base_url else None, group_id if group_id else None)
-            teacher_agent = TeacherEvaluatorAgent(model_name, api_key, base_url if base_url else None, group_id if group_id else None)
+            student_agent, teacher_agent = make_agents(
+                model_name, api_key, base_url, group_id, fallback_models, model_cascade if cascade else "", teacher_context,
+                int(memory_top_k), paper_context
+            )
             
+            trace = SessionTrace(session_dir)
             with st.spinner("Extracting text from PDF..."):
                 try:
-                    paper_text = parse_uploaded_file(pdf_file)
-                    paper_text = truncate_text(paper_text)
+                    with trace.span("parse", file=pdf_file.name):
+                        paper_text = parse_upload(pdf_file, paper_path, session_metadata["text_cache"], max_chars=extraction_char_limit(model_name))
+                    with trace.span("truncate"):
+                        paper_text, session_metadata["truncation"] = load_truncated_paper(
+                            session_metadata["files"]["paper_sha256"], model_name, paper_text
+                        )
                     paper_title = os.path.splitext(pdf_file.name)[0]
                     log_to_console(f"Parsed PDF successfully: {paper_title}")
+                    truncation = session_metadata["truncation"]
+                    log_to_console(f"Paper budget: {truncation['kept_tokens']}/{truncation['paper_tokens']} tokens kept (budget {truncation['budget_tokens']})")
                 except Exception as e:
                     st.error(f"Error parsing PDF: {e}")
                     st.stop()
 
             # Execute logic
-            if mode == "Mode 1: Student Reviewer":
+            run_status = "error"
+            prompts = {
+                "student": st.session_state.sys_prompt_student,
+                "teacher": st.session_state.sys_prompt_teacher,
+                "mode3": st.session_state.sys_prompt_mode3
+            }
+
+            if mode == MODES[1]:
                 if not template_file:
                     st.error("Please upload a Template for Mode 1.")
                     st.stop()
                 
-                template_text = parse_uploaded_file(template_file)
-                log_to_console("Mode 1 Started: Student Base Review")
+                template_text = parse_upload(template_file, template_path, session_metadata["text_cache"])
                 
                 try:
-                    with st.expander("🤔 🎓 Student is writing the review (Click to collapse)", expanded=True):
-                        stream_generator, used_messages = student_agent.generate_review_stream(
-                            paper_text, template_text, st.session_state.sys_prompt_student
-                        )
-                        start_time = time.time()
-                        full_response = st.write_stream(stream_generator)
-                        duration = time.time() - start_time
-                    
-                    tokens = student_agent.calculate_tokens(used_messages, full_response)
-                    
-                    filename = generate_output_filename("Mode1", paper_title, "Student", 1)
-                    filepath = save_review(session_dir, filename, full_response)
-                    
+                    def render_mode1(agent_role, round_num, stream_generator):
+                        with st.expander("🤔 🎓 Student is writing the review (Click to collapse)", expanded=True):
+                            return st.write_stream(stream_generator)
+
+                    result = run_mode1(
+                        student_agent, paper_text, paper_title, template_text, prompts,
+                        session_dir, session_metadata, render=render_mode1, log=log_to_console
+                    )
+                    run_status = result["status"]
                     st.success("✨ Generation Complete! You can copy or download the final review below.")
-                    
-                    clean_final_response = strip_think_tags(full_response)
                     st.session_state.final_result = {
-                        "text": clean_final_response,
-                        "filename": filename,
+                        "text": result["text"],
+                        "filename": result["filename"],
                         "label": "📥 Download Final Review (.md)"
                     }
-                    
-                    iter_meta = {
-                        "round": 1, "agent": "Student", "duration_s": round(duration, 2),
-                        "tokens": tokens, "output_file": filename
-                    }
-                    session_metadata["iterations"].append(iter_meta)
-                    
-                    log_to_console(f"✅ Mode 1 Finished in {duration:.2f}s! Tokens: {tokens.get('total_tokens')}")
-                    log_to_console(f"Saved: {format_file_link(filepath)}")
-                
                 except Exception as e:
                     st.error(f"Error: {e}")
 
-            elif mode == "Mode 2: Teacher Evaluator":
+            elif mode == MODES[2]:
                 if not draft_file:
                     st.error("Please upload a Draft Review for Mode 2.")
                     st.stop()
                     
-                draft_text = parse_uploaded_file(draft_file)
-                log_to_console("Mode 2 Started: Teacher Evaluation")
+                draft_text = parse_upload(draft_file, draft_path, session_metadata["text_cache"])
                 
                 try:
-                    with st.expander("🤔 🧑‍🏫 Teacher is evaluating the draft (Click to collapse)", expanded=True):
-                        stream_generator, used_messages = teacher_agent.evaluate_review_stream(
-                            paper_text, draft_text, st.session_state.sys_prompt_teacher
-                        )
-                        start_time = time.time()
-                        full_response = st.write_stream(stream_generator)
-                        duration = time.time() - start_time
-                    
-                    tokens = teacher_agent.calculate_tokens(used_messages, full_response)
-                    
-                    filename = generate_output_filename("Mode2", paper_title, "Teacher", 1)
-                    filepath = save_review(session_dir, filename, full_response)
-                    
+                    def render_mode2(agent_role, round_num, stream_generator):
+                        with st.expander("🤔 🧑‍🏫 Teacher is evaluating the draft (Click to collapse)", expanded=True):
+                            return st.write_stream(stream_generator)
+
+                    result = run_mode2(
+                        teacher_agent, paper_text, paper_title, draft_text, prompts,
+                        session_dir, session_metadata, render=render_mode2, log=log_to_console
+                    )
+                    run_status = result["status"]
                     st.success("✨ Evaluation Complete! You can copy or download the evaluation below.")
-                    
-                    clean_final_response = strip_think_tags(full_response)
                     st.session_state.final_result = {
-                        "text": clean_final_response,
-                        "filename": filename,
+                        "text": result["text"],
+                        "filename": result["filename"],
                         "label": "📥 Download Teacher Evaluation (.md)"
                     }
-                    
-                    iter_meta = {
-                        "round": 1, "agent": "Teacher", "duration_s": round(duration, 2),
-                        "tokens": tokens, "output_file": filename
-                    }
-                    session_metadata["iterations"].append(iter_meta)
-                    
-                    log_to_console(f"✅ Mode 2 Finished in {duration:.2f}s! Tokens: {tokens.get('total_tokens')}")
-                    log_to_console(f"Saved: {format_file_link(filepath)}")
-                    
                 except Exception as e:
                     st.error(f"Error: {e}")
 
-            elif mode == "Mode 3: Adversarial Mode":
+            elif mode == MODES[3]:
                 if not template_file and not draft_file:
                     st.error("Please upload either a Template or a Draft Review.")
                     st.stop()
                     
-                log_to_console("Mode 3 Started: Adversarial Iteration")
                 max_iters = 3
-                current_review_text = parse_uploaded_file(draft_file) if draft_file else ""
-                template_text = parse_uploaded_file(template_file) if template_file else "Standard Academic Review Structure (Motivation, Strengths, Weaknesses, Questions)"
-                teacher_feedback_text = ""
-                
-                student_starts = not bool(draft_file) 
+                draft_text = parse_upload(draft_file, draft_path, session_metadata["text_cache"]) if draft_file else ""
+                template_text = parse_upload(template_file, template_path, session_metadata["text_cache"]) if template_file else DEFAULT_TEMPLATE_TEXT
                 
                 # We will append UI elements to this container dynamically
                 stream_container = st.container()
-                
-                passed = False
-                error_occurred = False
-                
-                for i in range(1, max_iters + 1):
-                    with stream_container:
-                        st.divider()
-                        st.subheader(f"🔄 Iteration Round {i}")
-                    
-                    if student_starts or i > 1:
-                        log_to_console(f"Round {i}: Student working...")
-                        with stream_container:
-                            try:
-                                with st.expander(f"🤔 🎓 Round {i}: Student Generation (Click to collapse)", expanded=True):
-                                    start_time = time.time()
-                                    stream_generator, used_messages = student_agent.generate_review_stream(
-                                        paper_text, template_text, st.session_state.sys_prompt_student,
-                                        previous_feedback=teacher_feedback_text,
-                                        mode3_prompt=st.session_state.sys_prompt_mode3,
-                                        previous_draft=current_review_text
-                                    )
-                                    current_review_text = st.write_stream(stream_generator)
-                                    duration = time.time() - start_time
-                                
-                                tokens = student_agent.calculate_tokens(used_messages, current_review_text)
-                                filename = generate_output_filename("Mode3", paper_title, "Student", i)
-                                filepath = save_review(session_dir, filename, current_review_text)
-                                
-                                iter_meta = {
-                                    "round": i, "agent": "Student", "duration_s": round(duration, 2),
-                                    "tokens": tokens, "output_file": filename
-                                }
-                                session_metadata["iterations"].append(iter_meta)
-                                log_to_console(f"✅ Student R{i} done ({duration:.1f}s, {tokens.get('total_tokens')} tk). {format_file_link(filepath)}")
-                            except Exception as e:
-                                st.error(f"Student Agent Generation Error: {e}")
-                                error_occurred = True
-                                break
-
-                    # --- Teacher Phase ---
-                    log_to_console(f"Round {i}: Teacher evaluating...")
-                    with stream_container:
-                        try:
-                            with st.expander(f"🤔 🧑‍🏫 Round {i}: Teacher Evaluation (Click to collapse)", expanded=True):
-                                start_time = time.time()
-                                stream_generator, used_messages = teacher_agent.evaluate_review_stream(
-                                    paper_text, current_review_text, st.session_state.sys_prompt_teacher
-                                )
-                                teacher_feedback_text = st.write_stream(stream_generator)
-                                duration = time.time() - start_time
-                                
-                            tokens = teacher_agent.calculate_tokens(used_messages, teacher_feedback_text)
-                            filename = generate_output_filename("Mode3", paper_title, "Teacher", i)
-                            filepath = save_review(session_dir, filename, teacher_feedback_text)
-                            
-                            iter_meta = {
-                                "round": i, "agent": "Teacher", "duration_s": round(duration, 2),
-                                "tokens": tokens, "output_file": filename
-                            }
-                            session_metadata["iterations"].append(iter_meta)
-                            log_to_console(f"✅ Teacher R{i} done ({duration:.1f}s, {tokens.get('total_tokens')} tk). {format_file_link(filepath)}")
-                            
-                            if "[Verdict: Approved]" in teacher_feedback_text:
-                                log_to_console(f"🎉 Paper Passed at Round {i}.")
-                                st.balloons()
-                                st.success(f"🎉 恭喜！审稿过程在第 {i} 轮正式通过 (Passed)！")
-                                
-                                clean_final_review = strip_think_tags(current_review_text)
-                                final_filename = generate_output_filename("Mode3_Final", paper_title, "Approved_Review", i)
-                                save_review(session_dir, final_filename, clean_final_review)
-                                
-                                st.session_state.final_result = {
-                                    "text": clean_final_review,
-                                    "filename": final_filename,
-                                    "label": "📥 Download Final Approved Review (.md)"
-                                }
-                                
-                                passed = True
-                                break
-                        except Exception as e:
-                            st.error(f"Teacher Evaluator API Error: {e}")
-                            error_occurred = True
-                            break
-                            
-                if error_occurred:
-                    st.error("🚨 Adversarial iteration was aborted due to critical API errors. Please check your network or provider limits.")
-                    log_to_console("Aborted due to API errors.")
-                elif not passed:
-                    log_to_console(f"⚠️ Reached max iterations limit ({max_iters}).")
-                    st.warning(f"⚠️ Adversarial mode reached the maximum iteration limit ({max_iters}) without passing the Teacher's review (Status: Needs Revision).")
+                result = run_mode3(
+                    student_agent, teacher_agent, paper_text, paper_title, template_text, draft_text, prompts,
+                    session_dir, session_metadata, render=make_mode3_renderer(stream_container), log=log_to_console,
+                    max_iters=max_iters, revision_mode="patch" if patch_revisions else "full", grounding=grounding,
+                    convergence=convergence, budget=budget
+                )
+                run_status = result["status"]
+                show_mode3_result(result)
+
+            elif mode == MODES[4]:
+                if not template_file:
+                    st.error("Please upload a Template for Mode 4.")
+                    st.stop()
+
+                template_text = parse_upload(template_file, template_path, session_metadata["text_cache"])
+                try:
+                    result = run_panel(
+                        student_agent, teacher_agent, paper_text, paper_title, template_text, prompts,
+                        session_dir, session_metadata, render=make_panel_renderer(int(panel_size)), log=log_to_console,
+                        panel_size=int(panel_size), merge=panel_merge
+                    )
+                    run_status = result["status"]
+                    if result["status"] == "error":
+                        st.error(f"Error: {result['error']}")
+                    else:
+                        panel = session_metadata["panel"]
+                        st.success(f"✨ Panel Complete! {len(panel['members'])} reviews in {panel['wall_s']:.1f}s (slowest reviewer {panel['slowest_member_s']:.1f}s).")
+                        st.session_state.final_result = {
+                            "text": result["text"],
+                            "filename": result["filename"],
+                            "label": "📥 Download Panel Review (.md)"
+                        }
+                except Exception as e:
+                    st.error(f"Error: {e}")
 
             # Finalize Metadata
-            meta_path = save_metadata(session_dir, session_metadata)
+            meta_path = finalize_session(session_dir, session_metadata, run_status)
+            log_to_console(f"💾 Session metadata saved to: {format_file_link(meta_path)}")
+            st.success("✨ Execution completed successfully! Check the System Logs tab for file links.")
+
+        elif resume_button and resume_choice:
+            if not api_key:
+                st.error("Please enter your API Key in the settings.")
+                st.stop()
+
+            session_dir = resume_choice["session_dir"]
+            log_to_console(f"Resuming session: {resume_choice['session_id']}")
+            student_agent, teacher_agent = make_agents(
+                model_name, api_key, base_url, group_id, fallback_models, model_cascade if cascade else "", teacher_context,
+                int(memory_top_k), paper_context
+            )
+
+            stream_container = st.container()
+            # A session that stopped at its round limit gets one more round
+            try:
+                result, session_metadata = resume_mode3(
+                    student_agent, teacher_agent, session_dir, render=make_mode3_renderer(stream_container),
+                    log=log_to_console, max_iters=max(resume_choice["max_iters"], resume_choice["next_round"])
+                )
+            except Exception as e:
+                st.error(f"Cannot resume session: {e}")
+                st.stop()
+            show_mode3_result(result)
+
+            meta_path = finalize_session(session_dir, session_metadata, result["status"])
             log_to_console(f"💾 Session metadata saved to: {format_file_link(meta_path)}")
             st.success("✨ Execution completed successfully! Check the System Logs tab for file links.")
 
@@ -405,6 +634,58 @@ with tab_exec:
             st.download_button(label=res["label"], data=res["text"], file_name=res["filename"], mime="text/markdown")
             st.code(res["text"], language="markdown")
 
+def render_jobs_panel():
+    queue = get_job_queue()
+    workers = queue.live_workers()
+    if workers:
+        st.caption(f"🟢 {workers} worker(s) online · queue: `{queue.db_path}`")
+    else:
+        st.warning("No worker is running. Start the pool with `python job_worker.py --workers 2`.")
+
+    jobs = queue.recent(20)
+    if not jobs:
+        st.info("No jobs yet. Tick 📬 Run as background job in the Execution Area to queue a review.")
+        return
+    for job in jobs:
+        payload = job["payload"]
+        paper = os.path.basename(payload.get("paper_path") or "")
+        status = job["status"]
+        icon = {"queued": "⏳", "running": "⚙️", "completed": "✅", "failed": "❌"}.get(status, "•")
+        title = f"{icon} Job #{job['id']} · {MODES.get(payload.get('mode'), '')} · {paper} · {status}"
+        if status == "queued":
+            title += f" (position {queue.position(job['id'])})"
+        with st.expander(title, expanded=(status == "running")):
+            if job["session_dir"]:
+                st.caption(f"Session: `{job['session_dir']}`")
+            if status == "running":
+                live = read_live_output(job["session_dir"])
+                st.markdown(live if live else "_Waiting for the first tokens..._")
+            elif status == "failed":
+                st.error(job["error"] or "Job failed.")
+            elif status == "completed":
+                result = job["result"] or {}
+                output_file = result.get("output_file")
+                st.write(f"Result: **{result.get('status')}** · {result.get('total_tokens', 0)} tokens · {result.get('duration_s')}s")
+                output_path = os.path.join(job["session_dir"], output_file) if output_file and job["session_dir"] else None
+                if output_path and os.path.isfile(output_path):
+                    with open(output_path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                    st.download_button("📥 Download Result (.md)", data=text, file_name=output_file,
+                                       mime="text/markdown", key=f"job_dl_{job['id']}")
+                    st.code(text, language="markdown")
+                else:
+                    # No final review (e.g. Mode 3 hit its round limit): show the full transcript
+                    st.markdown(read_live_output(job["session_dir"]))
+
+with tab_jobs:
+    st.header("Background Jobs")
+    if hasattr(st, "fragment"):
+        # Re-runs only this panel every few seconds, tailing running jobs
+        st.fragment(run_every=3)(render_jobs_panel)()
+    else:
+        st.button("🔄 Refresh")
+        render_jobs_panel()
+
 with tab_logs:
     st.header("Console Log Stream")
     if st.button("Clear Logs"):
@@ -0,0 +1,374 @@
+"""
+Headless batch runner: reviews every PDF in a folder with Mode 1/2/3,
+running up to `--concurrency` papers in flight at once.
+
+Each paper gets its own session folder with the same outputs as a UI run
+(origin_files/, per-round .md files, metadata.md/json).
+
+Interrupted Mode 3 sessions can be continued from their checkpoints with
+`--resume`, which skips every turn that already completed.
+
+Usage:
+    python batch_review.py papers/ --template template.md --mode 3 --concurrency 4
+    python batch_review.py papers/ --drafts drafts/ --mode 2
+    python batch_review.py --resume review_outputs/20250101_120000_0003
+"""
+import os
+import time
+import json
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from utils import (
+    parse_file, create_session_folder, save_origin_file, new_session_id, file_sha256
+)
+from agents import (
+    StudentReviewerAgent, TeacherEvaluatorAgent,
+    DEFAULT_STUDENT_PROMPT, DEFAULT_TEACHER_PROMPT, DEFAULT_MODE3_PROMPT, parse_fallback_models, parse_model_cascade
+)
+from cache import get_text_cache
+from truncation import truncate_paper, extraction_char_limit
+from pipeline import (
+    run_mode1, run_mode2, run_mode3, run_panel, resume_mode3, finalize_session, consume_stream, DEFAULT_TEMPLATE_TEXT
+)
+from tracing import SessionTrace
+from llm_runtime import preload
+
+MODES = {
+    1: "Mode 1: Student Reviewer",
+    2: "Mode 2: Teacher Evaluator",
+    3: "Mode 3: Adversarial Mode",
+    4: "Mode 4: Reviewer Panel"
+}
+DRAFT_EXTENSIONS = (".md", ".txt", ".docx")
+
+def find_papers(papers_dir: str) -> list:
+    """Return the sorted list of PDF paths directly under papers_dir."""
+    return sorted(
+        os.path.join(papers_dir, name) for name in os.listdir(papers_dir)
+        if name.lower().endswith(".pdf")
+    )
+
+def find_draft(drafts_dir: str, paper_path: str) -> str:
+    """Look up the draft review sharing the paper's file stem, if any."""
+    if not drafts_dir:
+        return None
+    stem = os.path.splitext(os.path.basename(paper_path))[0]
+    for ext in DRAFT_EXTENSIONS:
+        candidate = os.path.join(drafts_dir, stem + ext)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+def review_paper(paper_path: str, session_id: str, mode: int, config: dict, prompts: dict,
+                 template_path: str = None, draft_path: str = None, base_dir: str = "review_outputs",
+                 max_iters: int = 3, revision_mode: str = "full", render=consume_stream, grounding: str = "off",
+                 convergence: str = "off", budget: dict = None, panel_size: int = 3, panel_merge: str = "consolidate") -> dict:
+    """
+    Runs one paper through the selected mode in its own session folder.
+    Never raises: failures are reported in the returned summary.
+    """
+    paper_title = os.path.splitext(os.path.basename(paper_path))[0]
+    summary = {"paper": paper_title, "session_id": session_id, "status": "error", "total_tokens": 0}
+    start_time = time.time()
+
+    def log(msg: str):
+        print(f"[{time.strftime('%H:%M:%S')}] [{paper_title[:30]}] {msg}", flush=True)
+
+    try:
+        session_id, session_dir, origin_dir = create_session_folder(base_dir, session_id)
+        summary["session_dir"] = session_dir
+
+        # Parse the saved copies, so each input is read from the source folder exactly once
+        saved = {}
+        for path in (paper_path, template_path, draft_path):
+            if path:
+                with open(path, "rb") as f:
+                    saved[path] = save_origin_file(f, origin_dir)
+
+        session_metadata = {
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat(),
+            "mode": MODES[mode],
+            "model": config["model_name"],
+            "base_url": config["base_url"],
+            "files": {
+                "paper": os.path.basename(paper_path),
+                "paper_sha256": file_sha256(saved[paper_path]),
+                "template": os.path.basename(template_path) if template_path else None,
+                "draft": os.path.basename(draft_path) if draft_path else None
+            },
+            "iterations": [],
+            "text_cache": {"hits": 0, "misses": 0},
+            "total_cost_note": "Token tracking per iteration."
+        }
+
+        text_cache = get_text_cache()
+        trace = SessionTrace(session_dir)
+        with trace.span("parse", file=os.path.basename(paper_path)):
+            paper_text = parse_file(
+                saved[paper_path], text_cache, session_metadata["text_cache"],
+                max_chars=extraction_char_limit(config["model_name"]), sha256_hex=session_metadata["files"]["paper_sha256"]
+            )
+        with trace.span("truncate"):
+            paper_text, session_metadata["truncation"] = truncate_paper(paper_text, config["model_name"])
+        template_text = DEFAULT_TEMPLATE_TEXT
+        if template_path:
+            template_text = parse_file(saved[template_path], text_cache, session_metadata["text_cache"])
+        draft_text = ""
+        if draft_path:
+            draft_text = parse_file(saved[draft_path], text_cache, session_metadata["text_cache"])
+        log(f"Parsed PDF successfully: {session_dir}")
+
+        fallbacks = config.get("fallbacks")
+        student_agent = StudentReviewerAgent(config["model_name"], config["api_key"], config["base_url"], config["group_id"],
+                                             fallbacks=fallbacks, cascade=config.get("cascade"),
+                                             memory_top_k=config.get("memory_top_k"), paper_context=config.get("paper_context"))
+        teacher_agent = TeacherEvaluatorAgent(config["model_name"], config["api_key"], config["base_url"], config["group_id"],
+                                              fallbacks=fallbacks, context_mode=config.get("teacher_context"),
+                                              cascade=config.get("cascade"), paper_context=config.get("paper_context"))
+
+        try:
+            if mode == 1:
+                result = run_mode1(student_agent, paper_text, paper_title, template_text, prompts,
+                                   session_dir, session_metadata, render=render, log=log)
+            elif mode == 2:
+                result = run_mode2(teacher_agent, paper_text, paper_title, draft_text, prompts,
+                                   session_dir, session_metadata, render=render, log=log)
+            elif mode == 4:
+                result = run_panel(student_agent, teacher_agent, paper_text, paper_title, template_text, prompts,
+                                   session_dir, session_metadata, render=render, log=log,
+                                   panel_size=panel_size, merge=panel_merge)
+            else:
+                result = run_mode3(student_agent, teacher_agent, paper_text, paper_title, template_text, draft_text,
+                                   prompts, session_dir, session_metadata, render=render, log=log, max_iters=max_iters,
+                                   revision_mode=revision_mode, grounding=grounding, convergence=convergence, budget=budget)
+            summary["status"] = result["status"]
+            summary["output_file"] = result.get("filename")
+            summary["stop_reason"] = result.get("stop_reason")
+            if result.get("error"):
+                summary["error"] = result["error"]
+        finally:
+            # Persist whatever turns completed, even if the run failed midway
+            finalize_session(session_dir, session_metadata, summary["status"])
+            summary["total_tokens"] = sum(
+                it["tokens"].get("total_tokens", 0) for it in session_metadata["iterations"]
+            )
+    except Exception as e:
+        summary["error"] = str(e)
+        log(f"❌ Failed: {e}")
+
+    summary["duration_s"] = round(time.time() - start_time, 2)
+    return summary
+
+def resume_session(session_dir: str, config: dict, max_iters: int = None, render=consume_stream, budget: dict = None) -> dict:
+    """
+    Continues one interrupted Mode 3 session from its checkpoint.
+    Never raises: failures are reported in the returned summary.
+    """
+    session_id = os.path.basename(os.path.normpath(session_dir))
+    summary = {"paper": session_id, "session_id": session_id, "session_dir": session_dir, "status": "error", "total_tokens": 0}
+    start_time = time.time()
+
+    def log(msg: str):
+        print(f"[{time.strftime('%H:%M:%S')}] [{session_id}] {msg}", flush=True)
+
+    try:
+        fallbacks = config.get("fallbacks")
+        student_agent = StudentReviewerAgent(config["model_name"], config["api_key"], config["base_url"], config["group_id"],
+                                             fallbacks=fallbacks, cascade=config.get("cascade"),
+                                             memory_top_k=config.get("memory_top_k"), paper_context=config.get("paper_context"))
+        teacher_agent = TeacherEvaluatorAgent(config["model_name"], config["api_key"], config["base_url"], config["group_id"],
+                                              fallbacks=fallbacks, context_mode=config.get("teacher_context"),
+                                              cascade=config.get("cascade"), paper_context=config.get("paper_context"))
+        result, session_metadata = resume_mode3(student_agent, teacher_agent, session_dir, render=render, log=log,
+                                                max_iters=max_iters, budget=budget)
+        finalize_session(session_dir, session_metadata, result["status"])
+        summary["paper"] = os.path.splitext(session_metadata["files"]["paper"] or session_id)[0]
+        summary["status"] = result["status"]
+        summary["output_file"] = result.get("filename")
+        summary["stop_reason"] = result.get("stop_reason")
+        if result.get("error"):
+            summary["error"] = result["error"]
+        summary["total_tokens"] = sum(
+            it["tokens"].get("total_tokens", 0) for it in session_metadata["iterations"]
+        )
+    except Exception as e:
+        summary["error"] = str(e)
+        log(f"❌ Failed: {e}")
+
+    summary["duration_s"] = round(time.time() - start_time, 2)
+    return summary
+
+def _batch_report(batch_id: str, mode_label: str, config: dict, concurrency: int, jobs_total: int,
+                  results: list, wall_time: float) -> dict:
+    completed = [r for r in results if r["status"] != "error"]
+    total_tokens = sum(r["total_tokens"] for r in results)
+    return {
+        "batch_id": batch_id,
+        "mode": mode_label,
+        "model": config["model_name"],
+        "concurrency": concurrency,
+        "papers_total": jobs_total,
+        "papers_completed": len(completed),
+        "papers_failed": len(results) - len(completed),
+        "wall_time_s": round(wall_time, 2),
+        "papers_per_hour": round(len(completed) / wall_time * 3600, 2) if wall_time > 0 else 0.0,
+        "total_tokens": total_tokens,
+        "tokens_per_second": round(total_tokens / wall_time, 2) if wall_time > 0 else 0.0,
+        "sessions": sorted(results, key=lambda r: r["session_id"])
+    }
+
+def run_batch(papers_dir: str, mode: int, config: dict, template_path: str = None, drafts_dir: str = None,
+              concurrency: int = 4, prompts: dict = None, base_dir: str = "review_outputs", max_iters: int = 3,
+              revision_mode: str = "full", render=consume_stream, grounding: str = "off",
+              convergence: str = "off", budget: dict = None, panel_size: int = 3, panel_merge: str = "consolidate") -> dict:
+    """
+    Reviews every PDF in papers_dir with at most `concurrency` papers in flight.
+    Returns an aggregate report with per-paper summaries and throughput figures.
+    """
+    if mode in (1, 4) and not template_path:
+        raise ValueError(f"Mode {mode} requires a template.")
+    prompts = prompts or {
+        "student": DEFAULT_STUDENT_PROMPT.strip(),
+        "teacher": DEFAULT_TEACHER_PROMPT.strip(),
+        "mode3": DEFAULT_MODE3_PROMPT.strip()
+    }
+
+    papers = find_papers(papers_dir)
+    batch_id = new_session_id()
+    jobs = []
+    for idx, paper_path in enumerate(papers, start=1):
+        draft_path = find_draft(drafts_dir, paper_path)
+        if mode == 2 and not draft_path:
+            print(f"Skipping {os.path.basename(paper_path)}: no draft review found for Mode 2.")
+            continue
+        if mode == 3 and not template_path and not draft_path:
+            print(f"Skipping {os.path.basename(paper_path)}: Mode 3 needs a template or a draft review.")
+            continue
+        jobs.append((paper_path, f"{batch_id}_{idx:04d}", draft_path))
+
+    preload()
+    start_time = time.time()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [
+            executor.submit(review_paper, paper_path, session_id, mode, config, prompts,
+                            template_path, draft_path, base_dir, max_iters, revision_mode, render, grounding,
+                            convergence, budget, panel_size, panel_merge)
+            for paper_path, session_id, draft_path in jobs
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+    wall_time = time.time() - start_time
+    return _batch_report(batch_id, MODES[mode], config, concurrency, len(jobs), results, wall_time)
+
+def run_resume(session_dirs: list, config: dict, concurrency: int = 4, max_iters: int = None, budget: dict = None) -> dict:
+    """Resumes the given Mode 3 sessions with at most `concurrency` in flight. Same report shape as run_batch."""
+    batch_id = new_session_id()
+    preload()
+    start_time = time.time()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(resume_session, session_dir, config, max_iters, budget=budget) for session_dir in session_dirs]
+        for future in as_completed(futures):
+            results.append(future.result())
+    wall_time = time.time() - start_time
+    return _batch_report(batch_id, MODES[3], config, concurrency, len(session_dirs), results, wall_time)
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Headless batch review runner for Reviewer Tycoon.")
+    parser.add_argument("papers_dir", nargs="?", help="Folder containing the paper PDFs")
+    parser.add_argument("--mode", type=int, choices=[1, 2, 3, 4], default=1, help="Working mode (default: 1; 4 = reviewer panel)")
+    parser.add_argument("--template", help="Review template (TXT/MD), required for Modes 1 and 4")
+    parser.add_argument("--drafts", help="Folder of draft reviews named after each paper (Mode 2/3)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum papers in flight (default: 4)")
+    parser.add_argument("--max-iters", type=int, help="Mode 3 round limit (default: 3, or the checkpoint's limit with --resume)")
+    parser.add_argument("--revision-mode", choices=["full", "patch"], default="full",
+                        help="Mode 3 Student revisions: full rewrite or section edits (default: full)")
+    parser.add_argument("--grounding", choices=["off", "hints", "shortcircuit"], default=os.getenv("GROUNDING_PRECHECK", "off"),
+                        help="Mode 3 local claim-grounding pre-check: off, Teacher hints, or hints plus sending repeated ungrounded claims straight back")
+    parser.add_argument("--convergence", choices=["off", "stop", "escalate"], default=os.getenv("MODE3_CONVERGENCE", "off"),
+                        help="Mode 3 stall handling when drafts/feedback stop changing: keep going, stop, or move to the primary model first")
+    parser.add_argument("--max-tokens", type=int, help="Mode 3 token budget per session (replaces --max-iters; env MODE3_MAX_TOKENS)")
+    parser.add_argument("--max-cost", type=float, help="Mode 3 estimated USD budget per session (env MODE3_MAX_COST_USD)")
+    parser.add_argument("--max-seconds", type=float, help="Mode 3 LLM time budget per session (env MODE3_MAX_SECONDS)")
+    parser.add_argument("--panel-size", type=int, default=int(os.getenv("PANEL_SIZE", 3)),
+                        help="Mode 4: number of Student reviewers run concurrently (default: 3)")
+    parser.add_argument("--panel-merge", choices=["consolidate", "select"], default=os.getenv("PANEL_MERGE", "consolidate"),
+                        help="Mode 4: the Teacher merges the reviews into one, or selects the best")
+    parser.add_argument("--output-dir", default="review_outputs", help="Base folder for session outputs")
+    parser.add_argument("--model", default=os.getenv("MODEL_NAME", "openai/minimax-m2.5"))
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", ""))
+    parser.add_argument("--base-url", default=os.getenv("BASE_URL", "https://api.minimax.chat/v1"))
+    parser.add_argument("--group-id", default=os.getenv("GROUP_ID", ""))
+    parser.add_argument("--fallback-models", default=os.getenv("LLM_FALLBACK_MODELS", ""),
+                        help="Comma-separated fallback models (model or model@base_url), tried in order")
+    parser.add_argument("--model-cascade", default=os.getenv("LLM_MODEL_CASCADE", ""),
+                        help="Per-role/per-round models, e.g. \"student=openai/gpt-4o-mini, teacher:1-2=openai/gpt-4o-mini\"; "
+                             "approval=MODEL confirms cheap approvals (default: --model)")
+    parser.add_argument("--teacher-context", choices=["full", "retrieval"], default=os.getenv("TEACHER_CONTEXT", "full"),
+                        help="Teacher sees the whole paper or only BM25-retrieved passages relevant to the draft")
+    parser.add_argument("--paper-context", choices=["full", "digest"], default=os.getenv("PAPER_CONTEXT", "full"),
+                        help="Agents see the whole paper, or a cached one-time digest plus the passages relevant to each call")
+    parser.add_argument("--memory-top-k", type=int, default=int(os.getenv("REVIEW_MEMORY_TOP_K", 0)),
+                        help="Past approved reviews and Teacher criticisms of similar papers given to the Student's first draft (0 = off)")
+    parser.add_argument("--llm-cache", choices=["off", "record", "replay_only"],
+                        help="LLM response cache mode (overrides LLM_CACHE_MODE)")
+    parser.add_argument("--resume", nargs="+", metavar="SESSION_DIR",
+                        help="Resume interrupted Mode 3 sessions from their checkpoints instead of reviewing papers_dir")
+    parser.add_argument("--summary", help="Optional path to write the aggregate report as JSON")
+    args = parser.parse_args()
+
+    if not args.api_key:
+        parser.error("No API key given (use --api-key or API_KEY in .env).")
+    if not args.papers_dir and not args.resume:
+        parser.error("Give a papers folder, or --resume with session folders.")
+    if args.mode in (1, 4) and not args.template and not args.resume:
+        parser.error(f"Mode {args.mode} requires --template.")
+
+    try:
+        cascade = parse_model_cascade(args.model_cascade)
+    except Exception as e:
+        parser.error(str(e))
+
+    if args.llm_cache:
+        os.environ["LLM_CACHE_MODE"] = args.llm_cache
+
+    config = {
+        "model_name": args.model,
+        "api_key": args.api_key,
+        "base_url": args.base_url or None,
+        "group_id": args.group_id or None,
+        "fallbacks": parse_fallback_models(args.fallback_models),
+        "teacher_context": args.teacher_context,
+        "cascade": cascade,
+        "memory_top_k": args.memory_top_k,
+        "paper_context": args.paper_context
+    }
+    budget = {"max_tokens": args.max_tokens, "max_cost_usd": args.max_cost, "max_seconds": args.max_seconds}
+    if args.resume:
+        report = run_resume(args.resume, config, concurrency=args.concurrency, max_iters=args.max_iters, budget=budget)
+    else:
+        report = run_batch(
+            args.papers_dir, args.mode, config, template_path=args.template, drafts_dir=args.drafts,
+            concurrency=args.concurrency, base_dir=args.output_dir, max_iters=args.max_iters or 3,
+            revision_mode=args.revision_mode, grounding=args.grounding, convergence=args.convergence, budget=budget,
+            panel_size=args.panel_size, panel_merge=args.panel_merge
+        )
+
+    print("\n=== Batch Summary ===")
+    for r in report["sessions"]:
+        print(f"- {r['paper']}: {r['status']} ({r['duration_s']}s, {r['total_tokens']} tk)")
+    print(f"Papers: {report['papers_completed']}/{report['papers_total']} completed, {report['papers_failed']} failed")
+    print(f"Wall time: {report['wall_time_s']}s")
+    print(f"Throughput: {report['papers_per_hour']} papers/hour, {report['tokens_per_second']} tokens/s")
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Peak-memory benchmark for upload handling (save to origin_files + parse).
+
+Compares, each in a fresh interpreter with `--sessions` concurrent sessions:
+  - inmemory: the previous flow. The upload is read() whole to save it, read()
+    again by parse_uploaded_file (cache key + parser input) and PyMuPDF opens
+    those bytes, keeping decoded resources in its store (PDF_STORE_TRIM_PAGES=0);
+  - streamed_notrim: save_origin_file streams the upload to disk in chunks, then
+    parse_file parses the saved copy from its path, store untrimmed;
+  - streamed: the same with the default store trimming.
+Uploads are in-memory BytesIO objects, as Streamlit hands them over, and are
+created before the baseline is taken; the synthetic PDFs embed incompressible
+images so their size resembles scanned or figure-heavy papers.
+
+Usage:
+    python benchmarks/bench_memory.py --pages 40 --image-kb 768 --sessions 4
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# flow -> (session function in the probe, PDF_STORE_TRIM_PAGES)
+FLOWS = {"inmemory": ("inmemory", "0"), "streamed_notrim": ("streamed", "0"), "streamed": ("streamed", "")}
+
+SESSION_PROBE = """
+import io, os, sys, json, time, tempfile, threading, resource
+sys.path.insert(0, {repo!r})
+import fitz
+from utils import parse_uploaded_file, parse_file, save_origin_file
+from cache import TextCache
+
+def reset_peak():
+    # Linux: writing 5 to clear_refs resets the peak RSS (VmHWM), so setup allocations are not counted
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_mb():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def inmemory(upload, origin_dir, cache):
+    upload.seek(0)
+    with open(os.path.join(origin_dir, upload.name), "wb") as f:
+        f.write(upload.read())
+    upload.seek(0)
+    return parse_uploaded_file(upload, cache)
+
+def streamed(upload, origin_dir, cache):
+    return parse_file(save_origin_file(upload, origin_dir), cache)
+
+uploads = []
+for _ in range({sessions}):
+    with open({pdf_path!r}, "rb") as f:
+        upload = io.BytesIO(f.read())
+    upload.name = "paper.pdf"
+    uploads.append(upload)
+cache = TextCache(tempfile.mkdtemp())
+fitz.open().close()
+reset_peak()
+baseline = peak_mb()
+
+flow = {flow}
+barrier = threading.Barrier({sessions})
+def session(upload):
+    barrier.wait()
+    flow(upload, tempfile.mkdtemp(), cache)
+threads = [threading.Thread(target=session, args=(u,)) for u in uploads]
+start = time.perf_counter()
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+print(json.dumps({{"baseline_mb": baseline, "peak_mb": peak_mb(), "wall_s": time.perf_counter() - start}}))
+"""
+
+def make_pdf(path: str, pages: int, image_kb: int):
+    """Synthetic paper: one page of body text plus one random (incompressible) image per page."""
+    import fitz  # PyMuPDF
+    side = max(8, int((image_kb * 1024 / 3) ** 0.5))
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(36, 36, 576, 400), f"Section {p}\n" + "We report results. " * 120, fontsize=7)
+        pixmap = fitz.Pixmap(fitz.csRGB, side, side, os.urandom(side * side * 3), 0)
+        page.insert_image(fitz.Rect(36, 420, 576, 806), pixmap=pixmap)
+    doc.save(path)
+    doc.close()
+
+def run_flow(flow: str, pdf_path: str, sessions: int) -> dict:
+    session_fn, trim_pages = FLOWS[flow]
+    code = SESSION_PROBE.format(repo=REPO_DIR, pdf_path=pdf_path, sessions=sessions, flow=session_fn)
+    env = dict(os.environ, PDF_EXTRACT_WORKERS="1")
+    env.pop("PDF_STORE_TRIM_PAGES", None)
+    if trim_pages:
+        env["PDF_STORE_TRIM_PAGES"] = trim_pages
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--image-kb", type=int, default=768, help="Raw size of the image on each page")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--workdir", default=os.path.join(REPO_DIR, ".cache", "bench_memory"))
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    pdf_path = os.path.join(args.workdir, f"paper_{args.pages}p_{args.image_kb}kb.pdf")
+    if not os.path.exists(pdf_path):
+        make_pdf(pdf_path, args.pages, args.image_kb)
+    size_mb = os.path.getsize(pdf_path) / (1024 * 1024)
+    print(f"pdf {size_mb:.1f} MB, {args.sessions} concurrent sessions\n")
+
+    print(f"{'flow':<16} {'peak +MB':>9} {'MB/session':>11} {'x pdf size':>11} {'wall_s':>7}")
+    for flow in FLOWS:
+        r = run_flow(flow, pdf_path, args.sessions)
+        delta = r["peak_mb"] - r["baseline_mb"]
+        per_session = delta / args.sessions
+        print(f"{flow:<16} {delta:>9.1f} {per_session:>11.1f} {per_session / size_mb:>11.2f} {r['wall_s']:>7.2f}")
+
+if __name__ == "__main__":
+    main()
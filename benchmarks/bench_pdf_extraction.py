@@ -0,0 +1,74 @@
+"""
+Micro-benchmark for PDF text extraction on synthetic large papers.
+
+Compares the original single-core `text +=` loop against extract_text_from_pdf
+in serial, parallel and budgeted (max_chars) configurations.
+
+Usage:
+    python benchmarks/bench_pdf_extraction.py --pages 50 200 500 --workers 4
+"""
+import os
+import io
+import sys
+import time
+import argparse
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import extract_text_from_pdf, DEFAULT_MAX_CHARS
+
+LINE = "We evaluate the proposed method on ImageNet and report 84.3% top-1 accuracy against strong baselines. "
+
+def make_synthetic_pdf(pages: int) -> bytes:
+    """Build an in-memory PDF with `pages` pages of dense body text."""
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        body = f"Section {p}\n" + "\n".join(f"{i:02d} {LINE}" for i in range(55))
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), body, fontsize=7)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def baseline_extract(pdf_bytes: bytes) -> str:
+    """The original implementation: one serial loop with repeated string concatenation."""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    text = ""
+    for page in doc:
+        text += page.get_text()
+    return text
+
+def best_of(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"cpu_count={os.cpu_count()} workers={args.workers} budget={DEFAULT_MAX_CHARS} chars\n")
+    print(f"{'pages':>6} {'baseline':>10} {'serial':>10} {'parallel':>10} {'budgeted':>10} {'speedup':>8}")
+    for pages in args.pages:
+        pdf_bytes = make_synthetic_pdf(pages)
+        reference = baseline_extract(pdf_bytes)
+        assert extract_text_from_pdf(io.BytesIO(pdf_bytes), workers=args.workers) == reference
+
+        t_base = best_of(lambda: baseline_extract(pdf_bytes), args.repeats)
+        t_serial = best_of(lambda: extract_text_from_pdf(io.BytesIO(pdf_bytes), workers=1), args.repeats)
+        t_par = best_of(lambda: extract_text_from_pdf(io.BytesIO(pdf_bytes), workers=args.workers), args.repeats)
+        t_budget = best_of(
+            lambda: extract_text_from_pdf(io.BytesIO(pdf_bytes), max_chars=DEFAULT_MAX_CHARS, workers=args.workers),
+            args.repeats
+        )
+        best = min(t_par, t_budget)
+        print(f"{pages:>6} {t_base:>9.3f}s {t_serial:>9.3f}s {t_par:>9.3f}s {t_budget:>9.3f}s {t_base / best:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+End-to-end offline benchmark of the review pipeline against a local mock LLM.
+
+Runs Mode 1/2/3 through the headless batch runner (parse, truncate, prompt
+assembly, streaming, file I/O) at several concurrency levels, paper sizes and
+paper-context modes (full text vs. digest plus excerpts), with every agent
+pointed at benchmarks/mock_llm_server.py. Reports p50/p95 session latency, the
+part of it spent outside the LLM stream ("overhead"), prompt tokens per session
+(digest pre-pass included), throughput and peak RSS. Each configuration runs in a fresh process so peak
+RSS is not inherited from earlier runs.
+
+Usage:
+    python benchmarks/bench_pipeline.py --modes 1 3 --pages 10 50 --concurrency 1 4 16 --papers 8
+    python benchmarks/bench_pipeline.py --ttft 0.05 --tps 0 --render streamlit --json results.json
+    python benchmarks/bench_pipeline.py --modes 3 --pages 50 --paper-context full digest --prefill-tps 5000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+import fitz  # PyMuPDF
+from bench_pdf_extraction import make_synthetic_pdf
+from mock_llm_server import MockServer, VERDICTS
+
+TEMPLATE = "## Summary\n## Strengths\n## Weaknesses\n## Questions\n"
+DRAFT = "## Summary\nA method.\n\n## Strengths\n- Clear.\n\n## Weaknesses\n- Weak baselines.\n"
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def prepare_inputs(workdir: str, pages: int, papers: int) -> dict:
+    papers_dir = os.path.join(workdir, f"papers_{pages}p")
+    drafts_dir = os.path.join(workdir, f"drafts_{pages}p")
+    os.makedirs(papers_dir, exist_ok=True)
+    os.makedirs(drafts_dir, exist_ok=True)
+    pdf_bytes = make_synthetic_pdf(pages)
+    for i in range(papers):
+        # A distinct first line per paper, so each one gets its own digest pre-pass
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        doc[0].insert_text((36, 30), f"Paper {i}", fontsize=7)
+        doc.save(os.path.join(papers_dir, f"paper_{i:03d}.pdf"))
+        doc.close()
+        with open(os.path.join(drafts_dir, f"paper_{i:03d}.md"), "w", encoding="utf-8") as f:
+            f.write(DRAFT)
+    template_path = os.path.join(workdir, "template.md")
+    with open(template_path, "w", encoding="utf-8") as f:
+        f.write(TEMPLATE)
+    return {"papers_dir": papers_dir, "drafts_dir": drafts_dir, "template_path": template_path}
+
+def _streamlit_render(agent_role, round_num, stream_generator):
+    import streamlit as st
+    return st.write_stream(stream_generator)
+
+def run_config(job: dict) -> dict:
+    """Child process: one batch run for a (mode, pages, concurrency) configuration."""
+    # Measure the pipeline itself: no text/response caches, no retries, offline cost map
+    os.environ.update({
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True", "TEXT_CACHE_MAX_MB": "0", "LLM_CACHE_MODE": "off",
+        "LLM_MAX_RETRIES": "0", "LLM_RPM": "0", "LLM_TPM": "0", "MODEL_CONTEXT_TOKENS": "128000",
+        "PAPER_DIGEST_CACHE_DIR": os.path.join(job["output_dir"], "digest_cache")
+    })
+    os.environ.pop("METRICS_TEXTFILE", None)
+    import logging
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    from batch_review import run_batch
+    from pipeline import consume_stream
+
+    config = {"model_name": "openai/mock", "api_key": "mock", "base_url": job["base_url"], "group_id": None, "fallbacks": [],
+              "paper_context": job["paper_context"]}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = run_batch(
+            job["papers_dir"], job["mode"], config,
+            template_path=job["template_path"] if job["mode"] != 2 else None,
+            drafts_dir=job["drafts_dir"] if job["mode"] == 2 else None,
+            concurrency=job["concurrency"], base_dir=job["output_dir"], max_iters=job["max_iters"],
+            render=_streamlit_render if job["render"] == "streamlit" else consume_stream
+        )
+
+    latencies, overheads, ttfts, prompt_tokens = [], [], [], []
+    for session in report["sessions"]:
+        latencies.append(session["duration_s"])
+        meta_path = os.path.join(session.get("session_dir", ""), "metadata.json")
+        if not os.path.isfile(meta_path):
+            continue
+        with open(meta_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        timings = metadata.get("timings", {})
+        prompt_tokens.append(sum(m["prompt_tokens"] for m in metadata.get("models", {}).values()))
+        llm_s = timings.get("stages", {}).get("llm_stream", {}).get("total_s", 0.0)
+        overheads.append(max(0.0, session["duration_s"] - llm_s))
+        if "llm" in timings:
+            ttfts.append(timings["llm"]["ttft_s_mean"])
+
+    return {
+        "mode": job["mode"], "pages": job["pages"], "concurrency": job["concurrency"], "paper_context": job["paper_context"],
+        "papers": report["papers_total"], "failed": report["papers_failed"],
+        "p50_s": percentile(latencies, 50), "p95_s": percentile(latencies, 95),
+        "overhead_p50_s": percentile(overheads, 50), "overhead_p95_s": percentile(overheads, 95),
+        "ttft_mean_s": round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+        "prompt_tokens_per_session": round(sum(prompt_tokens) / len(prompt_tokens)) if prompt_tokens else None,
+        "wall_time_s": report["wall_time_s"], "papers_per_hour": report["papers_per_hour"],
+        "tokens_per_second": report["tokens_per_second"], "peak_rss_mb": peak_rss_mb()
+    }
+
+def _fmt(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", type=int, nargs="+", choices=[1, 2, 3], default=[1, 2, 3])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50], help="Synthetic paper sizes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--papers", type=int, default=8, help="Papers per configuration")
+    parser.add_argument("--paper-context", nargs="+", choices=["full", "digest"], default=["full"],
+                        help="Agent paper context modes to compare")
+    parser.add_argument("--max-iters", type=int, default=3)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Mock time to first token (s)")
+    parser.add_argument("--prefill-tps", type=float, default=0.0,
+                        help="Mock prompt tokens/sec added to the TTFT, so shorter prompts answer sooner (0 = off)")
+    parser.add_argument("--tps", type=float, default=200.0, help="Mock tokens/sec per stream (0 = unthrottled)")
+    parser.add_argument("--response-tokens", type=int, default=200)
+    parser.add_argument("--verdict", choices=VERDICTS, default="random", help="Mock Teacher verdicts")
+    parser.add_argument("--render", choices=["headless", "streamlit"], default="headless",
+                        help="Consume streams directly or through st.write_stream (bare mode)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated inputs and session folders")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="reviewer_bench_")
+    server = MockServer(ttft_s=args.ttft, prefill_tokens_per_s=args.prefill_tps, tokens_per_s=args.tps, response_tokens=args.response_tokens,
+                        verdict=args.verdict).start()
+    results = []
+    try:
+        print(f"mock LLM at {server.base_url} (ttft={args.ttft}s, prefill {args.prefill_tps} tok/s, {args.tps} tok/s, "
+              f"{args.response_tokens} tok/response, verdict={args.verdict}); render={args.render}\n")
+        print(f"{'mode':>4} {'pages':>5} {'conc':>4} {'ctx':>6} {'p50':>8} {'p95':>8} {'ovh p50':>8} {'ovh p95':>8} "
+              f"{'ttft':>6} {'prompt tk':>9} {'papers/h':>9} {'tok/s':>9} {'rss MB':>7} {'fail':>4}")
+        spawn = multiprocessing.get_context("spawn")
+        for pages in args.pages:
+            inputs = prepare_inputs(workdir, pages, args.papers)
+            for mode in args.modes:
+                for concurrency in args.concurrency:
+                    for paper_context in args.paper_context:
+                        job = {
+                            **inputs, "mode": mode, "pages": pages, "concurrency": concurrency,
+                            "paper_context": paper_context, "max_iters": args.max_iters, "render": args.render,
+                            "base_url": server.base_url,
+                            "output_dir": os.path.join(workdir, f"out_m{mode}_{pages}p_c{concurrency}_{paper_context}")
+                        }
+                        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                            r = executor.submit(run_config, job).result()
+                        results.append(r)
+                        print(f"{mode:>4} {pages:>5} {concurrency:>4} {paper_context:>6} {_fmt(r['p50_s'], '7.2f')}s "
+                              f"{_fmt(r['p95_s'], '7.2f')}s {_fmt(r['overhead_p50_s'], '7.2f')}s "
+                              f"{_fmt(r['overhead_p95_s'], '7.2f')}s {_fmt(r['ttft_mean_s'], '6.2f')} "
+                              f"{_fmt(r['prompt_tokens_per_session'], '9d')} {r['papers_per_hour']:>9.0f} "
+                              f"{r['tokens_per_second']:>9.0f} {_fmt(r['peak_rss_mb'], '7.0f')} {r['failed']:>4}", flush=True)
+    finally:
+        server.stop()
+        if args.keep:
+            print(f"\nInputs and sessions kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "timestamp": time.time(), "results": results}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Review memory benchmark: indexing throughput, incremental updates and recall latency.
+
+Fills a scratch memory with `--docs` synthetic reviews/criticisms (words drawn from
+topic vocabularies, so similar documents exist), then reports:
+  - indexing rate of the initial fill and the cold load into the in-memory matrix;
+  - adding one more session and making it visible (add_session + refresh);
+  - recall latency (query embedding, matrix-vector scores, top-k, text fetch).
+
+Usage:
+    python benchmarks/bench_review_memory.py --docs 10000 50000 --queries 200
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from review_memory import ReviewMemory, embed
+
+TOPICS = 64
+WORDS_PER_TOPIC = 40
+WORDS_PER_DOC = 250
+
+def make_vocabulary(rng: random.Random) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [["".join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(WORDS_PER_TOPIC)]
+            for _ in range(TOPICS)]
+
+def make_text(rng: random.Random, vocabulary: list) -> str:
+    """Mostly words of one topic, some of another."""
+    main, other = rng.sample(vocabulary, 2)
+    return " ".join(rng.choice(main if rng.random() < 0.8 else other) for _ in range(WORDS_PER_DOC))
+
+def fill(memory: ReviewMemory, docs: int, rng: random.Random, vocabulary: list) -> float:
+    """Insert `docs` documents in batches, as many small sessions would. Returns seconds."""
+    start = time.perf_counter()
+    batch = []
+    for i in range(docs):
+        text = make_text(rng, vocabulary)
+        kind = "approved" if i % 3 == 0 else "criticism"
+        batch.append((f"s{i // 4}", f"doc{i}.md", kind, f"paper{i // 4}", f"sha{i // 4}", None, text,
+                      embed(text, memory.dim).tobytes()))
+        if len(batch) == 1000 or i == docs - 1:
+            with memory._connect() as conn:
+                conn.executemany(
+                    "INSERT INTO docs (session_id, filename, kind, paper, paper_sha256, created_at, text, vector) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch
+                )
+            batch = []
+    return time.perf_counter() - start
+
+def add_one_session(memory: ReviewMemory, workdir: str, rng: random.Random, vocabulary: list) -> float:
+    session_dir = os.path.join(workdir, "new_session")
+    os.makedirs(session_dir, exist_ok=True)
+    with open(os.path.join(session_dir, "Mode3_x_Approved_Review_Round2.md"), "w", encoding="utf-8") as f:
+        f.write(make_text(rng, vocabulary))
+    with open(os.path.join(session_dir, "Mode3_x_Teacher_Round1.md"), "w", encoding="utf-8") as f:
+        f.write(make_text(rng, vocabulary) + "\n[Verdict: Needs Revision]")
+    start = time.perf_counter()
+    memory.add_session(session_dir, {"session_id": "new_session", "files": {"paper": "x.pdf", "paper_sha256": "new"}})
+    memory.refresh()
+    return time.perf_counter() - start
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(rng)
+    results = []
+    print(f"{'docs':>7} {'index/s':>8} {'load_s':>7} {'add_ms':>7} {'recall p50':>11} {'p95':>8} {'max':>8}")
+    for docs in args.docs:
+        workdir = tempfile.mkdtemp(prefix="bench_memory_")
+        try:
+            memory = ReviewMemory(os.path.join(workdir, "memory.sqlite3"))
+            fill_s = fill(memory, docs, rng, vocabulary)
+            start = time.perf_counter()
+            memory.refresh()
+            load_s = time.perf_counter() - start
+            add_s = add_one_session(memory, workdir, rng, vocabulary)
+
+            latencies = []
+            for _ in range(args.queries):
+                query = make_text(rng, vocabulary) * 20
+                start = time.perf_counter()
+                memory.recall(query, args.top_k)
+                latencies.append(1000 * (time.perf_counter() - start))
+            row = {
+                "docs": docs, "index_docs_per_s": round(docs / fill_s), "load_s": round(load_s, 3),
+                "add_session_ms": round(1000 * add_s, 2), "recall_p50_ms": round(statistics.median(latencies), 2),
+                "recall_p95_ms": round(percentile(latencies, 95), 2), "recall_max_ms": round(max(latencies), 2)
+            }
+            results.append(row)
+            print(f"{docs:>7} {row['index_docs_per_s']:>8} {row['load_s']:>7.3f} {row['add_session_ms']:>7.2f} "
+                  f"{row['recall_p50_ms']:>11.2f} {row['recall_p95_ms']:>8.2f} {row['recall_max_ms']:>8.2f}", flush=True)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == "__main__":
+    main()
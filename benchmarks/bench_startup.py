@@ -0,0 +1,88 @@
+"""
+Startup-time benchmark for the Streamlit app and the headless entry points.
+
+Every sample runs in a fresh interpreter so nothing is served from an already
+imported module. Reports the median of:
+  - import time of app.py's dependency chain and of batch_review / job_worker,
+    and whether litellm / PyMuPDF / python-docx got loaded along the way;
+  - the app's first script run and a rerun (what every widget interaction
+    costs), executed with Streamlit's AppTest harness.
+
+Usage:
+    python benchmarks/bench_startup.py --repeats 5
+    python benchmarks/bench_startup.py --json startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("litellm", "fitz", "docx")
+
+# Imports of app.py except streamlit itself, in the same order
+APP_IMPORTS = "import utils, agents, cache, truncation, pipeline, tracing, job_queue, batch_review"
+
+IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+APP_PROBE = """
+import time, json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=120)
+start = time.perf_counter()
+at.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - start
+print(json.dumps({"first_run_s": first, "rerun_s": rerun, "exceptions": len(at.exception)}))
+"""
+
+def run_probe(code: str) -> dict:
+    env = dict(os.environ, LITELLM_LOCAL_MODEL_COST_MAP="True", SESSION_INDEX_DB="off")
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def median_of(samples: list, key: str) -> float:
+    return round(statistics.median(s[key] for s in samples), 3)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--skip-app", action="store_true", help="Only measure imports (no AppTest runs)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    targets = {"app_imports": APP_IMPORTS, "batch_review": "import batch_review", "job_worker": "import job_worker"}
+    print(f"{'target':<14} {'import_s':>9}  heavy modules loaded")
+    for name, imports in targets.items():
+        samples = [run_probe(IMPORT_PROBE.format(imports=imports, heavy=HEAVY_MODULES)) for _ in range(args.repeats)]
+        results[name] = {"import_s": median_of(samples, "import_s"), "loaded": samples[-1]["loaded"]}
+        print(f"{name:<14} {results[name]['import_s']:>9.3f}  {', '.join(results[name]['loaded']) or '-'}")
+
+    if not args.skip_app:
+        samples = [run_probe(APP_PROBE) for _ in range(args.repeats)]
+        results["app"] = {
+            "first_run_s": median_of(samples, "first_run_s"),
+            "rerun_s": median_of(samples, "rerun_s"),
+            "exceptions": max(s["exceptions"] for s in samples)
+        }
+        print(f"\napp first run {results['app']['first_run_s']:.3f}s, rerun {results['app']['rerun_s']:.3f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Local stub of the OpenAI chat-completions streaming API, for offline benchmarks.
+
+Responses are streamed as server-sent events after a configurable time to first
+token (optionally plus a prefill delay proportional to the prompt size), at a configurable tokens/sec, and end with a usage chunk when the client
+asks for `stream_options.include_usage`. Teacher calls (recognised by the
+<current_draft_review> block) end with an Approved or Needs Revision verdict.
+
+Usage:
+    python benchmarks/mock_llm_server.py --port 8911 --ttft 0.5 --tps 60 --verdict revise
+    # then point the app at it: BASE_URL=http://127.0.0.1:8911/v1 MODEL_NAME=openai/mock
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from aiohttp import web
+
+VERDICTS = ("approve", "revise", "random")
+FILLER = ("The paper proposes a method whose evaluation lacks strong baselines and ablations; "
+          "the claims in Section 4 need statistical support. ").split(" ")
+
+def _verdict_line(config: dict, rng: random.Random) -> str:
+    verdict = config["verdict"]
+    if verdict == "random":
+        approved = rng.random() < config["approve_prob"]
+    else:
+        approved = verdict == "approve"
+    return "\n\n[Verdict: Approved]" if approved else "\n\n[Verdict: Needs Revision]"
+
+def _chunk(completion_id: str, model: str, content: str = None, usage: dict = None, finish: str = None) -> bytes:
+    choices = [] if usage else [{"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish}]
+    payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+               "model": model, "choices": choices}
+    if usage:
+        payload["usage"] = usage
+    return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+def make_app(config: dict) -> web.Application:
+    """
+    config keys: ttft_s, prefill_tokens_per_s (0 = no prompt-size delay), tokens_per_s, response_tokens,
+    verdict (approve | revise | random), approve_prob (for "random") and seed.
+    """
+    rng = random.Random(config.get("seed", 0))
+    stats = {"requests": 0}
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        stats["requests"] += 1
+        messages = body.get("messages", [])
+        prompt_chars = sum(
+            len(m["content"]) if isinstance(m.get("content"), str)
+            else sum(len(p.get("text", "")) for p in m.get("content") or [])
+            for m in messages
+        )
+        is_teacher = any("<current_draft_review>" in str(m.get("content")) for m in messages)
+        words = [FILLER[i % len(FILLER)] for i in range(config["response_tokens"])]
+        pieces = [w + " " for w in words]
+        if is_teacher:
+            pieces.append(_verdict_line(config, rng))
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        completion_id = f"chatcmpl-mock-{stats['requests']}"
+        model = body.get("model", "mock")
+        prefill_tps = config.get("prefill_tokens_per_s") or 0
+        await asyncio.sleep(config["ttft_s"] + (prompt_chars / 4 / prefill_tps if prefill_tps > 0 else 0.0))
+        interval = 1.0 / config["tokens_per_s"] if config["tokens_per_s"] > 0 else 0.0
+        start = time.perf_counter()
+        for i, piece in enumerate(pieces):
+            # Pace against the start time so sleep overshoot does not accumulate
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await response.write(_chunk(completion_id, model, content=piece))
+        await response.write(_chunk(completion_id, model, finish="stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(pieces),
+                     "total_tokens": prompt_chars // 4 + len(pieces)}
+            await response.write(_chunk(completion_id, model, usage=usage))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/chat/completions", chat_completions)
+    app["stats"] = stats
+    return app
+
+class MockServer:
+    """Runs the stub in a background thread; use as a context manager or call start()/stop()."""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **config):
+        self.host = host
+        self.port = port
+        self.config = {"ttft_s": 0.5, "prefill_tokens_per_s": 0.0, "tokens_per_s": 60.0, "response_tokens": 200, "verdict": "approve",
+                       "approve_prob": 0.5, "seed": 0, **config}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="mock-llm-server", daemon=True)
+        self.runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def _start(self):
+        self.runner = web.AppRunner(make_app(self.config))
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self) -> "MockServer":
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible streaming stub for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--ttft", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--prefill-tps", type=float, default=0.0,
+                        help="Prompt tokens processed per second before the first token (0 = ttft only)")
+    parser.add_argument("--tps", type=float, default=60.0, help="Streamed tokens per second (0 = unthrottled)")
+    parser.add_argument("--response-tokens", type=int, default=200, help="Tokens per response")
+    parser.add_argument("--verdict", choices=VERDICTS, default="approve", help="Teacher verdict behaviour")
+    parser.add_argument("--approve-prob", type=float, default=0.5, help="Approval probability for --verdict random")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = {"ttft_s": args.ttft, "prefill_tokens_per_s": args.prefill_tps, "tokens_per_s": args.tps, "response_tokens": args.response_tokens,
+              "verdict": args.verdict, "approve_prob": args.approve_prob, "seed": args.seed}
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1 ({config})")
+    web.run_app(make_app(config), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
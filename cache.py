@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+def _evict_lru(cache_dir: str, suffix: str, max_bytes: int) -> int:
+    """Delete the least recently used (oldest mtime) entries until the directory fits max_bytes. Returns evictions."""
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    evicted = 0
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            evicted += 1
+        except OSError:
+            pass
+    return evicted
+
+def _atomic_write(path: str, content: str):
+    """Write via a temp file + rename so concurrent readers never see partial entries."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+# ------------------------------------------------------------------
+# EXTRACTED TEXT CACHE
+# ------------------------------------------------------------------
+
+DEFAULT_TEXT_CACHE_DIR = os.path.join(".cache", "extracted_text")
+DEFAULT_TEXT_CACHE_MAX_MB = 512
+
+class TextCache:
+    """
+    Content-addressed on-disk cache for extracted document text.
+
+    Entries are keyed by the SHA-256 of the raw file bytes plus the extractor
+    version, so re-reviewing the same paper skips parsing entirely while any
+    change to the extraction logic invalidates old entries. The cache is
+    capped at `max_bytes`; least recently used entries (by file mtime, which
+    is refreshed on every hit) are evicted first.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_TEXT_CACHE_DIR, max_bytes: int = DEFAULT_TEXT_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(data: bytes, version: str) -> str:
+        return TextCache.make_digest_key(hashlib.sha256(data).hexdigest(), version)
+
+    @staticmethod
+    def make_digest_key(sha256_hex: str, version: str) -> str:
+        """Same key as make_key, from a SHA-256 computed elsewhere (e.g. by streaming a file from disk)."""
+        return f"{sha256_hex}_{version}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def get(self, key: str) -> str:
+        """Return the cached text for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str):
+        """Store text under `key`, then evict old entries if over the size cap."""
+        _atomic_write(self._path(key), text)
+        with self._lock:
+            self.evictions += _evict_lru(self.cache_dir, ".txt", self.max_bytes)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+_text_cache = None
+_text_cache_lock = threading.Lock()
+
+def get_text_cache() -> TextCache:
+    """
+    Process-wide TextCache, configured from TEXT_CACHE_DIR / TEXT_CACHE_MAX_MB.
+    Returns None if TEXT_CACHE_MAX_MB is set to 0 (cache disabled).
+    """
+    global _text_cache
+    with _text_cache_lock:
+        if _text_cache is None:
+            max_mb = float(os.getenv("TEXT_CACHE_MAX_MB", DEFAULT_TEXT_CACHE_MAX_MB))
+            if max_mb <= 0:
+                return None
+            cache_dir = os.getenv("TEXT_CACHE_DIR", DEFAULT_TEXT_CACHE_DIR)
+            _text_cache = TextCache(cache_dir, int(max_mb * 1024 * 1024))
+        return _text_cache
+
+# ------------------------------------------------------------------
+# LLM RESPONSE CACHE
+# ------------------------------------------------------------------
+
+DEFAULT_RESPONSE_CACHE_DIR = os.path.join(".cache", "llm_responses")
+DEFAULT_RESPONSE_CACHE_MAX_MB = 256
+RESPONSE_CACHE_MODES = ("off", "record", "replay_only")
+# Request arguments that do not change the response and must not affect the key
+_UNKEYED_ARGS = ("api_key", "stream", "stream_options", "drop_params")
+
+class ResponseCache:
+    """
+    Deterministic on-disk cache of streamed LLM responses.
+
+    Keys hash the request (model, api_base, headers, messages and sampling params, never the
+    API key). On a hit the recorded chunks are replayed as a stream; `replay_speed`
+    scales the recorded inter-chunk timing (0 = instant, 1 = original pace, 2 = twice
+    as fast). In "record" mode misses go to the provider and are stored; in
+    "replay_only" mode a miss raises, for offline regression runs. Entries older than
+    `ttl_s` are treated as misses, and the directory is capped at `max_bytes` (LRU).
+    """
+    def __init__(self, cache_dir: str = DEFAULT_RESPONSE_CACHE_DIR, mode: str = "record", ttl_s: float = None,
+                 max_bytes: int = DEFAULT_RESPONSE_CACHE_MAX_MB * 1024 * 1024, replay_speed: float = 0.0):
+        if mode not in RESPONSE_CACHE_MODES:
+            raise ValueError(f"Unknown response cache mode: {mode}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.replay_speed = replay_speed
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(request_args: dict) -> str:
+        keyed = {k: v for k, v in request_args.items() if k not in _UNKEYED_ARGS}
+        payload = json.dumps(keyed, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> dict:
+        """Return the stored entry ({"chunks": [[offset_s, text], ...], "usage": ...}) or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if self.ttl_s is not None and time.time() - entry["created"] > self.ttl_s:
+                os.remove(path)
+                entry = None
+            else:
+                os.utime(path)  # Mark as recently used
+        except (OSError, ValueError, KeyError):
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, key: str, model: str, chunks: list, usage: dict = None):
+        entry = {"created": time.time(), "model": model, "chunks": chunks, "usage": usage}
+        _atomic_write(self._path(key), json.dumps(entry, ensure_ascii=False))
+        with self._lock:
+            self.evictions += _evict_lru(self.cache_dir, ".json", self.max_bytes)
+
+    async def areplay(self, entry: dict):
+        """Yield the recorded chunks, paced by replay_speed."""
+        start = time.time()
+        for offset, text in entry["chunks"]:
+            if self.replay_speed > 0:
+                delay = offset / self.replay_speed - (time.time() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield text
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """
+    Process-wide ResponseCache configured from LLM_CACHE_MODE (off | record | replay_only),
+    LLM_CACHE_DIR, LLM_CACHE_TTL_HOURS, LLM_CACHE_MAX_MB and LLM_CACHE_REPLAY_SPEED.
+    Returns None when the mode is "off" (the default).
+    """
+    global _response_cache
+    with _response_cache_lock:
+        mode = os.getenv("LLM_CACHE_MODE", "off")
+        if mode == "off":
+            return None
+        if _response_cache is None or _response_cache.mode != mode:
+            ttl_hours = os.getenv("LLM_CACHE_TTL_HOURS")
+            _response_cache = ResponseCache(
+                cache_dir=os.getenv("LLM_CACHE_DIR", DEFAULT_RESPONSE_CACHE_DIR),
+                mode=mode,
+                ttl_s=float(ttl_hours) * 3600 if ttl_hours else None,
+                max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_RESPONSE_CACHE_MAX_MB)) * 1024 * 1024),
+                replay_speed=float(os.getenv("LLM_CACHE_REPLAY_SPEED", 0))
+            )
+        return _response_cache
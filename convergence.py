@@ -0,0 +1,109 @@
+import os
+import re
+import difflib
+
+# ------------------------------------------------------------------
+# MODE 3 CONVERGENCE MONITOR & ITERATION BUDGET
+# ------------------------------------------------------------------
+# Two consecutive Student drafts that are nearly identical, or a Teacher that
+# repeats last round's feedback, mean another round is unlikely to change the
+# outcome. The monitor compares consecutive texts and, once the loop stalls,
+# either escalates to the primary model (if a cheaper cascade model was in use)
+# or stops. The budget caps the tokens, estimated cost and LLM time a session
+# may spend; when any of them is set it replaces the fixed round count.
+
+CONVERGENCE_MODES = ("off", "stop", "escalate")
+DEFAULT_DRAFT_SIMILARITY = 0.98
+DEFAULT_FEEDBACK_SIMILARITY = 0.95
+# Round limit used once a token/cost/time budget is in force (a safety net, not the main limit)
+BUDGET_MAX_ROUNDS = 10
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+def text_similarity(a: str, b: str) -> float:
+    """Word-level similarity in [0, 1] (1 = identical), via difflib's matching blocks."""
+    if not a and not b:
+        return 1.0
+    matcher = difflib.SequenceMatcher(None, _WORD.findall(a.lower()), _WORD.findall(b.lower()), autojunk=False)
+    return round(matcher.ratio(), 4)
+
+def load_budget(budget: dict = None) -> dict:
+    """
+    Session budget {"max_tokens", "max_cost_usd", "max_seconds", "max_rounds"}; unset keys
+    fall back to MODE3_MAX_TOKENS / MODE3_MAX_COST_USD / MODE3_MAX_SECONDS / MODE3_MAX_ROUNDS
+    (0 or empty = no limit).
+    """
+    budget = dict(budget or {})
+    for key, env, cast in (
+        ("max_tokens", "MODE3_MAX_TOKENS", int),
+        ("max_cost_usd", "MODE3_MAX_COST_USD", float),
+        ("max_seconds", "MODE3_MAX_SECONDS", float),
+        ("max_rounds", "MODE3_MAX_ROUNDS", int),
+    ):
+        if budget.get(key) is None:
+            value = os.getenv(env, "")
+            budget[key] = cast(value) if value and cast(value) > 0 else None
+    return budget
+
+def round_limit(max_iters: int, budget: dict) -> int:
+    """The round cap: max_iters, unless a token/cost/time budget replaces it."""
+    if budget.get("max_rounds"):
+        return budget["max_rounds"]
+    if any(budget.get(k) for k in ("max_tokens", "max_cost_usd", "max_seconds")):
+        return max(max_iters, BUDGET_MAX_ROUNDS)
+    return max_iters
+
+def budget_spent(session_metadata: dict, models: dict) -> dict:
+    """Tokens, estimated cost and LLM seconds spent so far (`models` as from pipeline.summarize_models)."""
+    iterations = session_metadata["iterations"]
+    costs = [m.get("cost_usd") for m in models.values()]
+    return {
+        "tokens": sum(it["tokens"].get("total_tokens", 0) for it in iterations),
+        "cost_usd": round(sum(costs), 6) if costs and None not in costs else None,
+        "seconds": round(sum(it.get("duration_s", 0.0) for it in iterations), 2),
+    }
+
+def budget_stop_reason(budget: dict, spent: dict, rounds_done: int) -> str:
+    """
+    "token_budget" / "cost_budget" / "time_budget" when spent, plus one more round at the
+    average cost of the rounds so far, would exceed the limit; otherwise None.
+    """
+    rounds_done = max(rounds_done, 1)
+    for key, spent_key, reason in (
+        ("max_tokens", "tokens", "token_budget"),
+        ("max_cost_usd", "cost_usd", "cost_budget"),
+        ("max_seconds", "seconds", "time_budget"),
+    ):
+        limit, used = budget.get(key), spent.get(spent_key)
+        if limit and used is not None and used + used / rounds_done > limit:
+            return reason
+    return None
+
+class ConvergenceMonitor:
+    """Tracks similarity between consecutive drafts and consecutive Teacher feedbacks."""
+    def __init__(self, draft_threshold: float = None, feedback_threshold: float = None):
+        self.draft_threshold = draft_threshold or float(os.getenv("CONVERGENCE_DRAFT_SIMILARITY", DEFAULT_DRAFT_SIMILARITY))
+        self.feedback_threshold = feedback_threshold or float(os.getenv("CONVERGENCE_FEEDBACK_SIMILARITY", DEFAULT_FEEDBACK_SIMILARITY))
+        self.draft_similarity = None
+        self.feedback_similarity = None
+
+    def start_round(self):
+        """Forget the previous round's similarities so a skipped observation cannot stall this one."""
+        self.draft_similarity = None
+        self.feedback_similarity = None
+
+    def observe_draft(self, previous: str, current: str) -> float:
+        self.draft_similarity = text_similarity(previous, current) if previous else None
+        return self.draft_similarity
+
+    def observe_feedback(self, previous: str, current: str) -> float:
+        self.feedback_similarity = text_similarity(previous, current) if previous else None
+        return self.feedback_similarity
+
+    def stall_reason(self) -> str:
+        """"draft_converged" or "feedback_repeated" if the last round made no real progress, else None."""
+        if self.draft_similarity is not None and self.draft_similarity >= self.draft_threshold:
+            return "draft_converged"
+        if self.feedback_similarity is not None and self.feedback_similarity >= self.feedback_threshold:
+            return "feedback_repeated"
+        return None
@@ -0,0 +1,163 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ------------------------------------------------------------------
+# LOCAL CLAIM-GROUNDING PRE-CHECK
+# ------------------------------------------------------------------
+# A cheap, deterministic stand-in for the Teacher's first job (catching
+# fabricated numbers and facts). Concrete claims are pulled out of a draft -
+# numbers, table/figure/equation references, dataset-like names and quoted
+# spans - and looked up in an index of the paper text. Claims with no match are
+# flagged as "ungrounded": passed to the Teacher as hints, and, in
+# "shortcircuit" mode, used to send a revision that still repeats them straight
+# back to the Student without a Teacher call.
+
+GROUNDING_MODES = ("off", "hints", "shortcircuit")
+# A quote counts as grounded when this share of its word 3-grams occurs in the paper
+QUOTE_MATCH_RATIO = 0.8
+MAX_LISTED_CLAIMS = 15
+# Heading of locally generated send-back feedback, so a resumed session can tell it from a Teacher reply
+SEND_BACK_HEADING = "### Automatic grounding check"
+PAPER_CACHE_SIZE = 16
+
+_NUMBER = re.compile(r"(?<![\w.])[-+]?\d{1,3}(?:,\d{3})+(?:\.\d+)?%?|(?<![\w.])[-+]?\d+(?:\.\d+)?%?")
+_REFERENCE = re.compile(r"\b(Table|Tab\.|Figure|Fig\.|Equation|Eq\.|Algorithm|Alg\.)\s*\(?(\d+)", re.IGNORECASE)
+_REFERENCE_KIND = {"tab": "table", "fig": "figure", "eq": "equation", "alg": "algorithm"}
+# CamelCase (ImageNet), mixed caps (SQuAD) or caps/name + number (CIFAR-10, GPT-4, WMT14)
+_NAME = re.compile(r"\b(?:[A-Z][a-z]+[A-Z]\w*|[A-Z]{2,}[a-z]+[A-Z]\w*|[A-Z][A-Za-z]*-?\d+[A-Za-z]*)\b")
+_QUOTE = re.compile(r"[\"“]([^\"”\n]{12,300})[\"”]")
+_LIST_MARKER = re.compile(r"^\s*(?:#+\s*)?\d+[.)]\s", re.MULTILINE)
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _normalize_number(raw: str) -> str:
+    value = raw.replace(",", "").rstrip("%").lstrip("+")
+    if "." in value:
+        value = value.rstrip("0").rstrip(".")
+    return value
+
+def _reference_key(kind: str, number: str) -> str:
+    kind = kind.lower().rstrip(".")
+    return f"{_REFERENCE_KIND.get(kind[:3], kind)} {number}"
+
+def _trigrams(words: list) -> set:
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+class PaperFacts:
+    """Lookup sets over the paper text, built once per paper."""
+    def __init__(self, paper_text: str):
+        self.numbers = {_normalize_number(m) for m in _NUMBER.findall(paper_text)}
+        self.references = {_reference_key(k, n) for k, n in _REFERENCE.findall(paper_text)}
+        self.words = set(_WORD.findall(paper_text.lower()))
+        self.names = {w.lower() for w in re.findall(r"\w[\w-]*", paper_text)}
+        self.trigrams = _trigrams(_WORD.findall(paper_text.lower()))
+
+_facts_cache = OrderedDict()
+_facts_lock = threading.Lock()
+
+def get_paper_facts(paper_text: str) -> PaperFacts:
+    key = hashlib.sha256(paper_text.encode("utf-8")).hexdigest()
+    with _facts_lock:
+        facts = _facts_cache.get(key)
+        if facts is not None:
+            _facts_cache.move_to_end(key)
+            return facts
+    facts = PaperFacts(paper_text)
+    with _facts_lock:
+        _facts_cache[key] = facts
+        while len(_facts_cache) > PAPER_CACHE_SIZE:
+            _facts_cache.popitem(last=False)
+    return facts
+
+def extract_claims(draft_text: str) -> list:
+    """Checkable claims in a draft as [{"type", "text"}], deduplicated, in order of appearance."""
+    text = _LIST_MARKER.sub(" ", draft_text)
+    claims, seen = [], set()
+
+    def add(kind: str, value: str):
+        if (kind, value) not in seen:
+            seen.add((kind, value))
+            claims.append({"type": kind, "text": value})
+
+    for quote in _QUOTE.findall(text):
+        if len(_WORD.findall(quote.lower())) >= 3:
+            add("quote", quote.strip())
+    for kind, number in _REFERENCE.findall(text):
+        add("reference", _reference_key(kind, number))
+    # References are checked as a whole; their numbers are not claims on their own
+    text = _REFERENCE.sub(" ", text)
+    for name in _NAME.findall(text):
+        if len(name) >= 3:
+            add("name", name)
+    text = _NAME.sub(" ", text)
+    for raw in _NUMBER.findall(text):
+        value = _normalize_number(raw)
+        # Single digits ("3 weaknesses", "point 2") are too generic to check
+        if value.lstrip("-").isdigit() and len(value.lstrip("-")) < 2:
+            continue
+        add("number", value)
+    return claims
+
+def _is_grounded(claim: dict, facts: PaperFacts) -> bool:
+    kind, value = claim["type"], claim["text"]
+    if kind == "number":
+        return value in facts.numbers or value.lstrip("-") in facts.numbers
+    if kind == "reference":
+        return value in facts.references
+    if kind == "name":
+        return value.lower() in facts.names
+    grams = _trigrams(_WORD.findall(value.lower()))
+    if not grams:
+        return all(w in facts.words for w in _WORD.findall(value.lower()))
+    return sum(g in facts.trigrams for g in grams) / len(grams) >= QUOTE_MATCH_RATIO
+
+def check_grounding(paper_text: str, draft_text: str) -> dict:
+    """Checks every claim of the draft against the paper. Returns {"claims_checked", "ungrounded", "duration_ms"}."""
+    start = time.perf_counter()
+    facts = get_paper_facts(paper_text)
+    claims = extract_claims(draft_text)
+    ungrounded = [c for c in claims if not _is_grounded(c, facts)]
+    return {
+        "claims_checked": len(claims),
+        "ungrounded": ungrounded,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
+def repeated_claims(previous: dict, current: dict) -> list:
+    """Ungrounded claims of `current` that were already flagged in `previous`."""
+    if not previous or not current:
+        return []
+    flagged = {(c["type"], c["text"]) for c in previous["ungrounded"]}
+    return [c for c in current["ungrounded"] if (c["type"], c["text"]) in flagged]
+
+def _claim_lines(claims: list) -> str:
+    lines = [f"- {c['type']}: `{c['text']}`" for c in claims[:MAX_LISTED_CLAIMS]]
+    if len(claims) > MAX_LISTED_CLAIMS:
+        lines.append(f"- ... and {len(claims) - MAX_LISTED_CLAIMS} more")
+    return "\n".join(lines)
+
+def format_grounding_hints(report: dict) -> str:
+    """Hint block appended to the Teacher prompt ("" when nothing was flagged)."""
+    if not report or not report["ungrounded"]:
+        return ""
+    return (
+        "<grounding_precheck>\n"
+        "An automatic string match found no occurrence of these draft claims in the paper text. "
+        "Verify each one; they are likely hallucinations, but PDF extraction may have mangled the original.\n"
+        f"{_claim_lines(report['ungrounded'])}\n"
+        "</grounding_precheck>"
+    )
+
+def format_send_back(claims: list, previous_feedback: str) -> str:
+    """Teacher-style feedback for a revision sent back without a Teacher call."""
+    return (
+        "[Verdict: Needs Revision]\n\n"
+        f"{SEND_BACK_HEADING}\n"
+        "This revision still contains claims that were flagged last round and still do not appear anywhere in "
+        "the paper. Remove them or replace them with what the paper actually reports:\n"
+        f"{_claim_lines(claims)}\n\n"
+        "### Previous Teacher feedback (still applies)\n"
+        f"{previous_feedback}"
+    )
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import sqlite3
+from datetime import datetime
+from utils import write_file_chunks
+
+# ------------------------------------------------------------------
+# PERSISTENT REVIEW JOB QUEUE
+# ------------------------------------------------------------------
+# Reviews submitted from the UI are stored as rows in a local SQLite file and
+# drained by job_worker.py processes, so a long run survives the browser tab
+# and never blocks a Streamlit script thread. Job lifecycle:
+#   queued -> running -> completed | failed
+# A running job whose worker stops heartbeating is put back in the queue; if it
+# already wrote a Mode 3 checkpoint, the next worker resumes it from there.
+# Secrets are never stored: workers take the API key from their own environment.
+
+DEFAULT_JOB_DB = os.path.join(".cache", "jobs.sqlite3")
+DEFAULT_UPLOAD_DIR = os.path.join(".cache", "job_uploads")
+# Streamed agent output of a running job, appended turn by turn in its session folder
+LIVE_OUTPUT_FILENAME = "live_output.md"
+WORKER_STALE_S = 60
+# Config keys dropped from job payloads before they are written to the queue
+SECRET_CONFIG_KEYS = ("api_key",)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    session_id TEXT,
+    session_dir TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    pid INTEGER,
+    heartbeat REAL NOT NULL
+);
+"""
+
+def _without_secrets(payload: dict) -> dict:
+    config = {k: v for k, v in (payload.get("config") or {}).items() if k not in SECRET_CONFIG_KEYS}
+    return {**payload, "config": config}
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+class JobQueue:
+    """
+    SQLite-backed FIFO of review jobs. Every method opens its own short-lived
+    connection, so one instance may be shared across threads and processes.
+    """
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("JOB_QUEUE_DB", DEFAULT_JOB_DB)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._scrub_secrets(conn)
+
+    def _scrub_secrets(self, conn: sqlite3.Connection):
+        """Removes API keys that queues written by older versions stored in job payloads."""
+        rows = conn.execute("SELECT id, payload FROM jobs WHERE payload LIKE '%api_key%'").fetchall()
+        for row in rows:
+            payload = json.loads(row["payload"])
+            conn.execute("UPDATE jobs SET payload = ? WHERE id = ?",
+                         (json.dumps(_without_secrets(payload), ensure_ascii=False), row["id"]))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, payload: dict) -> int:
+        """
+        Queue a job. `payload` holds everything the worker needs (see job_worker.run_job) except
+        secrets: SECRET_CONFIG_KEYS are dropped. Returns the job id.
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (status, payload, created_at) VALUES ('queued', ?, ?)",
+                (json.dumps(_without_secrets(payload), ensure_ascii=False), time.time())
+            )
+            return cur.lastrowid
+
+    def claim(self, worker_id: str) -> dict:
+        """Atomically take the oldest queued job for `worker_id`, or return None if the queue is empty."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker_id, time.time(), row["id"])
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+            return _row_to_job(job)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def set_session(self, job_id: int, session_id: str, session_dir: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET session_id = ?, session_dir = ? WHERE id = ?", (session_id, session_dir, job_id))
+
+    def finish(self, job_id: int, result: dict):
+        """Mark a job completed (or failed, if the result status is "error")."""
+        status = "failed" if result.get("status") == "error" else "completed"
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+                (status, time.time(), json.dumps(result, ensure_ascii=False), result.get("error"), job_id)
+            )
+
+    def get(self, job_id: int) -> dict:
+        with self._connect() as conn:
+            return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def recent(self, limit: int = 20) -> list:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [_row_to_job(r) for r in rows]
+
+    def position(self, job_id: int) -> int:
+        """1-based place of a queued job in line, or 0 if it is no longer queued."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] != "queued":
+                return 0
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id <= ?", (job_id,)).fetchone()[0]
+
+    def heartbeat(self, worker_id: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO workers (worker_id, pid, heartbeat) VALUES (?, ?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (worker_id, os.getpid(), time.time())
+            )
+
+    def live_workers(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat > ?", (time.time() - WORKER_STALE_S,)
+            ).fetchone()[0]
+
+    def requeue_stale(self) -> int:
+        """Put running jobs of workers that stopped heartbeating back in the queue. Returns how many."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL WHERE status = 'running' AND worker_id NOT IN "
+                "(SELECT worker_id FROM workers WHERE heartbeat > ?)",
+                (time.time() - WORKER_STALE_S,)
+            )
+            return cur.rowcount
+
+def save_job_upload(uploaded_file, upload_dir: str = DEFAULT_UPLOAD_DIR) -> str:
+    """Persist an uploaded file for a worker to read. Returns its path, or None if no file was given."""
+    if uploaded_file is None:
+        return None
+    folder = os.path.join(upload_dir, datetime.now().strftime("%Y%m%d_%H%M%S_%f"))
+    os.makedirs(folder, exist_ok=True)
+    filepath = os.path.abspath(os.path.join(folder, os.path.basename(uploaded_file.name)))
+    write_file_chunks(uploaded_file, filepath)
+    return filepath
+
+def remove_job_uploads(payload: dict, upload_dir: str = DEFAULT_UPLOAD_DIR):
+    """Delete the files save_job_upload stored for a finished job. Paths outside upload_dir are left alone."""
+    root = os.path.abspath(upload_dir)
+    for key in ("paper_path", "template_path", "draft_path"):
+        path = payload.get(key)
+        if not path or os.path.dirname(os.path.dirname(os.path.abspath(path))) != root:
+            continue
+        try:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+def read_live_output(session_dir: str, max_chars: int = 6000) -> str:
+    """Tail of a job's streamed output so far ("" if nothing was written yet)."""
+    if not session_dir:
+        return ""
+    try:
+        with open(os.path.join(session_dir, LIVE_OUTPUT_FILENAME), "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return ""
+    return text[-max_chars:]
@@ -0,0 +1,164 @@
+"""
+Worker pool for the persistent review job queue (see job_queue.py).
+
+Each worker process claims the oldest queued job, runs it with the same code
+path as batch_review.py, streams the agents' output into the session's
+live_output.md (tailed by the UI) and stores the summary back in the queue.
+
+Usage:
+    python job_worker.py --workers 2
+"""
+import os
+import time
+import signal
+import socket
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+from dotenv import load_dotenv
+from utils import load_checkpoint_status
+from pipeline import RESUMABLE_STATUSES
+from batch_review import review_paper, resume_session
+from job_queue import JobQueue, LIVE_OUTPUT_FILENAME, remove_job_uploads
+from llm_runtime import preload
+
+HEARTBEAT_INTERVAL_S = 10
+
+def make_live_render(session_dir: str):
+    """
+    Renderer that appends every streamed chunk to <session_dir>/live_output.md as it arrives.
+    Only one turn streams at a time: Mode 4 panel members that run alongside it buffer their
+    output and write it as one section when they finish, so sections never interleave.
+    """
+    path = os.path.join(session_dir, LIVE_OUTPUT_FILENAME)
+    lock = threading.Lock()
+
+    def render(agent_role, round_num, stream_generator):
+        header = f"\n\n---\n#### Round {round_num} · {agent_role}\n\n"
+        if not lock.acquire(blocking=False):
+            text = "".join(stream_generator)
+            with lock, open(path, "a", encoding="utf-8") as f:
+                f.write(header + text)
+            return text
+        parts = []
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(header)
+                f.flush()
+                for chunk in stream_generator:
+                    parts.append(chunk)
+                    f.write(chunk)
+                    f.flush()
+        finally:
+            lock.release()
+        return "".join(parts)
+    return render
+
+def run_job(queue: JobQueue, job: dict) -> dict:
+    """Runs one claimed job to completion and records its summary. Never raises."""
+    payload = job["payload"]
+    base_dir = payload.get("base_dir", "review_outputs")
+    try:
+        # The queue never stores the API key; each worker uses its own (API_KEY from its environment or .env)
+        config = {**payload["config"], "api_key": os.getenv("API_KEY", "")}
+        if not config["api_key"]:
+            raise Exception("No API key for this worker: set API_KEY in its environment or .env")
+        checkpoint = load_checkpoint_status(job["session_dir"]) if job["session_dir"] else None
+        if checkpoint and checkpoint.get("status") in RESUMABLE_STATUSES:
+            # A previous worker died mid-run: continue from its last completed turn
+            summary = resume_session(job["session_dir"], config, render=make_live_render(job["session_dir"]))
+        else:
+            session_id = job["session_id"] or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_job{job['id']:05d}"
+            session_dir = os.path.join(os.getcwd(), base_dir, session_id)
+            os.makedirs(session_dir, exist_ok=True)
+            queue.set_session(job["id"], session_id, session_dir)
+            summary = review_paper(
+                payload["paper_path"], session_id, payload["mode"], config, payload["prompts"],
+                template_path=payload.get("template_path"), draft_path=payload.get("draft_path"), base_dir=base_dir,
+                max_iters=payload.get("max_iters", 3), revision_mode=payload.get("revision_mode", "full"),
+                render=make_live_render(session_dir), grounding=payload.get("grounding", "off"),
+                convergence=payload.get("convergence", "off"), budget=payload.get("budget"),
+                panel_size=payload.get("panel_size", 3), panel_merge=payload.get("panel_merge", "consolidate")
+            )
+    except Exception as e:
+        summary = {"status": "error", "error": str(e)}
+    queue.finish(job["id"], summary)
+    remove_job_uploads(payload)
+    return summary
+
+def worker_loop(poll_s: float = 2.0):
+    load_dotenv()
+    queue = JobQueue()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    queue.heartbeat(worker_id)
+
+    def beat():
+        # Keeps the heartbeat fresh while a long job runs on the main thread
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL_S)
+            queue.heartbeat(worker_id)
+    threading.Thread(target=beat, name="job-heartbeat", daemon=True).start()
+    preload()
+
+    print(f"[{worker_id}] Waiting for jobs in {queue.db_path}", flush=True)
+    while True:
+        requeued = queue.requeue_stale()
+        if requeued:
+            print(f"[{worker_id}] Requeued {requeued} job(s) from stopped workers", flush=True)
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_s)
+            continue
+        print(f"[{worker_id}] Running job #{job['id']}", flush=True)
+        summary = run_job(queue, job)
+        print(f"[{worker_id}] Job #{job['id']} finished: {summary.get('status')}", flush=True)
+
+def start_workers(count: int, target, args: tuple = ()) -> list:
+    """
+    Starts `count` worker processes running target(*args). They are not daemonic, so a job can
+    still fan out to its own child processes (parallel PDF extraction); stop them with stop_workers.
+    """
+    processes = [
+        multiprocessing.Process(target=target, args=args, name=f"job-worker-{i}")
+        for i in range(count)
+    ]
+    for p in processes:
+        p.start()
+    return processes
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def stop_workers(processes: list, timeout_s: float = 10.0):
+    """Terminates the workers and waits for them; stale jobs are requeued by the next worker (requeue_stale)."""
+    for p in processes:
+        p.terminate()
+    for p in processes:
+        p.join(timeout_s)
+        if p.is_alive():
+            p.kill()
+            p.join()
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Worker pool draining the Reviewer Tycoon job queue.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("JOB_WORKERS", 2)),
+                        help="Worker processes (default: JOB_WORKERS or 2)")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between polls of an empty queue")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        worker_loop(args.poll)
+        return
+    processes = start_workers(args.workers, worker_loop, (args.poll,))
+    # Non-daemonic workers outlive a killed parent: treat SIGTERM like Ctrl+C and stop them
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        stop_workers(processes)
+
+if __name__ == "__main__":
+    main()
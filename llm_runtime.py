@@ -0,0 +1,114 @@
+import os
+import atexit
+import asyncio
+import inspect
+import threading
+import weakref
+from functools import lru_cache
+
+# ------------------------------------------------------------------
+# ASYNC LLM RUNTIME
+# ------------------------------------------------------------------
+# All agent calls run on asyncio. Sync callers (Streamlit, the batch runner)
+# go through one background event loop thread, so every call in the process
+# shares the same pooled HTTP connections. litellm itself is imported on the
+# first call, so importing this module (e.g. at app startup) stays cheap.
+
+# Maximum simultaneous connections per pooled HTTP session
+DEFAULT_POOL_SIZE = 64
+
+_sessions = weakref.WeakKeyDictionary()
+
+@lru_cache(maxsize=1)
+def _aiohttp():
+    try:
+        import aiohttp
+    except ImportError:  # litellm falls back to its own per-call clients
+        return None
+    return aiohttp
+
+def preload():
+    """Import litellm now; headless runners call this up front so the import is not billed to the first session."""
+    import litellm  # noqa: F401
+
+@lru_cache(maxsize=1)
+def _acompletion_takes_session() -> bool:
+    from litellm import acompletion
+    return "shared_session" in inspect.signature(acompletion).parameters
+
+async def get_shared_session():
+    """
+    Pooled aiohttp session for the running event loop (one per loop, created lazily),
+    or None if this litellm/aiohttp combination cannot take a shared session.
+    """
+    aiohttp = _aiohttp()
+    if aiohttp is None or not _acompletion_takes_session():
+        return None
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=int(os.getenv("LLM_POOL_SIZE", DEFAULT_POOL_SIZE)), keepalive_timeout=60)
+        session = aiohttp.ClientSession(connector=connector)
+        _sessions[loop] = session
+    return session
+
+async def close_shared_session():
+    """Close the pooled session of the running loop; async callers should await this before their loop exits."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+async def acompletion_pooled(**args):
+    """litellm.acompletion over the loop's pooled session."""
+    from litellm import acompletion
+    session = await get_shared_session()
+    if session is not None:
+        args["shared_session"] = session
+    return await acompletion(**args)
+
+class _BackgroundLoop:
+    """A daemon thread running an event loop forever, for bridging sync callers onto async code."""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-event-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+_background = None
+_background_lock = threading.Lock()
+
+def background_loop() -> _BackgroundLoop:
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = _BackgroundLoop()
+            atexit.register(_close_background_session)
+        return _background
+
+def _close_background_session():
+    try:
+        _background.run(close_shared_session())
+    except Exception:
+        pass
+
+def run_sync(coro):
+    """Run a coroutine to completion on the shared background loop and return its result."""
+    return background_loop().run(coro)
+
+def iterate_sync(async_gen):
+    """
+    Expose an async generator as a plain generator, stepping it on the shared background loop.
+    Closing the sync generator early (or an error in the consumer) closes the async one too.
+    """
+    runner = background_loop()
+    try:
+        while True:
+            try:
+                item = runner.run(async_gen.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        runner.run(async_gen.aclose())
@@ -0,0 +1,60 @@
+import os
+import hashlib
+import threading
+from cache import TextCache
+from retrieval import scoped_paper_context
+
+# ------------------------------------------------------------------
+# PAPER DIGEST CONTEXT (one-time pre-pass, cached per paper)
+# ------------------------------------------------------------------
+# In "digest" paper-context mode a single LLM pre-pass condenses the paper into
+# a structured digest (claims, reported numbers with locations, datasets,
+# baselines, section summaries). Agents then get the digest as their paper block,
+# which stays identical across roles and rounds (so it is prompt-cache friendly),
+# plus the few passages relevant to the current call as excerpts. The digest is
+# cached on disk by the hash of the paper text, the digest prompt and the model.
+
+PAPER_CONTEXT_MODES = ("full", "digest")
+DIGEST_FILENAME = "Paper_Digest.md"
+DEFAULT_DIGEST_CACHE_DIR = os.path.join(".cache", "paper_digests")
+DEFAULT_DIGEST_CACHE_MAX_MB = 64
+# Paper passages sent next to the digest in each call
+DEFAULT_EXCERPT_TOP_K = 6
+
+DIGEST_NOTE = (
+    "The <original_paper> block holds a digest of the paper and <paper_excerpts> the passages most relevant "
+    "to this task (\"[...]\" marks omitted text). Do not call a claim unsupported merely because it is absent from both."
+)
+
+_digest_cache = None
+_digest_locks = {}
+_locks_guard = threading.Lock()
+
+def get_digest_cache() -> TextCache:
+    """Process-wide digest cache at PAPER_DIGEST_CACHE_DIR."""
+    global _digest_cache
+    with _locks_guard:
+        if _digest_cache is None:
+            _digest_cache = TextCache(
+                os.getenv("PAPER_DIGEST_CACHE_DIR", DEFAULT_DIGEST_CACHE_DIR), DEFAULT_DIGEST_CACHE_MAX_MB * 1024 * 1024
+            )
+        return _digest_cache
+
+def digest_key(paper_text: str, digest_prompt: str, model_name: str) -> str:
+    """Cache key: the paper text hash, versioned by the digest prompt and model (changing either invalidates old digests)."""
+    version = "digest_" + hashlib.sha256(f"{model_name}\n{digest_prompt}".encode("utf-8")).hexdigest()[:12]
+    return TextCache.make_key(paper_text.encode("utf-8"), version)
+
+def digest_lock(key: str) -> threading.Lock:
+    """Per-paper lock, so concurrent sessions of the same paper build its digest only once."""
+    with _locks_guard:
+        return _digest_locks.setdefault(key, threading.Lock())
+
+def format_digest_block(digest: str) -> str:
+    return f"<paper_digest>\n{digest.strip()}\n</paper_digest>"
+
+def digest_excerpts(paper_text: str, query_text: str, top_k: int = None) -> tuple:
+    """The paper passages relevant to `query_text` as a <paper_excerpts> block. Returns (block, stats)."""
+    top_k = top_k or int(os.getenv("PAPER_DIGEST_TOP_K", DEFAULT_EXCERPT_TOP_K))
+    excerpts, stats = scoped_paper_context(paper_text, query_text, top_k)
+    return f"<paper_excerpts>\n{excerpts}\n</paper_excerpts>", stats
@@ -0,0 +1,790 @@
+import os
+import re
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from utils import (
+    generate_output_filename, save_review, format_file_link, strip_think_tags,
+    save_checkpoint, close_checkpoint, load_checkpoint, load_checkpoint_status, save_metadata
+)
+from agents import DEFAULT_PANEL_PERSONAS, DEFAULT_PANEL_MERGE_PROMPT, DEFAULT_PANEL_SELECT_PROMPT, DEFAULT_DIGEST_PROMPT
+from paper_digest import DIGEST_FILENAME, get_digest_cache, digest_key, digest_lock
+from review_patch import parse_patch, apply_patch, PatchError
+from grounding import check_grounding, repeated_claims, format_grounding_hints, format_send_back, SEND_BACK_HEADING
+from convergence import ConvergenceMonitor, load_budget, round_limit, budget_spent, budget_stop_reason
+from tracing import SessionTrace, timed_stream, update_metrics_textfile
+from tokens import estimate_cost, prompt_reduction
+
+# ------------------------------------------------------------------
+# MODE RUNNERS
+# ------------------------------------------------------------------
+# The working modes are written against two callbacks so the same flow
+# drives both the Streamlit UI (app.py) and headless runs (batch_review.py):
+#   render(agent_role, round_num, stream_generator) -> full response text
+#   log(msg)                                         -> None
+
+DEFAULT_TEMPLATE_TEXT = "Standard Academic Review Structure (Motivation, Strengths, Weaknesses, Questions)"
+APPROVED_VERDICT = "[Verdict: Approved]"
+VERDICT_PATTERN = re.compile(r"\[Verdict:\s*(Approved|Needs Revision)\]")
+BEST_PATTERN = re.compile(r"\[Best:\s*Reviewer\s*(\d+)\]")
+PANEL_MERGE_MODES = ("consolidate", "select")
+
+def consume_stream(agent_role: str, round_num: int, stream_generator) -> str:
+    """Default renderer for headless runs: drain the stream into a single string."""
+    return "".join(stream_generator)
+
+def _noop_log(msg: str):
+    pass
+
+def stream_agent_call(agent, agent_role: str, round_num: int, stream_call, render=consume_stream, trace: SessionTrace = None) -> tuple:
+    """
+    Streams one agent call and counts its tokens, without saving anything.
+    `stream_call` is a zero-argument callable returning (stream_generator, used_messages).
+    Stage timings (prompt assembly, TTFT, inter-chunk gaps, generation speed) go into
+    iter_meta["timings"] and, with a trace, into the session's trace.jsonl.
+    Returns (full_response, iter_meta).
+    """
+    start_time = time.time()
+    timings = {}
+    try:
+        stream_generator, used_messages = stream_call()
+        timings["prompt_assembly_s"] = round(time.time() - start_time, 4)
+        full_response = render(agent_role, round_num, timed_stream(stream_generator, timings))
+    finally:
+        if trace is not None:
+            trace.record("prompt_assembly", timings.get("prompt_assembly_s", time.time() - start_time),
+                         ts=start_time, round=round_num, agent=agent_role)
+    duration = time.time() - start_time
+
+    tokens = agent.calculate_tokens(used_messages, full_response)
+    if timings.get("generation_s"):
+        timings["completion_tokens_per_s"] = round(tokens["completion_tokens"] / timings["generation_s"], 2)
+    iter_meta = {
+        "round": round_num, "agent": agent_role, "model": agent.model_name, "duration_s": round(duration, 2),
+        "tokens": tokens, "timings": timings, "output_file": None
+    }
+    if agent.last_cache_status:
+        iter_meta["response_cache"] = agent.last_cache_status
+    # limiter_wait_s, retries, and the fallback model (replacing "model") if the primary failed
+    iter_meta.update(agent.last_call_stats)
+    if agent.last_context_stats:
+        iter_meta["context"] = agent.last_context_stats
+    if trace is not None:
+        trace.record(
+            "llm_stream", timings["stream_s"], ts=start_time + timings["prompt_assembly_s"], round=round_num,
+            agent=agent_role, completion_tokens=tokens["completion_tokens"],
+            limiter_wait_s=iter_meta.get("limiter_wait_s"), retries=iter_meta.get("retries"),
+            response_cache=iter_meta.get("response_cache"),
+            **{k: v for k, v in timings.items() if k not in ("prompt_assembly_s", "stream_s")}
+        )
+    return full_response, iter_meta
+
+def traced_save_review(session_dir: str, filename: str, content: str) -> str:
+    with SessionTrace(session_dir).span("disk_write", file=filename):
+        return save_review(session_dir, filename, content)
+
+def keep_reasoning(agent, session_dir: str, filename: str, iter_meta: dict):
+    """
+    Notes the size of the call's reasoning; with KEEP_REASONING=1 it is also saved next to the
+    answer as *_Reasoning.md. Otherwise the reasoning is discarded after token counting.
+    """
+    if not agent.last_reasoning:
+        return
+    iter_meta["reasoning_chars"] = len(agent.last_reasoning)
+    if os.getenv("KEEP_REASONING", "0") == "1":
+        reasoning_filename = filename.replace(".md", "_Reasoning.md")
+        traced_save_review(session_dir, reasoning_filename, agent.last_reasoning.strip())
+        iter_meta["reasoning_file"] = reasoning_filename
+
+def run_agent_turn(agent, agent_role: str, round_num: int, stream_call, session_dir: str, filename: str, render=consume_stream) -> tuple:
+    """
+    Runs one agent call end to end: stream, count tokens, save the output file.
+    Returns (full_response, iter_meta, filepath).
+    """
+    full_response, iter_meta = stream_agent_call(agent, agent_role, round_num, stream_call, render, SessionTrace(session_dir))
+    filepath = traced_save_review(session_dir, filename, full_response)
+    keep_reasoning(agent, session_dir, filename, iter_meta)
+    iter_meta["output_file"] = filename
+    return full_response, iter_meta, filepath
+
+def parse_verdict(feedback: str) -> str:
+    """ "Approved" or "Needs Revision", or None when the reply has no verdict or contradicting ones."""
+    verdicts = set(VERDICT_PATTERN.findall(strip_think_tags(feedback)))
+    return verdicts.pop() if len(verdicts) == 1 else None
+
+def run_teacher_turn(teacher_agent, round_num: int, evaluate, session_dir: str, filename: str,
+                     session_metadata: dict, render=consume_stream, log=_noop_log) -> tuple:
+    """
+    One Teacher turn on the model the cascade assigns to this round. When that is not the
+    approval model, an Approved verdict is confirmed, and a reply without a well-formed
+    verdict re-evaluated, by the approval model, whose reply then counts.
+    `evaluate(agent)` returns (stream_generator, used_messages). The approval model's reply is
+    saved as *_Teacher_Escalated_RoundN.md. Appends the iteration(s) to the metadata and
+    returns (feedback, iter_meta, filepath) of the reply that counts.
+    """
+    teacher = teacher_agent.for_round(round_num)
+    feedback, iter_meta, filepath = run_agent_turn(
+        teacher, "Teacher", round_num, lambda: evaluate(teacher), session_dir, filename, render
+    )
+    session_metadata["iterations"].append(iter_meta)
+
+    approver = teacher_agent.approval_agent(round_num)
+    if approver is teacher or (approver.model_name, approver.base_url) == (teacher.model_name, teacher.base_url):
+        return feedback, iter_meta, filepath
+    verdict = parse_verdict(feedback)
+    if verdict == "Needs Revision":
+        return feedback, iter_meta, filepath
+    reason = "approval_check" if verdict == "Approved" else "malformed_verdict"
+    log(f"⬆️ Teacher R{round_num}: escalating to {approver.model_name} ({reason.replace('_', ' ')})")
+    # Saved next to the cheap reply, which its own iteration entry still points at
+    escalated_filename = re.sub(r"_Teacher_Round(\d+)\.md$", r"_Teacher_Escalated_Round\1.md", filename)
+    feedback, iter_meta, filepath = run_agent_turn(
+        approver, "Teacher", round_num, lambda: evaluate(approver), session_dir, escalated_filename, render
+    )
+    iter_meta["escalated"] = reason
+    session_metadata["iterations"].append(iter_meta)
+    return feedback, iter_meta, filepath
+
+def run_patch_revision(student_agent, round_num: int, paper_text: str, template_text: str, prompts: dict,
+                       previous_draft: str, teacher_feedback: str, paper_title: str, session_dir: str,
+                       session_metadata: dict, render=consume_stream, log=_noop_log) -> tuple:
+    """
+    Mode 3 Student revision as JSON section edits applied locally to the previous draft.
+    The raw patch is kept as *_Student_Patch_RoundN.md and the reconstructed full review is
+    saved as the usual *_Student_RoundN.md. A malformed or inapplicable patch falls back to
+    a full regeneration call. Returns (revised_review, filepath).
+    """
+    patch_response, iter_meta = stream_agent_call(
+        student_agent, "Student", round_num,
+        lambda: student_agent.generate_review_stream(
+            paper_text, template_text, prompts["student"],
+            previous_feedback=teacher_feedback, mode3_prompt=prompts["mode3"],
+            previous_draft=previous_draft, revision_mode="patch"
+        ),
+        render, SessionTrace(session_dir)
+    )
+    patch_filename = generate_output_filename("Mode3", paper_title, "Student_Patch", round_num)
+    traced_save_review(session_dir, patch_filename, patch_response)
+    keep_reasoning(student_agent, session_dir, patch_filename, iter_meta)
+    iter_meta["patch_file"] = patch_filename
+    filename = generate_output_filename("Mode3", paper_title, "Student", round_num)
+
+    try:
+        edits = parse_patch(strip_think_tags(patch_response))
+        revised = apply_patch(strip_think_tags(previous_draft), edits)
+    except PatchError as e:
+        iter_meta.update({"revision_mode": "patch_failed", "patch_error": str(e)})
+        session_metadata["iterations"].append(iter_meta)
+        log(f"⚠️ Student R{round_num} patch rejected ({e}); falling back to full regeneration.")
+
+        revised, fallback_meta, filepath = run_agent_turn(
+            student_agent, "Student", round_num,
+            lambda: student_agent.generate_review_stream(
+                paper_text, template_text, prompts["student"],
+                previous_feedback=teacher_feedback, mode3_prompt=prompts["mode3"],
+                previous_draft=previous_draft
+            ),
+            session_dir, filename, render
+        )
+        fallback_meta["revision_mode"] = "full_fallback"
+        session_metadata["iterations"].append(fallback_meta)
+        return revised, filepath
+
+    filepath = traced_save_review(session_dir, filename, revised)
+    iter_meta.update({"revision_mode": "patch", "patch_edits": len(edits), "output_file": filename})
+    session_metadata["iterations"].append(iter_meta)
+    return revised, filepath
+
+def finalize_session(session_dir: str, session_metadata: dict, status: str) -> str:
+    """
+    Records the final status, summarises the session trace into session_metadata["timings"],
+    adds the run to the metrics text file (if METRICS_TEXTFILE is set), saves
+    metadata.md/json (which also refreshes the session index) and adds the session's
+    approved reviews and criticisms to the review memory.
+    Returns the metadata.md path.
+    """
+    trace = SessionTrace(session_dir)
+    session_metadata["status"] = status
+    session_metadata["timings"] = trace.summary()
+    session_metadata["models"] = summarize_models(session_metadata)
+    teacher_context = summarize_teacher_context(session_metadata)
+    if teacher_context:
+        session_metadata["teacher_context"] = teacher_context
+    paper_context = summarize_paper_context(session_metadata)
+    if paper_context:
+        session_metadata.setdefault("paper_digest", {}).update(paper_context)
+    update_metrics_textfile(session_dir, session_metadata, status)
+    with trace.span("disk_write", file="metadata.json"):
+        metadata_path = save_metadata(session_dir, session_metadata)
+    # Imported on use (here and in recall_review_memory) so importing the pipeline does not load NumPy
+    from review_memory import remember_session
+    remember_session(session_dir, session_metadata)
+    return metadata_path
+
+def summarize_prompt_cache(session_metadata: dict) -> dict:
+    """Totals of provider-reported cached vs uncached prompt tokens over all iterations, or None if never reported."""
+    reported = [it["tokens"] for it in session_metadata["iterations"] if "cached_prompt_tokens" in it["tokens"]]
+    if not reported:
+        return None
+    return {
+        "cached_prompt_tokens": sum(t["cached_prompt_tokens"] for t in reported),
+        "uncached_prompt_tokens": sum(t["uncached_prompt_tokens"] for t in reported),
+        "reported_calls": len(reported)
+    }
+
+def summarize_models(session_metadata: dict) -> dict:
+    """Calls, tokens, LLM time and estimated cost per model that answered, to compare cascade tiers."""
+    models = {}
+    for it in session_metadata["iterations"]:
+        if it["tokens"].get("prompt_source") == "local":
+            continue
+        model = it.get("model") or session_metadata.get("model")
+        entry = models.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "duration_s": 0.0})
+        entry["calls"] += 1
+        entry["prompt_tokens"] += it["tokens"].get("prompt_tokens", 0)
+        entry["completion_tokens"] += it["tokens"].get("completion_tokens", 0)
+        entry["duration_s"] = round(entry["duration_s"] + it.get("duration_s", 0.0), 2)
+    for model, entry in models.items():
+        entry["total_tokens"] = entry["prompt_tokens"] + entry["completion_tokens"]
+        entry["cost_usd"] = estimate_cost(model, entry["prompt_tokens"], entry["completion_tokens"])
+        if entry["duration_s"]:
+            entry["completion_tokens_per_s"] = round(entry["completion_tokens"] / entry["duration_s"], 2)
+    return models
+
+def scoped_context_calls(session_metadata: dict, mode: str) -> list:
+    """The iterations whose paper context was scoped in `mode` ("retrieval" or "digest")."""
+    return [it for it in session_metadata["iterations"] if it.get("context", {}).get("mode") == mode]
+
+def summarize_scoped_context(calls: list) -> dict:
+    """Call count and summed prompt_reduction of scoped calls (see BaseAgent._scoped_messages)."""
+    return {
+        "calls": len(calls),
+        **prompt_reduction(
+            sum(it["context"]["full_prompt_tokens"] for it in calls), sum(it["context"]["prompt_tokens"] for it in calls)
+        )
+    }
+
+def summarize_teacher_context(session_metadata: dict) -> dict:
+    """Prompt tokens saved by retrieval-scoped Teacher calls vs. sending the full paper, or None if none were scoped."""
+    calls = scoped_context_calls(session_metadata, "retrieval")
+    return {"mode": "retrieval", **summarize_scoped_context(calls)} if calls else None
+
+def summarize_paper_context(session_metadata: dict) -> dict:
+    """
+    Digest-context calls against the same calls with the full paper: prompt tokens (net of the
+    digest pre-pass when it ran in this session) and mean latency. None if no call used the digest.
+    The full-text latency is not observed in a digest session; compare the means across sessions
+    or with benchmarks/bench_pipeline.py --paper-context full digest.
+    """
+    calls = scoped_context_calls(session_metadata, "digest")
+    if not calls:
+        return None
+    summary = summarize_scoped_context(calls)
+    digest = session_metadata.get("paper_digest", {})
+    ttfts = [it["timings"]["ttft_s"] for it in calls if it["timings"].get("ttft_s") is not None]
+    return {
+        **summary,
+        "net_saved_tokens": summary["saved_prompt_tokens"] - (0 if digest.get("cached") else digest.get("total_tokens", 0)),
+        "ttft_s_mean": round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+        "duration_s_mean": round(sum(it["duration_s"] for it in calls) / len(calls), 2)
+    }
+
+def prepare_paper_digest(agent, paper_text: str, session_dir: str, session_metadata: dict, log=_noop_log) -> str:
+    """
+    The paper digest for digest-context agents: the session's own Paper_Digest.md when resuming,
+    else the digest cache, else one pre-pass call by agent.digest_agent() (recorded as a round 0
+    "Digest" iteration). Concurrent sessions of the same paper wait for a single pre-pass.
+    How the digest was obtained is recorded in session_metadata["paper_digest"].
+    """
+    digest_path = os.path.join(session_dir, DIGEST_FILENAME)
+    if os.path.exists(digest_path):
+        with open(digest_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    writer = agent.digest_agent()
+    cache = get_digest_cache()
+    key = digest_key(paper_text, DEFAULT_DIGEST_PROMPT, writer.model_name)
+    with digest_lock(key):
+        digest = cache.get(key)
+        info = {"cached": digest is not None, "model": writer.model_name}
+        if digest is None:
+            log("📑 Writing the paper digest (once per paper)...")
+            text, iter_meta = stream_agent_call(
+                writer, "Digest", 0, lambda: writer.digest_paper_stream(paper_text), trace=SessionTrace(session_dir)
+            )
+            digest = strip_think_tags(text).strip()
+            if not digest:
+                raise Exception("The digest model returned an empty digest")
+            iter_meta["output_file"] = DIGEST_FILENAME
+            session_metadata["iterations"].append(iter_meta)
+            cache.put(key, digest)
+            info.update({"duration_s": iter_meta["duration_s"], "total_tokens": iter_meta["tokens"].get("total_tokens", 0)})
+    traced_save_review(session_dir, DIGEST_FILENAME, digest)
+    session_metadata["paper_digest"] = {**info, "chars": len(digest), "file": DIGEST_FILENAME}
+    how = "reused from cache" if info["cached"] else f"written in {info['duration_s']:.1f}s"
+    log(f"📑 Paper digest {how} ({len(digest)} chars vs {len(paper_text)} in the paper)")
+    return digest
+
+def with_paper_digest(agents: list, paper_text: str, session_dir: str, session_metadata: dict, log=_noop_log) -> list:
+    """
+    `agents` with the paper digest attached to those in "digest" paper-context mode. If the digest
+    cannot be built they keep the full paper (the error is logged and recorded), so a failed
+    pre-pass never costs the session.
+    """
+    digest_agents = [a for a in agents if a is not None and a.paper_context == "digest"]
+    if not digest_agents:
+        return agents
+    try:
+        digest = prepare_paper_digest(digest_agents[0], paper_text, session_dir, session_metadata, log)
+    except Exception as e:
+        session_metadata["paper_digest"] = {"error": str(e)}
+        log(f"⚠️ Paper digest failed ({e}); using the full paper text.")
+        return agents
+    return [a.with_digest(digest) if a in digest_agents else a for a in agents]
+
+def recall_review_memory(student_agent, paper_text: str, session_dir: str, session_metadata: dict, log=_noop_log) -> str:
+    """
+    The <review_memory> block for the Student's first draft: the agent's `memory_top_k` most similar
+    past approved reviews and Teacher criticisms, other papers only. "" when memory is off or empty.
+    What was recalled is recorded in session_metadata["review_memory"]. An unreadable memory is
+    recorded there as {"error": ...} and the draft is written without it.
+    """
+    if not student_agent.memory_top_k:
+        return ""
+    from review_memory import get_review_memory, format_memory_context, MEMORY_ERRORS
+    try:
+        memory = get_review_memory()
+        if memory is None:
+            return ""
+        with SessionTrace(session_dir).span("memory_recall"):
+            recall = memory.recall(paper_text, student_agent.memory_top_k, session_metadata["files"].get("paper_sha256"))
+    except MEMORY_ERRORS as e:
+        session_metadata["review_memory"] = {"error": str(e)}
+        log(f"⚠️ Review memory unavailable ({e}); drafting without it.")
+        return ""
+    session_metadata["review_memory"] = recall["stats"]
+    log(f"🧠 Review memory: {len(recall['approved'])} approved reviews, {len(recall['criticisms'])} criticisms "
+        f"recalled from {recall['stats']['documents']} documents ({recall['stats']['search_ms']} ms)")
+    return format_memory_context(recall)
+
+def run_mode1(student_agent, paper_text: str, paper_title: str, template_text: str, prompts: dict,
+              session_dir: str, session_metadata: dict, render=consume_stream, log=_noop_log) -> dict:
+    """Mode 1: a single Student review. Exceptions propagate to the caller."""
+    log("Mode 1 Started: Student Base Review")
+    student_agent, = with_paper_digest([student_agent], paper_text, session_dir, session_metadata, log)
+    filename = generate_output_filename("Mode1", paper_title, "Student", 1)
+    student = student_agent.for_round(1)
+    memory_context = recall_review_memory(student_agent, paper_text, session_dir, session_metadata, log)
+    full_response, iter_meta, filepath = run_agent_turn(
+        student, "Student", 1,
+        lambda: student.generate_review_stream(paper_text, template_text, prompts["student"], memory_context=memory_context),
+        session_dir, filename, render
+    )
+    session_metadata["iterations"].append(iter_meta)
+
+    log(f"✅ Mode 1 Finished in {iter_meta['duration_s']:.2f}s! Tokens: {iter_meta['tokens'].get('total_tokens')}")
+    log(f"Saved: {format_file_link(filepath)}")
+    return {"status": "completed", "text": strip_think_tags(full_response), "filename": filename}
+
+def run_mode2(teacher_agent, paper_text: str, paper_title: str, draft_text: str, prompts: dict,
+              session_dir: str, session_metadata: dict, render=consume_stream, log=_noop_log) -> dict:
+    """Mode 2: a single Teacher evaluation of an existing draft. Exceptions propagate to the caller."""
+    log("Mode 2 Started: Teacher Evaluation")
+    teacher_agent, = with_paper_digest([teacher_agent], paper_text, session_dir, session_metadata, log)
+    filename = generate_output_filename("Mode2", paper_title, "Teacher", 1)
+    full_response, iter_meta, filepath = run_teacher_turn(
+        teacher_agent, 1, lambda agent: agent.evaluate_review_stream(paper_text, draft_text, prompts["teacher"]),
+        session_dir, filename, session_metadata, render, log
+    )
+
+    log(f"✅ Mode 2 Finished in {iter_meta['duration_s']:.2f}s! Tokens: {iter_meta['tokens'].get('total_tokens')}")
+    log(f"Saved: {format_file_link(filepath)}")
+    return {"status": "completed", "text": strip_think_tags(full_response), "filename": filename}
+
+def run_panel(student_agent, teacher_agent, paper_text: str, paper_title: str, template_text: str, prompts: dict,
+              session_dir: str, session_metadata: dict, render=consume_stream, log=_noop_log,
+              panel_size: int = 3, merge: str = "consolidate") -> dict:
+    """
+    Mode 4: `panel_size` Student reviewers write independent reviews of the same parsed
+    paper concurrently, each with its own persona (prompts["personas"], cycled) and seed;
+    then the Teacher, as area chair, either consolidates them into one review ("consolidate")
+    or picks the best one ("select"). Member streams are rendered as "Reviewer N";
+    render must therefore be callable from worker threads.
+    A failed member is recorded and left out of the merge; the panel only errors when
+    every member fails. Exceptions of the merge step propagate to the caller.
+    """
+    if merge not in PANEL_MERGE_MODES:
+        raise Exception(f"Unknown panel merge mode: {merge}")
+    template_text = template_text or DEFAULT_TEMPLATE_TEXT
+    personas = prompts.get("personas") or DEFAULT_PANEL_PERSONAS
+    temperature = float(os.getenv("PANEL_TEMPERATURE")) if os.getenv("PANEL_TEMPERATURE") else None
+    log(f"Mode 4 Started: Reviewer Panel ({panel_size} reviewers, {merge})")
+    student_agent, teacher_agent = with_paper_digest([student_agent, teacher_agent], paper_text, session_dir, session_metadata, log)
+    memory_context = recall_review_memory(student_agent, paper_text, session_dir, session_metadata, log)
+
+    def review(n: int) -> dict:
+        persona = personas[(n - 1) % len(personas)]
+        member = student_agent.for_round(1).with_sampling(seed=n, temperature=temperature)
+        system_prompt = f"{prompts['student'].strip()}\n\n# Reviewer Persona\n{persona}"
+        filename = generate_output_filename("Mode4", paper_title, f"Reviewer{n}", 1)
+        try:
+            text, iter_meta, filepath = run_agent_turn(
+                member, f"Reviewer {n}", 1,
+                lambda: member.generate_review_stream(paper_text, template_text, system_prompt, memory_context=memory_context),
+                session_dir, filename, render
+            )
+        except Exception as e:
+            return {"reviewer": n, "persona": persona, "error": str(e)}
+        iter_meta.update({"reviewer": n, "persona": persona, "seed": n})
+        return {"reviewer": n, "persona": persona, "text": text, "iter_meta": iter_meta, "filepath": filepath}
+
+    panel_start = time.time()
+    with ThreadPoolExecutor(max_workers=panel_size) as executor:
+        members = list(executor.map(review, range(1, panel_size + 1)))
+    panel_wall_s = round(time.time() - panel_start, 2)
+
+    reviews = []
+    for m in members:
+        if "error" in m:
+            log(f"❌ Reviewer {m['reviewer']} failed: {m['error']}")
+            continue
+        session_metadata["iterations"].append(m["iter_meta"])
+        reviews.append((m["reviewer"], strip_think_tags(m["text"])))
+        log(f"✅ Reviewer {m['reviewer']} done ({m['iter_meta']['duration_s']:.1f}s, {m['iter_meta']['tokens'].get('total_tokens')} tk). {format_file_link(m['filepath'])}")
+    member_durations = [m["iter_meta"]["duration_s"] for m in members if "iter_meta" in m]
+    session_metadata["panel"] = {
+        "size": panel_size, "merge": merge, "wall_s": panel_wall_s,
+        "slowest_member_s": max(member_durations, default=0.0),
+        "members": [
+            {
+                "reviewer": m["reviewer"], "persona": m["persona"],
+                **({"error": m["error"]} if "error" in m else {
+                    "model": m["iter_meta"]["model"], "duration_s": m["iter_meta"]["duration_s"],
+                    "ttft_s": m["iter_meta"]["timings"].get("ttft_s"),
+                    "total_tokens": m["iter_meta"]["tokens"].get("total_tokens"),
+                    "output_file": m["iter_meta"]["output_file"]
+                })
+            }
+            for m in members
+        ]
+    }
+    if not reviews:
+        return {"status": "error", "text": None, "filename": None, "error": "Every panel reviewer failed."}
+    log(f"Panel finished in {panel_wall_s:.1f}s (slowest reviewer {session_metadata['panel']['slowest_member_s']:.1f}s)")
+
+    if len(reviews) == 1:
+        text, filename = reviews[0][1], members[reviews[0][0] - 1]["iter_meta"]["output_file"]
+        session_metadata["panel"]["selected"] = reviews[0][0]
+        return {"status": "completed", "text": text, "filename": filename}
+
+    log("Area Chair merging the panel..." if merge == "consolidate" else "Area Chair selecting the best review...")
+    chair_prompt = (DEFAULT_PANEL_MERGE_PROMPT if merge == "consolidate" else DEFAULT_PANEL_SELECT_PROMPT).strip()
+    chair = teacher_agent.for_round(1)
+    filename = generate_output_filename("Mode4", paper_title, "Chair", 1)
+    chair_text, iter_meta, filepath = run_agent_turn(
+        chair, "Chair", 1, lambda: chair.merge_reviews_stream(paper_text, reviews, chair_prompt),
+        session_dir, filename, render
+    )
+    session_metadata["iterations"].append(iter_meta)
+    log(f"✅ Chair done ({iter_meta['duration_s']:.1f}s, {iter_meta['tokens'].get('total_tokens')} tk). {format_file_link(filepath)}")
+
+    if merge == "select":
+        picks = BEST_PATTERN.findall(strip_think_tags(chair_text))
+        by_number = dict(reviews)
+        selected = int(picks[-1]) if picks and int(picks[-1]) in by_number else reviews[0][0]
+        session_metadata["panel"]["selected"] = selected
+        text = by_number[selected]
+    else:
+        text = strip_think_tags(chair_text)
+    final_filename = generate_output_filename("Mode4_Final", paper_title, "Panel_Review", 1)
+    traced_save_review(session_dir, final_filename, text)
+    return {"status": "completed", "text": text, "filename": final_filename}
+
+def run_grounding_check(paper_text: str, review_text: str, session_dir: str, round_num: int) -> dict:
+    with SessionTrace(session_dir).span("grounding_check", round=round_num):
+        return check_grounding(paper_text, strip_think_tags(review_text))
+
+def send_back_turn(round_num: int, claims: list, previous_feedback: str, paper_title: str,
+                   session_dir: str, session_metadata: dict, render=consume_stream) -> str:
+    """
+    Stands in for a Teacher turn when a revision repeats claims the grounding pre-check already
+    flagged: the feedback is generated locally, saved like a Teacher reply, and costs no tokens.
+    """
+    feedback = render("Teacher", round_num, iter([format_send_back(claims, strip_think_tags(previous_feedback))]))
+    filename = generate_output_filename("Mode3", paper_title, "Teacher", round_num)
+    traced_save_review(session_dir, filename, feedback)
+    session_metadata["iterations"].append({
+        "round": round_num, "agent": "Teacher", "duration_s": 0.0,
+        "tokens": {
+            "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+            "prompt_source": "local", "completion_source": "local", "measured": True
+        },
+        "timings": {}, "output_file": filename,
+        "short_circuit": {"reason": "repeated_ungrounded_claims", "claims": claims}
+    })
+    session_metadata["grounding"]["teacher_calls_skipped"] += 1
+    return feedback
+
+def run_mode3(student_agent, teacher_agent, paper_text: str, paper_title: str, template_text: str, draft_text: str,
+              prompts: dict, session_dir: str, session_metadata: dict, render=consume_stream, log=_noop_log,
+              max_iters: int = 3, revision_mode: str = "full", resume_from: dict = None, grounding: str = "off",
+              convergence: str = "off", budget: dict = None) -> dict:
+    """
+    Mode 3: Student/Teacher adversarial loop until approval, `max_iters`, a stall or the budget.
+    `revision_mode="patch"` makes Student revisions (round >= 2) emit section edits
+    instead of the full review; see run_patch_revision.
+    `grounding="hints"` runs the local claim-grounding pre-check after every Student turn
+    and passes unmatched claims to the Teacher; "shortcircuit" additionally sends a
+    revision that repeats last round's flagged claims straight back (never twice in a row).
+    `convergence="stop"` ends the loop (status "stalled") once consecutive drafts or consecutive
+    Teacher feedbacks are near-identical; "escalate" first moves both roles off their cascade
+    models onto the primary model and only stops if the loop stalls again.
+    `budget` ({"max_tokens", "max_cost_usd", "max_seconds", "max_rounds"}, defaults from
+    MODE3_MAX_*) stops the loop (status "budget_exhausted") before a round that would likely
+    overrun it; a token/cost/time budget replaces `max_iters` as the round limit.
+    Why the loop ended is recorded as result["stop_reason"] and session_metadata["stop_reason"].
+    API errors do not propagate; they end the loop with status "error" so the
+    caller can still persist the metadata of the completed turns.
+    A checkpoint is written to the session folder after every agent turn; passing it
+    back as `resume_from` (see resume_mode3) continues with the first unfinished turn.
+    Once the session is approved only the checkpoint's status summary is kept.
+    """
+    template_text = template_text or DEFAULT_TEMPLATE_TEXT
+    student_starts = not bool(draft_text)
+    if resume_from:
+        current_review_text = resume_from["current_review"]
+        teacher_feedback_text = resume_from["teacher_feedback"]
+        start_round, next_agent = resume_from["next_round"], resume_from["next_agent"]
+        session_metadata.setdefault("resumes", []).append({
+            "timestamp": datetime.now().isoformat(), "round": start_round, "agent": next_agent
+        })
+        log(f"Mode 3 Resumed: Round {start_round}, {next_agent} turn")
+    else:
+        current_review_text = draft_text or ""
+        teacher_feedback_text = ""
+        start_round, next_agent = 1, "Student" if student_starts else "Teacher"
+        log("Mode 3 Started: Adversarial Iteration")
+    session_metadata["revision_mode"] = revision_mode
+    session_metadata.setdefault("grounding", {"mode": grounding, "teacher_calls_skipped": 0})["mode"] = grounding
+    grounding_report = None
+    if grounding != "off" and current_review_text:
+        grounding_report = run_grounding_check(paper_text, current_review_text, session_dir, start_round)
+    previous_grounding = None
+    sent_back = SEND_BACK_HEADING in teacher_feedback_text
+
+    student_agent, teacher_agent = with_paper_digest([student_agent, teacher_agent], paper_text, session_dir, session_metadata, log)
+    budget = load_budget(budget)
+    max_iters = round_limit(max_iters, budget)
+    monitor = ConvergenceMonitor()
+    convergence_meta = session_metadata.setdefault("convergence", {"mode": convergence, "escalations": []})
+    convergence_meta["mode"] = convergence
+    escalated = bool(convergence_meta["escalations"])
+    if escalated:
+        student_agent, teacher_agent = student_agent.primary(), teacher_agent.primary()
+
+    def checkpoint(status: str, next_round: int, next_agent: str):
+        with SessionTrace(session_dir).span("disk_write", file="checkpoint.json"):
+            _write_checkpoint(status, next_round, next_agent)
+
+    def _write_checkpoint(status: str, next_round: int, next_agent: str):
+        if status not in RESUMABLE_STATUSES:
+            # Finished for good: keep the status, drop the full state
+            close_checkpoint(session_dir, {
+                "mode": "mode3", "status": status, "next_round": next_round, "next_agent": next_agent,
+                "paper_title": paper_title, "max_iters": max_iters
+            })
+            return
+        save_checkpoint(session_dir, {
+            "mode": "mode3", "status": status, "next_round": next_round, "next_agent": next_agent,
+            "current_review": current_review_text, "teacher_feedback": teacher_feedback_text,
+            "paper_title": paper_title, "paper_text": paper_text, "template_text": template_text,
+            "draft_text": draft_text, "prompts": prompts, "max_iters": max_iters, "revision_mode": revision_mode,
+            "grounding": grounding, "convergence": convergence, "budget": budget, "session_metadata": session_metadata
+        })
+
+    result = {"status": "max_iters", "text": None, "filename": None, "round": 0, "max_iters": max_iters}
+    stop_reason = None
+    memory_context = ""
+    if student_starts and start_round == 1 and next_agent == "Student":
+        memory_context = recall_review_memory(student_agent, paper_text, session_dir, session_metadata, log)
+
+    for i in range(start_round, max_iters + 1):
+        result["round"] = i
+        monitor.start_round()
+
+        if (student_starts or i > 1) and not (i == start_round and next_agent == "Teacher"):
+            log(f"Round {i}: Student working...")
+            student = student_agent.for_round(i)
+            previous_review_text = current_review_text
+            try:
+                if revision_mode == "patch" and teacher_feedback_text and current_review_text:
+                    current_review_text, filepath = run_patch_revision(
+                        student, i, paper_text, template_text, prompts, current_review_text,
+                        teacher_feedback_text, paper_title, session_dir, session_metadata, render, log
+                    )
+                    iter_meta = session_metadata["iterations"][-1]
+                else:
+                    filename = generate_output_filename("Mode3", paper_title, "Student", i)
+                    current_review_text, iter_meta, filepath = run_agent_turn(
+                        student, "Student", i,
+                        lambda: student.generate_review_stream(
+                            paper_text, template_text, prompts["student"],
+                            previous_feedback=teacher_feedback_text,
+                            mode3_prompt=prompts["mode3"],
+                            previous_draft=current_review_text,
+                            memory_context=memory_context
+                        ),
+                        session_dir, filename, render
+                    )
+                    session_metadata["iterations"].append(iter_meta)
+                log(f"✅ Student R{i} done ({iter_meta['duration_s']:.1f}s, {iter_meta['tokens'].get('total_tokens')} tk). {format_file_link(filepath)}")
+                if convergence != "off" and previous_review_text:
+                    iter_meta["draft_similarity"] = monitor.observe_draft(
+                        strip_think_tags(previous_review_text), strip_think_tags(current_review_text)
+                    )
+                if grounding != "off":
+                    previous_grounding = grounding_report
+                    grounding_report = run_grounding_check(paper_text, current_review_text, session_dir, i)
+                    iter_meta["grounding"] = grounding_report
+                    if grounding_report["ungrounded"]:
+                        log(f"🔍 Grounding pre-check: {len(grounding_report['ungrounded'])}/{grounding_report['claims_checked']} claims not found in the paper")
+                checkpoint("in_progress", i, "Teacher")
+            except Exception as e:
+                result.update({"status": "error", "error_agent": "Student", "error": str(e)})
+                checkpoint("error", i, "Student")
+                break
+
+        # --- Teacher Phase ---
+        repeated = repeated_claims(previous_grounding, grounding_report) if grounding == "shortcircuit" and not sent_back else []
+        if repeated:
+            log(f"↩️ Round {i}: {len(repeated)} flagged claim(s) still ungrounded, sent back without a Teacher call.")
+            teacher_feedback_text = send_back_turn(
+                i, repeated, teacher_feedback_text, paper_title, session_dir, session_metadata, render
+            )
+            sent_back = True
+            checkpoint("in_progress" if i < max_iters else "max_iters", i + 1, "Student")
+            continue
+        previous_feedback_text = "" if sent_back else teacher_feedback_text
+        sent_back = False
+        log(f"Round {i}: Teacher evaluating...")
+        try:
+            filename = generate_output_filename("Mode3", paper_title, "Teacher", i)
+            grounding_hints = format_grounding_hints(grounding_report) if grounding != "off" else ""
+            teacher_feedback_text, iter_meta, filepath = run_teacher_turn(
+                teacher_agent, i,
+                lambda agent: agent.evaluate_review_stream(paper_text, current_review_text, prompts["teacher"], grounding_hints),
+                session_dir, filename, session_metadata, render, log
+            )
+            log(f"✅ Teacher R{i} done ({iter_meta['duration_s']:.1f}s, {iter_meta['tokens'].get('total_tokens')} tk). {format_file_link(filepath)}")
+            if convergence != "off" and previous_feedback_text:
+                iter_meta["feedback_similarity"] = monitor.observe_feedback(
+                    strip_think_tags(previous_feedback_text), strip_think_tags(teacher_feedback_text)
+                )
+        except Exception as e:
+            result.update({"status": "error", "error_agent": "Teacher", "error": str(e)})
+            checkpoint("error", i, "Teacher")
+            break
+
+        if APPROVED_VERDICT in teacher_feedback_text:
+            log(f"🎉 Paper Passed at Round {i}.")
+            clean_final_review = strip_think_tags(current_review_text)
+            final_filename = generate_output_filename("Mode3_Final", paper_title, "Approved_Review", i)
+            traced_save_review(session_dir, final_filename, clean_final_review)
+            result.update({"status": "approved", "text": clean_final_review, "filename": final_filename})
+            checkpoint("approved", i + 1, "Student")
+            break
+
+        stall = monitor.stall_reason() if convergence != "off" else None
+        if stall and i < max_iters:
+            can_escalate = (student_agent.for_round(i + 1) is not student_agent
+                            or teacher_agent.for_round(i + 1) is not teacher_agent)
+            if convergence == "escalate" and not escalated and can_escalate:
+                log(f"⏫ Round {i}: no progress ({stall}), switching to the primary model.")
+                student_agent, teacher_agent = student_agent.primary(), teacher_agent.primary()
+                escalated = True
+                convergence_meta["escalations"].append({"round": i, "reason": stall})
+            else:
+                stop_reason = stall
+                result["status"] = "stalled"
+        if not stop_reason and i < max_iters:
+            stop_reason = budget_stop_reason(budget, budget_spent(session_metadata, summarize_models(session_metadata)), i)
+            if stop_reason:
+                result["status"] = "budget_exhausted"
+        if stop_reason:
+            checkpoint(result["status"], i + 1, "Student")
+            break
+        checkpoint("in_progress" if i < max_iters else "max_iters", i + 1, "Student")
+
+    prompt_cache = summarize_prompt_cache(session_metadata)
+    if prompt_cache:
+        session_metadata["prompt_cache"] = prompt_cache
+        log(f"Prompt cache: {prompt_cache['cached_prompt_tokens']} cached / {prompt_cache['uncached_prompt_tokens']} uncached prompt tokens")
+
+    result["stop_reason"] = stop_reason or {"approved": "approved", "error": "error"}.get(result["status"], "max_rounds")
+    session_metadata["stop_reason"] = result["stop_reason"]
+    if any(budget.values()):
+        session_metadata["budget"] = {
+            "limits": budget, "spent": budget_spent(session_metadata, summarize_models(session_metadata))
+        }
+
+    if result["status"] == "error":
+        log("Aborted due to API errors. Resume this session to continue from the failed turn.")
+    elif result["status"] == "max_iters":
+        log(f"⚠️ Reached max iterations limit ({max_iters}).")
+    elif result["status"] == "stalled":
+        log(f"⏹️ Stopped at round {result['round']}: the review stopped changing ({stop_reason}).")
+    elif result["status"] == "budget_exhausted":
+        log(f"⏹️ Stopped at round {result['round']}: another round would exceed the {stop_reason.replace('_', ' ')}.")
+    return result
+
+# ------------------------------------------------------------------
+# SESSION RESUME
+# ------------------------------------------------------------------
+
+RESUMABLE_STATUSES = ("in_progress", "error", "max_iters", "stalled", "budget_exhausted")
+
+def resume_mode3(student_agent, teacher_agent, session_dir: str, render=consume_stream, log=_noop_log,
+                 max_iters: int = None, budget: dict = None) -> tuple:
+    """
+    Continues an interrupted Mode 3 session from its checkpoint, reusing the saved paper
+    text, prompts and completed turns; no finished turn is sent to the LLM again.
+    `max_iters` / `budget` may raise the limits of a session that stopped at them.
+    Returns (result, session_metadata); the caller saves the metadata as usual.
+    """
+    state = load_checkpoint(session_dir)
+    if state is None or state.get("mode") != "mode3":
+        raise Exception(f"No Mode 3 checkpoint found in {session_dir}")
+    if state["status"] not in RESUMABLE_STATUSES:
+        raise Exception(f"Session is already finished (status: {state['status']})")
+
+    session_metadata = state["session_metadata"]
+    result = run_mode3(
+        student_agent, teacher_agent, state["paper_text"], state["paper_title"], state["template_text"],
+        state["draft_text"], state["prompts"], session_dir, session_metadata, render, log,
+        max_iters=max_iters or state["max_iters"], revision_mode=state["revision_mode"], resume_from=state,
+        grounding=state.get("grounding", "off"), convergence=state.get("convergence", "off"),
+        budget={**state.get("budget", {}), **{k: v for k, v in (budget or {}).items() if v}}
+    )
+    return result, session_metadata
+
+def find_resumable_sessions(base_dir: str = "review_outputs") -> list:
+    """
+    Lists sessions under base_dir whose Mode 3 checkpoint can be resumed, newest first.
+    Only the small checkpoint_status.json of each session is read.
+    """
+    sessions = []
+    if not os.path.isdir(base_dir):
+        return sessions
+    for name in sorted(os.listdir(base_dir), reverse=True):
+        session_dir = os.path.join(base_dir, name)
+        try:
+            state = load_checkpoint_status(session_dir)
+        except (OSError, ValueError):
+            continue
+        if state and state.get("mode") == "mode3" and state.get("status") in RESUMABLE_STATUSES:
+            sessions.append({
+                "session_id": name, "session_dir": session_dir, "paper_title": state["paper_title"],
+                "status": state["status"], "next_round": state["next_round"], "next_agent": state["next_agent"],
+                "max_iters": state["max_iters"]
+            })
+    return sessions
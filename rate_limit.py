@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+
+# ------------------------------------------------------------------
+# CLIENT-SIDE RATE LIMITING & RETRY
+# ------------------------------------------------------------------
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BASE_S = 1.0
+MAX_RETRY_DELAY_S = 30.0
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` units per minute,
+    holding at most one minute's worth. Callers reserve units up front and are told
+    how long to wait, so concurrent callers queue fairly without holding the lock.
+    """
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` units (possibly going into debt) and return the seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            # A single request larger than the bucket must still pass eventually
+            self.available -= min(amount, self.capacity)
+            return max(0.0, -self.available / self.rate)
+
+    def consume(self, amount: float):
+        """Account for usage discovered after the fact (e.g. completion tokens)."""
+        with self._lock:
+            self.available -= amount
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one provider/model."""
+    def __init__(self, rpm: float = None, tpm: float = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    async def acquire(self, est_tokens: int) -> float:
+        """Wait until one request of `est_tokens` prompt tokens may be sent. Returns the seconds waited."""
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(est_tokens))
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def record_completion(self, completion_tokens: int):
+        if self.tokens and completion_tokens:
+            self.tokens.consume(completion_tokens)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def _limits_for(model_name: str) -> dict:
+    """
+    Limits from LLM_RATE_LIMITS (JSON: {"<model>": {"rpm": .., "tpm": ..}}), falling back
+    to the global LLM_RPM / LLM_TPM. Unset or 0 means unlimited.
+    """
+    per_model = json.loads(os.getenv("LLM_RATE_LIMITS") or "{}")
+    limits = per_model.get(model_name, {})
+    return {
+        "rpm": float(limits.get("rpm", os.getenv("LLM_RPM") or 0)),
+        "tpm": float(limits.get("tpm", os.getenv("LLM_TPM") or 0))
+    }
+
+def get_rate_limiter(model_name: str, api_base: str = None) -> RateLimiter:
+    """Process-wide limiter shared by every call to the same model and endpoint."""
+    key = (model_name, api_base or "")
+    with _limiters_lock:
+        if key not in _limiters:
+            limits = _limits_for(model_name)
+            _limiters[key] = RateLimiter(limits["rpm"], limits["tpm"])
+        return _limiters[key]
+
+def is_transient_error(error: Exception) -> bool:
+    """Rate limits, timeouts, connection failures and 5xx responses are worth retrying."""
+    import litellm  # Already loaded by the failed call; kept out of module import for startup time
+    transient_types = tuple(
+        t for t in (
+            getattr(litellm, name, None) for name in
+            ("RateLimitError", "APIConnectionError", "Timeout", "ServiceUnavailableError", "InternalServerError")
+        ) if isinstance(t, type)
+    )
+    if transient_types and isinstance(error, transient_types):
+        return True
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, "status_code", None) in TRANSIENT_STATUS_CODES
+
+def max_retries() -> int:
+    return int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, base * 2^attempt], capped."""
+    base = float(os.getenv("LLM_RETRY_BASE_S", DEFAULT_RETRY_BASE_S))
+    return random.uniform(0, min(MAX_RETRY_DELAY_S, base * (2 ** attempt)))
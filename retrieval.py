@@ -0,0 +1,137 @@
+import os
+import re
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+# ------------------------------------------------------------------
+# RETRIEVAL-SCOPED PAPER CONTEXT (BM25, no external service)
+# ------------------------------------------------------------------
+# In "retrieval" context mode the Teacher sees only the paper passages that the
+# current draft talks about instead of the whole (truncated) paper. The paper is
+# chunked and indexed once; every evaluation queries the index with the draft's
+# sentences and keeps the top-k passages, in paper order.
+
+DEFAULT_CHUNK_CHARS = 1500
+DEFAULT_TOP_K = 8
+# Indexed papers kept in memory (one per concurrent session is enough)
+INDEX_CACHE_SIZE = 16
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have in is it its may of on or our paper "
+    "should that the their there these this those to was we were which while will with would not "
+    "authors author review reviewer section also more than such using used".split()
+)
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+def chunk_paper(paper_text: str, chunk_chars: int = DEFAULT_CHUNK_CHARS) -> list:
+    """Split the paper into ~chunk_chars passages on paragraph boundaries (long paragraphs are cut)."""
+    chunks, current = [], ""
+    for para in re.split(r"\n\s*\n", paper_text):
+        para = para.strip()
+        if not para:
+            continue
+        while len(para) > chunk_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            cut = para.rfind(" ", 0, chunk_chars)
+            cut = cut if cut > chunk_chars // 2 else chunk_chars
+            chunks.append(para[:cut].strip())
+            para = para[cut:].strip()
+        if current and len(current) + len(para) + 2 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return chunks
+
+class BM25Index:
+    """Okapi BM25 over the paper's chunks, stored as term -> [(chunk id, term frequency)] postings."""
+    def __init__(self, chunks: list, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1, self.b = k1, b
+        self.postings = {}
+        lengths = []
+        for i, chunk in enumerate(chunks):
+            terms = Counter(tokenize(chunk))
+            lengths.append(sum(terms.values()))
+            for term, f in terms.items():
+                self.postings.setdefault(term, []).append((i, f))
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 1.0
+        # Per-chunk length normalisation, precomputed once
+        self.norms = [k1 * (1 - b + b * length / (avg_length or 1.0)) for length in lengths]
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def scores(self, query_terms: list) -> list:
+        result = [0.0] * len(self.chunks)
+        for term in set(query_terms):
+            for i, f in self.postings.get(term, ()):
+                result[i] += self.idf[term] * f * (self.k1 + 1) / (f + self.norms[i])
+        return result
+
+    def top_k(self, queries: list, k: int) -> list:
+        """
+        Chunk ids most relevant to a set of queries (e.g. the draft's sentences).
+        Each query's scores are normalised to its best chunk, so a long sentence
+        cannot drown out the others. Always keeps chunk 0 (title/abstract).
+        """
+        combined = [0.0] * len(self.chunks)
+        for query in queries:
+            scores = self.scores(tokenize(query))
+            best = max(scores, default=0.0)
+            if best > 0:
+                for i, s in enumerate(scores):
+                    combined[i] += s / best
+        ranked = [i for i in sorted(range(len(combined)), key=lambda i: -combined[i]) if combined[i] > 0]
+        selected = set(ranked[:max(0, k - 1)]) | {0}
+        return sorted(selected)
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+def get_paper_index(paper_text: str, chunk_chars: int = None) -> BM25Index:
+    """BM25 index of a paper, built on first use and reused across rounds (keyed by the text hash)."""
+    chunk_chars = chunk_chars or int(os.getenv("RETRIEVAL_CHUNK_CHARS", DEFAULT_CHUNK_CHARS))
+    key = (hashlib.sha256(paper_text.encode("utf-8")).hexdigest(), chunk_chars)
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = BM25Index(chunk_paper(paper_text, chunk_chars))
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+def scoped_paper_context(paper_text: str, draft_text: str, top_k: int = None) -> tuple:
+    """
+    The paper passages relevant to the draft, joined in paper order with "[...]" marking gaps.
+    Returns (context_text, stats).
+    """
+    top_k = top_k or int(os.getenv("TEACHER_RETRIEVAL_TOP_K", DEFAULT_TOP_K))
+    index = get_paper_index(paper_text)
+    if not index.chunks:
+        return paper_text, {"chunks_selected": 0, "chunks_total": 0, "queries": 0}
+    queries = [s for s in _SENTENCE_SPLIT.split(draft_text) if len(tokenize(s)) >= 3]
+    selected = index.top_k(queries, top_k)
+
+    parts, previous = [], -1
+    for i in selected:
+        if i != previous + 1:
+            parts.append("[...]")
+        parts.append(index.chunks[i])
+        previous = i
+    if previous != len(index.chunks) - 1:
+        parts.append("[...]")
+    stats = {"chunks_selected": len(selected), "chunks_total": len(index.chunks), "queries": len(queries)}
+    return "\n\n".join(parts), stats
@@ -0,0 +1,316 @@
+"""
+Review memory: past approved reviews and Teacher criticisms, retrieved by similarity
+to a new paper to enrich the Student's first draft. Local only (SQLite + NumPy).
+
+Every finalized session adds its approved review(s) and its "Needs Revision" Teacher
+feedbacks as documents. A document is embedded as a signed feature-hashed bag of words
+(sublinear term frequency, L2-normalised), so no embedding model or service is needed;
+cosine similarity is then one matrix-vector product over all documents.
+
+Usage:
+    python review_memory.py sync review_outputs              # index sessions not yet in memory
+    python review_memory.py query paper.txt --top-k 3
+    python review_memory.py stats
+"""
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+import threading
+import warnings
+import numpy as np
+from retrieval import tokenize
+
+DEFAULT_MEMORY_DB = os.path.join(".cache", "review_memory.sqlite3")
+DEFAULT_DIM = 512
+# Characters of the new paper used as the query (title, abstract and the main body for most papers)
+QUERY_CHARS = 30000
+# Characters of each remembered document put into the Student prompt
+EXCERPT_CHARS = 2000
+# Candidates below this cosine similarity are never recalled
+MIN_SIMILARITY = 0.05
+KINDS = ("approved", "criticism")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    paper TEXT,
+    paper_sha256 TEXT,
+    created_at TEXT,
+    text TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    UNIQUE (session_id, filename)
+);
+CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, indexed_at REAL);
+"""
+
+_APPROVED_FILE = re.compile(r"_Approved_Review_Round\d+\.md$")
+_TEACHER_FILE = re.compile(r"_Teacher(_Escalated)?_Round\d+\.md$")
+_VERDICT = re.compile(r"\[Verdict:\s*(Approved|Needs Revision)\]")
+_THINK = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+def embed(text: str, dim: int = DEFAULT_DIM) -> np.ndarray:
+    """Signed feature-hashed bag of words with sublinear tf, L2-normalised (float32, shape (dim,))."""
+    vector = np.zeros(dim, dtype=np.float32)
+    terms = tokenize(text)
+    if not terms:
+        return vector
+    hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in terms), dtype=np.uint32, count=len(terms))
+    buckets, counts = np.unique(hashes, return_counts=True)
+    # The low bits pick the dimension, bit 31 the sign, so colliding terms tend to cancel out
+    signs = np.where(buckets >> 31, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, buckets % dim, signs * (1.0 + np.log(counts)).astype(np.float32))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def session_documents(session_dir: str, metadata: dict) -> list:
+    """The session's memory documents: approved reviews and Teacher feedbacks that asked for a revision."""
+    docs = []
+    for filename in sorted(os.listdir(session_dir)):
+        if _APPROVED_FILE.search(filename):
+            kind = "approved"
+        elif _TEACHER_FILE.search(filename):
+            kind = "criticism"
+        else:
+            continue
+        with open(os.path.join(session_dir, filename), "r", encoding="utf-8") as f:
+            text = _THINK.sub("", f.read()).strip()
+        if kind == "criticism":
+            verdicts = _VERDICT.findall(text)
+            if not verdicts or verdicts[-1] != "Needs Revision":
+                continue
+        if text:
+            docs.append({"filename": filename, "kind": kind, "text": text})
+    return docs
+
+class ReviewMemory:
+    """
+    SQLite store of memory documents plus an in-memory matrix of their vectors. The matrix
+    is grown incrementally: each recall first loads only the rows added since the last one
+    (by any process), so adding a session never rebuilds the index.
+    """
+    def __init__(self, db_path: str = None, dim: int = None):
+        self.db_path = db_path or os.getenv("REVIEW_MEMORY_DB", DEFAULT_MEMORY_DB)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)",
+                (str(dim or int(os.getenv("REVIEW_MEMORY_DIM", DEFAULT_DIM))),)
+            )
+            self.dim = int(conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()[0])
+        if dim and dim != self.dim:
+            raise Exception(f"Review memory {self.db_path} uses {self.dim}-dimensional vectors, not {dim}")
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._kinds = np.zeros(0, dtype=np.int8)
+        self._rows_by_paper = {}
+        self._size = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add_session(self, session_dir: str, metadata: dict) -> int:
+        """Index the session's documents not stored yet (one transaction). Returns how many were added."""
+        session_id = metadata.get("session_id") or os.path.basename(os.path.normpath(session_dir))
+        files = metadata.get("files", {})
+        paper = os.path.splitext(files.get("paper") or "")[0]
+        rows = [
+            (session_id, d["filename"], d["kind"], paper, files.get("paper_sha256"), metadata.get("timestamp"),
+             d["text"], embed(f"{paper}\n{d['text']}", self.dim).tobytes())
+            for d in session_documents(session_dir, metadata)
+        ]
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO docs (session_id, filename, kind, paper, paper_sha256, created_at, text, vector) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            added = conn.total_changes - before
+            conn.execute("INSERT OR REPLACE INTO sessions (session_id, indexed_at) VALUES (?, ?)", (session_id, time.time()))
+        return added
+
+    def sync(self, base_dir: str) -> dict:
+        """Index session folders that are new or whose metadata changed since they were last indexed."""
+        with self._connect() as conn:
+            indexed = dict(conn.execute("SELECT session_id, indexed_at FROM sessions").fetchall())
+        stats = {"sessions": 0, "documents": 0}
+        for name in sorted(os.listdir(base_dir)):
+            meta_path = os.path.join(base_dir, name, "metadata.json")
+            if not os.path.isfile(meta_path) or os.path.getmtime(meta_path) <= indexed.get(name, 0):
+                continue
+            with open(meta_path, "r", encoding="utf-8") as f:
+                stats["documents"] += self.add_session(os.path.join(base_dir, name), json.load(f))
+            stats["sessions"] += 1
+        return stats
+
+    def refresh(self) -> int:
+        """Load the vectors of documents added since the last refresh. Returns the number of documents in memory."""
+        with self._lock:
+            last_id = int(self._ids[self._size - 1]) if self._size else 0
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, kind, paper_sha256, vector FROM docs WHERE id > ? ORDER BY id", (last_id,)
+                ).fetchall()
+            if not rows:
+                return self._size
+            needed = self._size + len(rows)
+            if needed > len(self._vectors):
+                # Geometric growth with headroom, so later small additions rarely copy the matrix
+                capacity = max(needed + needed // 2, 1024)
+                self._vectors = np.resize(self._vectors, (capacity, self.dim))
+                self._ids = np.resize(self._ids, capacity)
+                self._kinds = np.resize(self._kinds, capacity)
+            new = slice(self._size, needed)
+            self._vectors[new] = np.frombuffer(b"".join(r["vector"] for r in rows), dtype=np.float32).reshape(-1, self.dim)
+            self._ids[new] = [r["id"] for r in rows]
+            self._kinds[new] = [KINDS.index(r["kind"]) for r in rows]
+            for row_num, r in enumerate(rows, start=self._size):
+                if r["paper_sha256"]:
+                    self._rows_by_paper.setdefault(r["paper_sha256"], []).append(row_num)
+            self._size = needed
+            return self._size
+
+    def _documents(self, ids: list) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, session_id, filename, kind, paper, text FROM docs WHERE id IN ({', '.join('?' for _ in ids)})",
+                [int(i) for i in ids]
+            ).fetchall()
+        return {r["id"]: dict(r) for r in rows}
+
+    def recall(self, paper_text: str, top_k: int = 3, exclude_paper_sha256: str = None) -> dict:
+        """
+        The `top_k` approved reviews most similar to the paper, and `top_k` Teacher criticisms that
+        are both similar to the paper and recur across the similar candidates (centrality among the
+        top 5*k), at most one per session. Documents of the same paper (by sha256) are left out, so a
+        re-run never sees its own earlier reviews. Returns {"approved", "criticisms", "stats"}.
+        """
+        start = time.perf_counter()
+        size = self.refresh()
+        query = embed(paper_text[:QUERY_CHARS], self.dim)
+        with self._lock:
+            scores = self._vectors[:size] @ query
+            kinds = self._kinds[:size]
+            ids = self._ids[:size]
+            excluded = self._rows_by_paper.get(exclude_paper_sha256, []) if exclude_paper_sha256 else []
+        scores[excluded] = -1.0
+
+        picked = {}
+        for kind, pool in (("approved", top_k), ("criticism", 5 * top_k)):
+            candidates = np.flatnonzero((kinds == KINDS.index(kind)) & (scores >= MIN_SIMILARITY))
+            if len(candidates) > pool:
+                candidates = candidates[np.argpartition(-scores[candidates], pool - 1)[:pool]]
+            picked[kind] = candidates[np.argsort(-scores[candidates])]
+
+        ranked_criticisms = picked["criticism"]
+        if len(ranked_criticisms) > 1:
+            with self._lock:
+                candidate_vectors = self._vectors[ranked_criticisms]
+            similarity = candidate_vectors @ candidate_vectors.T
+            centrality = (similarity.sum(axis=1) - 1.0) / (len(ranked_criticisms) - 1)
+            ranked_criticisms = ranked_criticisms[np.argsort(-(scores[ranked_criticisms] + centrality))]
+        search_ms = round(1000 * (time.perf_counter() - start), 2)
+
+        recalled_ids = list(ids[picked["approved"]]) + list(ids[ranked_criticisms])
+        docs = self._documents(recalled_ids) if recalled_ids else {}
+        result = {"approved": [], "criticisms": []}
+        for key, rows in (("approved", picked["approved"]), ("criticisms", ranked_criticisms)):
+            sessions = set()
+            for row in rows:
+                doc = docs[int(ids[row])]
+                if doc["session_id"] in sessions or len(result[key]) >= top_k:
+                    continue
+                sessions.add(doc["session_id"])
+                result[key].append({**doc, "similarity": round(float(scores[row]), 3)})
+        result["stats"] = {
+            "documents": size, "top_k": top_k, "search_ms": search_ms,
+            "approved": [{"session_id": d["session_id"], "paper": d["paper"], "similarity": d["similarity"]} for d in result["approved"]],
+            "criticisms": [{"session_id": d["session_id"], "paper": d["paper"], "similarity": d["similarity"]} for d in result["criticisms"]]
+        }
+        return result
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            kinds = dict(conn.execute("SELECT kind, COUNT(*) FROM docs GROUP BY kind").fetchall())
+            sessions = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"db": self.db_path, "dim": self.dim, "sessions": sessions, **{k: kinds.get(k, 0) for k in KINDS}}
+
+def format_memory_context(recall: dict, excerpt_chars: int = EXCERPT_CHARS) -> str:
+    """The recalled documents as a <review_memory> block for the Student prompt ("" if nothing was recalled)."""
+    if not recall["approved"] and not recall["criticisms"]:
+        return ""
+
+    def excerpt(text: str) -> str:
+        return text if len(text) <= excerpt_chars else text[:excerpt_chars].rstrip() + "\n[...]"
+
+    parts = ["<review_memory>"]
+    if recall["approved"]:
+        parts.append("Approved reviews of similar past papers. Match their depth and specificity; never copy their claims, they are about other papers.")
+        parts += [f"<approved_review paper=\"{d['paper']}\">\n{excerpt(d['text'])}\n</approved_review>" for d in recall["approved"]]
+    if recall["criticisms"]:
+        parts.append("Criticisms the senior reviewer raised on drafts for similar papers. Avoid these weaknesses in your review.")
+        parts += [f"<teacher_criticism paper=\"{d['paper']}\">\n{excerpt(d['text'])}\n</teacher_criticism>" for d in recall["criticisms"]]
+    parts.append("</review_memory>")
+    return "\n".join(parts)
+
+_memory = None
+_memory_lock = threading.Lock()
+
+# What a missing, locked or corrupt memory file (or vector store) raises; callers degrade to "no memory"
+MEMORY_ERRORS = (sqlite3.Error, OSError, ValueError)
+
+def get_review_memory() -> ReviewMemory:
+    """Process-wide ReviewMemory at REVIEW_MEMORY_DB; None when it is set to "off"."""
+    global _memory
+    if os.getenv("REVIEW_MEMORY_DB") == "off":
+        return None
+    with _memory_lock:
+        if _memory is None:
+            _memory = ReviewMemory()
+        return _memory
+
+def remember_session(session_dir: str, metadata: dict):
+    """Called when a session is finalized. Memory problems are reported but never fail a review."""
+    try:
+        memory = get_review_memory()
+        if memory is not None:
+            memory.add_session(session_dir, metadata)
+    except MEMORY_ERRORS as e:
+        warnings.warn(f"Review memory update failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the Reviewer Tycoon review memory.")
+    parser.add_argument("--db", help="Memory file (default: REVIEW_MEMORY_DB or .cache/review_memory.sqlite3)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync = sub.add_parser("sync", help="Index new or updated session folders")
+    sync.add_argument("base_dir", nargs="?", default="review_outputs")
+    query = sub.add_parser("query", help="Show what would be recalled for a paper's extracted text")
+    query.add_argument("paper_file")
+    query.add_argument("--top-k", type=int, default=3)
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    memory = ReviewMemory(args.db)
+    if args.command == "sync":
+        stats = memory.sync(args.base_dir)
+        print(f"Indexed {stats['documents']} documents from {stats['sessions']} sessions into {memory.db_path}")
+    elif args.command == "query":
+        with open(args.paper_file, "r", encoding="utf-8") as f:
+            print(json.dumps(memory.recall(f.read(), args.top_k)["stats"], indent=2, ensure_ascii=False))
+    else:
+        print(json.dumps(memory.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import re
+import json
+
+# ------------------------------------------------------------------
+# PATCH-BASED REVIEW REVISIONS (Mode 3)
+# ------------------------------------------------------------------
+# Instead of regenerating the whole review, the Student may answer with a
+# JSON list of section-scoped edits that are applied locally to its previous
+# draft:
+#   {"edits": [
+#       {"op": "replace", "section": "Weaknesses", "find": "old text", "text": "new text"},
+#       {"op": "delete",  "section": "Weaknesses", "find": "text to remove"},
+#       {"op": "insert",  "section": "Questions",  "after": "anchor text", "text": "new text"}
+#   ]}
+# `find` omitted on replace/delete targets the whole section body (delete drops
+# the heading too); `after` omitted on insert appends to the section, and an
+# unknown insert section is appended as a new "## section".
+
+PATCH_OPS = ("replace", "delete", "insert")
+
+class PatchError(ValueError):
+    """Raised when a Student patch cannot be parsed or applied; callers fall back to full regeneration."""
+
+_HEADING = re.compile(r"^\s*(#{1,6})\s+(.+?)\s*#*\s*$")
+_BOLD_HEADING = re.compile(r"^\s*\*\*(.+?)\*\*:?\s*$")
+
+def _normalize_title(title: str) -> str:
+    title = re.sub(r"[*_`#:]", "", title)
+    title = re.sub(r"^\s*(?:\d+(?:\.\d+)*|[IVX]+)[.)]?\s+", "", title)
+    return re.sub(r"\s+", " ", title).strip().lower()
+
+def split_review_sections(review: str) -> list:
+    """
+    Split a Markdown review into [{"key", "heading", "body"}] at headings (`#`-style or a
+    line that is entirely **bold**). The preamble before the first heading has key "".
+    Joining heading + body of all sections reproduces the input.
+    """
+    sections = [{"key": "", "heading": "", "body": ""}]
+    for line in review.splitlines(keepends=True):
+        match = _HEADING.match(line) or _BOLD_HEADING.match(line)
+        if match:
+            title = match.group(match.lastindex)
+            sections.append({"key": _normalize_title(title), "heading": line, "body": ""})
+        else:
+            sections[-1]["body"] += line
+    return sections
+
+def join_review_sections(sections: list) -> str:
+    return "".join(s["heading"] + s["body"] for s in sections)
+
+def parse_patch(response_text: str) -> list:
+    """Extract and validate the edit list from a Student patch response."""
+    fenced = re.search(r"```(?:json)?\s*(\{.*\})\s*```", response_text, re.DOTALL)
+    if fenced:
+        payload = fenced.group(1)
+    else:
+        start, end = response_text.find("{"), response_text.rfind("}")
+        if start == -1 or end <= start:
+            raise PatchError("No JSON object found in patch response")
+        payload = response_text[start:end + 1]
+
+    try:
+        data = json.loads(payload)
+    except json.JSONDecodeError as e:
+        raise PatchError(f"Malformed patch JSON: {e}")
+
+    edits = data.get("edits") if isinstance(data, dict) else None
+    if not isinstance(edits, list) or not edits:
+        raise PatchError("Patch must contain a non-empty 'edits' list")
+    for edit in edits:
+        if not isinstance(edit, dict) or edit.get("op") not in PATCH_OPS:
+            raise PatchError(f"Invalid edit: {edit!r}")
+        if not isinstance(edit.get("section"), str) or not edit["section"].strip():
+            raise PatchError(f"Edit is missing its section: {edit!r}")
+        if edit["op"] in ("replace", "insert") and not isinstance(edit.get("text"), str):
+            raise PatchError(f"'{edit['op']}' edit is missing its text: {edit!r}")
+    return edits
+
+def _find_span(body: str, needle: str) -> tuple:
+    """Locate `needle` in body, exactly or modulo whitespace. Returns (start, end)."""
+    idx = body.find(needle)
+    if idx != -1:
+        return idx, idx + len(needle)
+    words = needle.split()
+    if words:
+        match = re.search(r"\s+".join(re.escape(w) for w in words), body)
+        if match:
+            return match.span()
+    raise PatchError(f"Text to edit not found: {needle[:80]!r}")
+
+def _find_section(sections: list, title: str) -> dict:
+    key = _normalize_title(title)
+    for section in sections:
+        if section["key"] == key:
+            return section
+    # Tolerate shortened titles, e.g. "Weaknesses" for "Weaknesses & Limitations"
+    candidates = [s for s in sections if s["key"] and (s["key"].startswith(key) or key.startswith(s["key"]))]
+    return candidates[0] if len(candidates) == 1 else None
+
+def _locate(sections: list, section: dict, needle: str) -> tuple:
+    """Find `needle` in the named section, or in the single other section that contains it."""
+    try:
+        return section, _find_span(section["body"], needle)
+    except PatchError:
+        matches = []
+        for other in sections:
+            try:
+                matches.append((other, _find_span(other["body"], needle)))
+            except PatchError:
+                pass
+        if len(matches) != 1:
+            raise
+        return matches[0]
+
+def apply_patch(draft: str, edits: list) -> str:
+    """Apply parsed edits to the draft and return the full revised review."""
+    sections = split_review_sections(draft)
+    for edit in edits:
+        section = _find_section(sections, edit["section"])
+        op = edit["op"]
+
+        if op == "insert":
+            text = edit["text"].rstrip("\n") + "\n"
+            if section is None:
+                sections[-1]["body"] = sections[-1]["body"].rstrip("\n") + "\n\n"
+                sections.append({"key": _normalize_title(edit["section"]), "heading": f"## {edit['section'].strip()}\n", "body": text})
+            elif edit.get("after"):
+                section, (_, end) = _locate(sections, section, edit["after"])
+                line_end = section["body"].find("\n", end)
+                line_end = len(section["body"]) if line_end == -1 else line_end + 1
+                body = section["body"]
+                if line_end == len(body) and not body.endswith("\n"):
+                    body += "\n"
+                    line_end += 1
+                section["body"] = body[:line_end] + text + body[line_end:]
+            else:
+                body = section["body"].rstrip("\n")
+                section["body"] = (body + "\n" if body else "") + text + "\n"
+            continue
+
+        if section is None:
+            raise PatchError(f"Section not found: {edit['section']!r}")
+
+        if op == "replace":
+            if edit.get("find"):
+                section, (start, end) = _locate(sections, section, edit["find"])
+                section["body"] = section["body"][:start] + edit["text"] + section["body"][end:]
+            else:
+                section["body"] = edit["text"].rstrip("\n") + "\n\n"
+        else:  # delete
+            if edit.get("find"):
+                section, (start, end) = _locate(sections, section, edit["find"])
+                section["body"] = section["body"][:start] + section["body"][end:]
+            else:
+                sections.remove(section)
+
+    return join_review_sections(sections).strip() + "\n"
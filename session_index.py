@@ -0,0 +1,270 @@
+"""
+SQLite index over review sessions, kept current by utils.save_metadata and
+utils.save_review, so history and spend queries never walk review_outputs/.
+
+Usage:
+    python session_index.py rebuild review_outputs          # backfill existing sessions
+    python session_index.py query --paper-sha256 <hash> --since 2025-01-01
+    python session_index.py stats --group-by model
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import warnings
+
+DEFAULT_INDEX_DB = os.path.join(".cache", "sessions.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    session_dir TEXT NOT NULL,
+    created_at TEXT,
+    mode TEXT,
+    model TEXT,
+    paper TEXT,
+    paper_sha256 TEXT,
+    status TEXT,
+    verdict TEXT,
+    rounds INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    cost_usd REAL,
+    duration_s REAL,
+    ttft_mean_s REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_paper ON sessions (paper_sha256);
+CREATE INDEX IF NOT EXISTS sessions_model ON sessions (model, created_at);
+CREATE INDEX IF NOT EXISTS sessions_mode ON sessions (mode, created_at);
+CREATE INDEX IF NOT EXISTS sessions_created ON sessions (created_at);
+CREATE TABLE IF NOT EXISTS reviews (
+    session_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    agent TEXT,
+    round INTEGER,
+    verdict TEXT,
+    chars INTEGER,
+    saved_at REAL,
+    PRIMARY KEY (session_id, filename)
+);
+"""
+
+_VERDICT = re.compile(r"\[Verdict:\s*(Approved|Needs Revision)\]")
+_REVIEW_FILENAME = re.compile(r"_(Student_Patch|Student|Teacher_Escalated|Teacher|Approved_Review|Reviewer\d+|Chair|Panel_Review)_Round(\d+)\.md$")
+# Filters accepted by find_sessions / aggregate, mapped to their SQL condition
+_FILTERS = {
+    "paper_sha256": "paper_sha256 = ?",
+    "model": "model = ?",
+    "mode": "mode = ?",
+    "status": "status = ?",
+    "verdict": "verdict = ?",
+    "since": "created_at >= ?",
+    "until": "created_at < ?",
+}
+_GROUP_COLUMNS = ("model", "mode", "status", "verdict", "paper_sha256", "day")
+
+def _session_cost(metadata: dict, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost from litellm's price map, summed per model when the session used several; None if unknown."""
+    # Imported lazily: utils imports this module, and litellm is slow to load
+    from tokens import estimate_cost
+    models = metadata.get("models")
+    if not models:
+        return estimate_cost(metadata.get("model"), prompt_tokens, completion_tokens)
+    costs = [m.get("cost_usd") for m in models.values()]
+    return round(sum(costs), 6) if None not in costs else None
+
+class SessionIndex:
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("SESSION_INDEX_DB", DEFAULT_INDEX_DB)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record_session(self, session_dir: str, metadata: dict):
+        """Insert or refresh the session row from its metadata (one transaction)."""
+        session_id = metadata.get("session_id") or os.path.basename(os.path.normpath(session_dir))
+        iterations = metadata.get("iterations", [])
+        prompt_tokens = sum((it.get("tokens") or {}).get("prompt_tokens") or 0 for it in iterations)
+        completion_tokens = sum((it.get("tokens") or {}).get("completion_tokens") or 0 for it in iterations)
+        files = metadata.get("files", {})
+        row = {
+            "session_id": session_id,
+            "session_dir": os.path.abspath(session_dir),
+            "created_at": metadata.get("timestamp"),
+            "mode": metadata.get("mode"),
+            "model": metadata.get("model"),
+            "paper": files.get("paper"),
+            "paper_sha256": files.get("paper_sha256"),
+            "status": metadata.get("status"),
+            "rounds": max((it.get("round", 0) for it in iterations), default=0),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost_usd": _session_cost(metadata, prompt_tokens, completion_tokens),
+            "duration_s": round(sum(it.get("duration_s", 0) for it in iterations), 2),
+            "ttft_mean_s": metadata.get("timings", {}).get("llm", {}).get("ttft_s_mean"),
+            "updated_at": time.time()
+        }
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in row if c != "session_id")
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO sessions ({columns}) VALUES ({placeholders}) ON CONFLICT(session_id) DO UPDATE SET {updates}",
+                tuple(row.values())
+            )
+
+    def record_review(self, session_dir: str, filename: str, content: str):
+        """Index one saved review file; a Teacher verdict also becomes the session's latest verdict."""
+        session_id = os.path.basename(os.path.normpath(session_dir))
+        match = _REVIEW_FILENAME.search(filename)
+        agent, round_num = (match.group(1), int(match.group(2))) if match else (None, None)
+        verdicts = _VERDICT.findall(content) if agent in ("Teacher", "Teacher_Escalated") else []
+        verdict = verdicts[-1] if verdicts else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reviews (session_id, filename, agent, round, verdict, chars, saved_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, filename, agent, round_num, verdict, len(content), time.time())
+            )
+            if verdict:
+                conn.execute(
+                    "INSERT INTO sessions (session_id, session_dir, verdict, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET verdict = excluded.verdict, updated_at = excluded.updated_at",
+                    (session_id, os.path.abspath(session_dir), verdict, time.time())
+                )
+
+    @staticmethod
+    def _where(filters: dict) -> tuple:
+        unknown = set(filters) - set(_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown session filters: {sorted(unknown)}")
+        active = {k: v for k, v in filters.items() if v is not None}
+        if not active:
+            return "", ()
+        return " WHERE " + " AND ".join(_FILTERS[k] for k in active), tuple(active.values())
+
+    def find_sessions(self, limit: int = 100, **filters) -> list:
+        """Sessions matching the filters (paper_sha256, model, mode, status, verdict, since, until), newest first."""
+        where, params = self._where(filters)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM sessions{where} ORDER BY created_at DESC LIMIT ?", params + (limit,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def session_reviews(self, session_id: str) -> list:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM reviews WHERE session_id = ? ORDER BY round, saved_at", (session_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def aggregate(self, group_by: str = None, **filters) -> list:
+        """Session count, token spend, cost and latency totals, optionally grouped (model, mode, status, verdict, paper_sha256, day)."""
+        if group_by is not None and group_by not in _GROUP_COLUMNS:
+            raise ValueError(f"Cannot group sessions by {group_by!r}")
+        where, params = self._where(filters)
+        key = "substr(created_at, 1, 10)" if group_by == "day" else group_by
+        select_key = f"{key} AS {group_by}, " if group_by else ""
+        group_clause = f" GROUP BY {key} ORDER BY {key}" if group_by else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {select_key}COUNT(*) AS sessions, SUM(total_tokens) AS total_tokens, "
+                f"SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens, "
+                f"SUM(cost_usd) AS cost_usd, AVG(duration_s) AS avg_duration_s, MAX(duration_s) AS max_duration_s, "
+                f"AVG(ttft_mean_s) AS avg_ttft_s FROM sessions{where}{group_clause}",
+                params
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def rebuild(self, base_dir: str) -> int:
+        """Backfill the index from existing session folders (metadata.json plus saved .md files)."""
+        count = 0
+        for name in sorted(os.listdir(base_dir)):
+            session_dir = os.path.join(base_dir, name)
+            meta_path = os.path.join(session_dir, "metadata.json")
+            if not os.path.isfile(meta_path):
+                continue
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.record_session(session_dir, json.load(f))
+            for filename in sorted(os.listdir(session_dir)):
+                if filename.endswith(".md") and filename != "metadata.md":
+                    with open(os.path.join(session_dir, filename), "r", encoding="utf-8") as f:
+                        self.record_review(session_dir, filename, f.read())
+            count += 1
+        return count
+
+_index = None
+
+def get_session_index() -> SessionIndex:
+    """Process-wide SessionIndex at SESSION_INDEX_DB; None when it is set to "off"."""
+    global _index
+    if os.getenv("SESSION_INDEX_DB") == "off":
+        return None
+    if _index is None:
+        _index = SessionIndex()
+    return _index
+
+def index_session(session_dir: str, metadata: dict):
+    """Called by save_metadata. Indexing problems are reported but never fail a review."""
+    try:
+        index = get_session_index()
+        if index is not None:
+            index.record_session(session_dir, metadata)
+    except Exception as e:
+        warnings.warn(f"Session index update failed: {e}")
+
+def index_review(session_dir: str, filename: str, content: str):
+    """Called by save_review. Indexing problems are reported but never fail a review."""
+    try:
+        index = get_session_index()
+        if index is not None:
+            index.record_review(session_dir, filename, content)
+    except Exception as e:
+        warnings.warn(f"Session index update failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the Reviewer Tycoon session index.")
+    parser.add_argument("--db", help="Index file (default: SESSION_INDEX_DB or .cache/sessions.sqlite3)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="Index existing session folders")
+    rebuild.add_argument("base_dir", nargs="?", default="review_outputs")
+    for name in ("query", "stats"):
+        p = sub.add_parser(name)
+        p.add_argument("--paper-sha256")
+        p.add_argument("--model")
+        p.add_argument("--mode")
+        p.add_argument("--status")
+        p.add_argument("--verdict", choices=["Approved", "Needs Revision"])
+        p.add_argument("--since", help="ISO date, inclusive")
+        p.add_argument("--until", help="ISO date, exclusive")
+        if name == "query":
+            p.add_argument("--limit", type=int, default=50)
+        else:
+            p.add_argument("--group-by", choices=_GROUP_COLUMNS)
+    args = parser.parse_args()
+
+    index = SessionIndex(args.db)
+    if args.command == "rebuild":
+        print(f"Indexed {index.rebuild(args.base_dir)} sessions into {index.db_path}")
+        return
+    filters = {k: getattr(args, k) for k in ("paper_sha256", "model", "mode", "status", "verdict", "since", "until")}
+    if args.command == "query":
+        rows = index.find_sessions(limit=args.limit, **filters)
+    else:
+        rows = index.aggregate(group_by=args.group_by, **filters)
+    print(json.dumps(rows, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import save_checkpoint, close_checkpoint, CHECKPOINT_FILENAME, CHECKPOINT_STATUS_FILENAME
+from pipeline import find_resumable_sessions
+
+def checkpoint(status: str, title: str) -> dict:
+    return {"mode": "mode3", "status": status, "next_round": 2, "next_agent": "Teacher", "paper_title": title,
+            "max_iters": 3, "paper_text": "x" * 10000, "session_metadata": {"iterations": []}}
+
+def test_listing_reads_status_summaries_only(tmp_path):
+    for name, status in (("s1", "in_progress"), ("s2", "approved")):
+        os.makedirs(tmp_path / name)
+        save_checkpoint(str(tmp_path / name), checkpoint(status, name))
+    close_checkpoint(str(tmp_path / "s2"), checkpoint("approved", "s2"))
+    # A corrupt full checkpoint must not matter once its summary exists
+    (tmp_path / "s1" / CHECKPOINT_FILENAME).write_text("{", encoding="utf-8")
+
+    sessions = find_resumable_sessions(str(tmp_path))
+    assert [s["session_id"] for s in sessions] == ["s1"]
+    assert sessions[0]["next_agent"] == "Teacher"
+    assert not (tmp_path / "s2" / CHECKPOINT_FILENAME).exists()
+    assert "paper_text" not in json.loads((tmp_path / "s2" / CHECKPOINT_STATUS_FILENAME).read_text(encoding="utf-8"))
+
+def test_legacy_checkpoint_gets_a_summary(tmp_path):
+    session_dir = tmp_path / "old"
+    os.makedirs(session_dir)
+    (session_dir / CHECKPOINT_FILENAME).write_text(json.dumps(checkpoint("error", "old")), encoding="utf-8")
+    assert [s["status"] for s in find_resumable_sessions(str(tmp_path))] == ["error"]
+    assert (session_dir / CHECKPOINT_STATUS_FILENAME).exists()
@@ -0,0 +1,15 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from convergence import ConvergenceMonitor
+
+def test_skipped_feedback_observation_does_not_stall_next_round():
+    monitor = ConvergenceMonitor(draft_threshold=0.9, feedback_threshold=0.9)
+    monitor.start_round()
+    monitor.observe_feedback("Fix the related work section.", "Fix the related work section.")
+    assert monitor.stall_reason() == "feedback_repeated"
+    # A grounding send-back leaves no previous feedback, so the next round observes nothing.
+    monitor.start_round()
+    monitor.observe_draft("Draft one about results.", "A rewritten draft covering new ground entirely.")
+    assert monitor.stall_reason() is None
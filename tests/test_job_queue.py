@@ -0,0 +1,41 @@
+import os
+import sys
+import json
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import io
+from job_queue import JobQueue, save_job_upload, remove_job_uploads
+
+def stored_payloads(db_path: str) -> list:
+    with sqlite3.connect(db_path) as conn:
+        return [json.loads(row[0]) for row in conn.execute("SELECT payload FROM jobs ORDER BY id")]
+
+def test_api_key_is_never_stored(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(db_path)
+    job_id = queue.submit({"mode": 1, "config": {"model_name": "m", "api_key": "sk-secret"}})
+    assert "sk-secret" not in json.dumps(stored_payloads(db_path))
+    assert queue.claim("w")["payload"]["config"] == {"model_name": "m"}
+    assert queue.get(job_id)["status"] == "running"
+
+def test_keys_left_by_older_queues_are_scrubbed(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    JobQueue(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO jobs (status, payload, created_at) VALUES ('queued', ?, 0)",
+                     (json.dumps({"config": {"api_key": "sk-old", "model_name": "m"}}),))
+    JobQueue(db_path)
+    assert stored_payloads(db_path) == [{"config": {"model_name": "m"}}]
+
+def test_uploads_are_removed_but_other_paths_kept(tmp_path):
+    upload_dir = str(tmp_path / "uploads")
+    upload = io.BytesIO(b"%PDF")
+    upload.name = "paper.pdf"
+    paper_path = save_job_upload(upload, upload_dir)
+    local_template = tmp_path / "template.md"
+    local_template.write_text("# Template")
+    remove_job_uploads({"paper_path": paper_path, "template_path": str(local_template), "draft_path": None}, upload_dir)
+    assert not os.path.exists(paper_path)
+    assert os.listdir(upload_dir) == []
+    assert local_template.exists()
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fitz  # PyMuPDF
+from job_worker import start_workers, stop_workers, make_live_render
+from job_queue import read_live_output
+from utils import extract_text_from_pdf, PARALLEL_MIN_PAGES
+
+def make_pdf(path: str, pages: int):
+    doc = fitz.open()
+    for p in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page marker {p}")
+    doc.save(path)
+    doc.close()
+
+def parse_in_worker(pdf_path: str, results):
+    try:
+        results.put(extract_text_from_pdf(pdf_path, workers=2))
+    except Exception as e:
+        results.put(e)
+
+def test_pooled_worker_parses_large_pdf_in_parallel(tmp_path):
+    """A pooled job worker may start its own process pool, as parallel PDF extraction does."""
+    pages = PARALLEL_MIN_PAGES + 12
+    pdf_path = str(tmp_path / "paper.pdf")
+    make_pdf(pdf_path, pages)
+    results = multiprocessing.Queue()
+    processes = start_workers(2, parse_in_worker, (pdf_path, results))
+    try:
+        texts = [results.get(timeout=120) for _ in processes]
+    finally:
+        stop_workers(processes)
+    for text in texts:
+        assert not isinstance(text, Exception), text
+        assert f"Page marker {pages - 1}" in text
+
+def test_concurrent_panel_turns_do_not_interleave(tmp_path):
+    render = make_live_render(str(tmp_path))
+
+    def stream(n):
+        for i in range(5):
+            time.sleep(0.01)
+            yield f"[{n}.{i}]"
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        texts = list(executor.map(lambda n: render(f"Reviewer {n}", 1, stream(n)), range(1, 4)))
+    output = read_live_output(str(tmp_path), max_chars=10000)
+    for n, text in enumerate(texts, start=1):
+        assert text == "".join(f"[{n}.{i}]" for i in range(5))
+        assert f"#### Round 1 · Reviewer {n}\n\n{text}" in output
@@ -0,0 +1,43 @@
+import os
+import sys
+from types import SimpleNamespace
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import agents
+from agents import BaseAgent
+from cache import ResponseCache
+
+def fake_completion(failing_model: str):
+    async def acompletion_pooled(**args):
+        if args["model"] == failing_model:
+            raise ValueError("primary rejected the request")
+
+        async def stream():
+            delta = SimpleNamespace(content=f"answer from {args['model']}", reasoning_content=None)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+        return stream()
+    return acompletion_pooled
+
+def cached_entries(cache_dir) -> list:
+    return [f for f in os.listdir(cache_dir) if f.endswith(".json")] if os.path.isdir(cache_dir) else []
+
+def test_fallback_answers_are_not_cached_under_the_primary_key(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "responses")
+    agent = BaseAgent("gpt-4o", "sk-test", response_cache=ResponseCache(cache_dir),
+                      fallbacks=[{"model_name": "gpt-4o-mini", "base_url": None}], cascade=[])
+    messages = [{"role": "user", "content": "Review this."}]
+
+    monkeypatch.setattr(agents, "acompletion_pooled", fake_completion(failing_model="gpt-4o"))
+    assert "".join(agent._call_llm_stream(messages)) == "answer from gpt-4o-mini"
+    assert agent.last_call_stats["model"] == "gpt-4o-mini"
+    assert cached_entries(cache_dir) == []
+
+    monkeypatch.setattr(agents, "acompletion_pooled", fake_completion(failing_model=None))
+    assert "".join(agent._call_llm_stream(messages)) == "answer from gpt-4o"
+    assert len(cached_entries(cache_dir)) == 1
+
+def test_extra_headers_are_part_of_the_key():
+    request = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Hi"}]}
+    assert ResponseCache.make_key(dict(request, extra_headers={"GroupId": "a"})) != \
+        ResponseCache.make_key(dict(request, extra_headers={"GroupId": "b"}))
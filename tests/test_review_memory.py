@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import review_memory
+from pipeline import recall_review_memory
+
+class Student:
+    memory_top_k = 3
+
+def test_unreadable_memory_is_recorded_not_raised(tmp_path, monkeypatch):
+    db_path = tmp_path / "memory.sqlite3"
+    db_path.write_bytes(b"not a sqlite database" * 100)
+    monkeypatch.setenv("REVIEW_MEMORY_DB", str(db_path))
+    monkeypatch.setattr(review_memory, "_memory", None)
+    metadata = {"files": {"paper_sha256": "abc"}}
+    logs = []
+
+    assert recall_review_memory(Student(), "A paper about graphs.", str(tmp_path), metadata, logs.append) == ""
+    assert "error" in metadata["review_memory"]
+    assert logs and "Review memory unavailable" in logs[0]
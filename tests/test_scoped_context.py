@@ -0,0 +1,29 @@
+import os
+import sys
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents import TeacherEvaluatorAgent
+from pipeline import summarize_teacher_context, summarize_paper_context
+
+PAPER = "\n\n".join(f"Section {i}. We evaluate method {i} on dataset D{i} and report {60 + i}% accuracy." * 8 for i in range(40))
+DRAFT = "The method reaches 65% accuracy on dataset D5, but baselines are missing."
+
+def test_retrieval_and_digest_report_the_same_reduction_fields():
+    retrieval = TeacherEvaluatorAgent("gpt-4o", "k", context_mode="retrieval")
+    retrieval.build_evaluation_messages(PAPER, DRAFT, "Evaluate.")
+    digest = TeacherEvaluatorAgent("gpt-4o", "k", paper_context="digest").with_digest("## Claims\n- 65% on D5")
+    digest.build_evaluation_messages(PAPER, DRAFT, "Evaluate.")
+
+    for agent, mode in ((retrieval, "retrieval"), (digest, "digest")):
+        stats = agent.last_context_stats
+        assert stats["mode"] == mode
+        assert 0 < stats["prompt_tokens"] < stats["full_prompt_tokens"]
+        assert stats["saved_prompt_tokens"] == stats["full_prompt_tokens"] - stats["prompt_tokens"]
+
+    iteration = lambda agent: {"context": agent.last_context_stats, "duration_s": 1.0, "timings": {}}
+    metadata = {"iterations": [iteration(retrieval), iteration(digest)], "paper_digest": {"cached": True}}
+    teacher_context, paper_context = summarize_teacher_context(metadata), summarize_paper_context(metadata)
+    assert teacher_context["calls"] == paper_context["calls"] == 1
+    assert teacher_context["prompt_tokens"] == retrieval.last_context_stats["prompt_tokens"]
+    assert paper_context["net_saved_tokens"] == digest.last_context_stats["saved_prompt_tokens"]
@@ -0,0 +1,28 @@
+import os
+import sys
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import session_index
+from session_index import SessionIndex, index_session
+
+def test_iterations_without_tokens_are_indexed(tmp_path):
+    index = SessionIndex(str(tmp_path / "sessions.sqlite3"))
+    metadata = {"session_id": "s1", "model": "gpt-4o", "iterations": [
+        {"round": 1, "tokens": {"prompt_tokens": 10, "completion_tokens": 5}},
+        {"round": 1, "agent": "Student", "sent_back": True},
+    ]}
+    index.record_session(str(tmp_path / "s1"), metadata)
+    with index._connect() as conn:
+        row = conn.execute("SELECT rounds, total_tokens FROM sessions WHERE session_id = 's1'").fetchone()
+    assert tuple(row) == (1, 15)
+
+def test_index_failures_never_fail_the_save(monkeypatch, tmp_path):
+    class Broken:
+        def record_session(self, session_dir, metadata):
+            raise KeyError("tokens")
+    monkeypatch.setattr(session_index, "get_session_index", lambda: Broken())
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        index_session(str(tmp_path), {})
+    assert any("Session index update failed" in str(w.message) for w in caught)
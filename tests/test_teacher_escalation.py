@@ -0,0 +1,30 @@
+import os
+import sys
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import agents
+from agents import TeacherEvaluatorAgent, parse_model_cascade
+from pipeline import run_teacher_turn
+
+def test_escalated_reply_does_not_overwrite_the_cheap_one(tmp_path, monkeypatch):
+    def fake_stream(self, messages):
+        yield f"{self.model_name} says [Verdict: Approved]"
+    monkeypatch.setattr(agents.BaseAgent, "_call_llm_stream", fake_stream)
+    monkeypatch.setenv("SESSION_INDEX_DB", "off")
+    monkeypatch.setenv("LLM_CACHE_MODE", "off")
+    teacher = TeacherEvaluatorAgent("gpt-4o", "k", cascade=parse_model_cascade("teacher=gpt-4o-mini"))
+    metadata = {"iterations": []}
+
+    feedback, iter_meta, _ = run_teacher_turn(
+        teacher, 1, lambda agent: agent.evaluate_review_stream("Paper.", "Draft.", "Evaluate."),
+        str(tmp_path), "Mode3_P_Teacher_Round1.md", metadata
+    )
+
+    cheap, escalated = metadata["iterations"]
+    assert cheap["output_file"] == "Mode3_P_Teacher_Round1.md"
+    assert escalated["output_file"] == iter_meta["output_file"] == "Mode3_P_Teacher_Escalated_Round1.md"
+    assert escalated["escalated"] == "approval_check"
+    assert (tmp_path / cheap["output_file"]).read_text(encoding="utf-8").startswith("gpt-4o-mini says")
+    assert (tmp_path / escalated["output_file"]).read_text(encoding="utf-8") == feedback
+    assert feedback.startswith("gpt-4o says")
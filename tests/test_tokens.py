@@ -0,0 +1,27 @@
+import os
+import sys
+import gc
+import weakref
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tokens
+from tokens import count_text_tokens
+
+class Text(str):
+    """A str subclass, so the test can hold a weak reference to it."""
+
+def test_memoized_counts_do_not_keep_texts_alive():
+    text = Text("word " * 20000)
+    ref = weakref.ref(text)
+    first = count_text_tokens("gpt-4o", text)
+    assert count_text_tokens("gpt-4o", "word " * 20000) == first
+    del text
+    gc.collect()
+    assert ref() is None
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(tokens, "TOKEN_COUNT_CACHE_SIZE", 8)
+    for i in range(20):
+        count_text_tokens("gpt-4o", f"text {i}")
+    assert len(tokens._token_counts) <= 8
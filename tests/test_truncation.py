@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from truncation import split_sections
+
+PAPER = """A Paper Title
+Abstract
+We study section detection.
+1 Introduction
+Our claims are supported by the
+references cited and to
+Appendix B for details. We then
+move on.
+2 Method
+The core method.
+3 Experiments
+The core results.
+References
+[1] A cited work.
+A Additional Experiments
+Supplementary tables.
+"""
+
+def categories(text: str) -> dict:
+    return {s["title"]: s["category"] for s in split_sections(text)}
+
+def test_wrapped_body_lines_are_not_headings():
+    found = categories(PAPER)
+    assert "references cited and to" not in found
+    assert "Appendix B for details. We then" not in found
+    assert found["Method"] == "method"
+    assert found["Experiments"] == "experiments"
+    assert found["References"] == "references"
+    assert found["Additional Experiments"] == "appendix"
+
+def test_sections_still_concatenate_to_the_input():
+    assert "".join(s["text"] for s in split_sections(PAPER)) == PAPER
+
+def test_heading_styles():
+    found = categories("Intro text\nRelated work\nx\nEXPERIMENTAL SETUP\ny\nConclusion and Future Work\nz\n")
+    assert found == {"Front Matter": "front_matter", "Related work": "related_work",
+                     "EXPERIMENTAL SETUP": "experiments", "Conclusion and Future Work": "conclusion"}
@@ -0,0 +1,104 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# ------------------------------------------------------------------
+# TOKEN COUNTING HELPERS
+# ------------------------------------------------------------------
+# litellm is imported inside the helpers: it takes seconds to load, and the UI
+# must be able to start (and rerun) without it until a review actually runs.
+
+# Used when litellm has no context-window entry for the configured model (e.g. custom endpoints)
+DEFAULT_CONTEXT_TOKENS = 32768
+
+# Memoized counts, keyed by a SHA-256 of the text so the cache holds no paper or draft text itself
+TOKEN_COUNT_CACHE_SIZE = 2048
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+def count_text_tokens(model_name: str, text: str) -> tuple:
+    """
+    Count the tokens of `text` for `model_name`, memoized so invariant inputs
+    (the paper, its sections, templates, system prompts) are tokenized only once.
+    Returns (tokens, estimated) where `estimated` is True if the tokenizer lookup
+    failed and the 1 token ≈ 4 chars heuristic was used instead.
+    """
+    key = (model_name, hashlib.sha256(text.encode("utf-8")).digest())
+    with _token_counts_lock:
+        counted = _token_counts.get(key)
+        if counted is not None:
+            _token_counts.move_to_end(key)
+            return counted
+    try:
+        from litellm import token_counter
+        counted = token_counter(model=model_name, text=text), False
+    except Exception:
+        counted = len(text) // 4, True
+    with _token_counts_lock:
+        _token_counts[key] = counted
+        while len(_token_counts) > TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return counted
+
+# OpenAI chat format framing: tokens wrapping each message, plus the assistant reply primer
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+def count_message_tokens(model_name: str, messages: list) -> tuple:
+    """
+    Prompt tokens of a chat request, summed from memoized per-part counts plus the
+    per-message framing, so the paper block is tokenized once per session rather than
+    on every call. Returns (tokens, estimated) like count_text_tokens.
+    """
+    total = TOKENS_PER_REPLY
+    estimated = False
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"text": content or ""}]
+        texts = [message.get("role", "")] + [part.get("text") or "" for part in parts]
+        total += TOKENS_PER_MESSAGE
+        for text in texts:
+            tokens, text_estimated = count_text_tokens(model_name, text)
+            total += tokens
+            estimated = estimated or text_estimated
+    return total, estimated
+
+def prompt_reduction(full_tokens: int, prompt_tokens: int) -> dict:
+    """
+    Prompt tokens of scoped requests (retrieved passages or the paper digest instead of the full paper)
+    against the same requests with the full paper. Both sides must be counted with the same tokenizer.
+    """
+    return {
+        "full_prompt_tokens": full_tokens, "prompt_tokens": prompt_tokens,
+        "saved_prompt_tokens": full_tokens - prompt_tokens,
+        "reduction_pct": round(100 * (1 - prompt_tokens / full_tokens), 1) if full_tokens else 0.0
+    }
+
+@lru_cache(maxsize=64)
+def model_context_window(model_name: str) -> int:
+    """
+    Maximum input tokens for `model_name`. MODEL_CONTEXT_TOKENS overrides the
+    lookup; unknown models fall back to DEFAULT_CONTEXT_TOKENS.
+    """
+    override = os.getenv("MODEL_CONTEXT_TOKENS")
+    if override:
+        return int(override)
+    try:
+        from litellm import get_model_info
+        info = get_model_info(model_name)
+        return int(info.get("max_input_tokens") or info.get("max_tokens") or DEFAULT_CONTEXT_TOKENS)
+    except Exception:
+        return DEFAULT_CONTEXT_TOKENS
+
+def estimate_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost from litellm's price map, or None for models it does not know."""
+    try:
+        from litellm import cost_per_token
+        prompt_cost, completion_cost = cost_per_token(
+            model=model_name, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+        return round(prompt_cost + completion_cost, 6)
+    except Exception:
+        return None
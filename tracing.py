@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# ------------------------------------------------------------------
+# PER-SESSION TIMING TRACE
+# ------------------------------------------------------------------
+# Every stage of a session (parse, truncate, prompt assembly, LLM stream,
+# disk writes) appends one span to <session_dir>/trace.jsonl:
+#   {"ts": <start epoch>, "name": "llm_stream", "duration_s": 12.3, ...attrs}
+# The file is append-only, so a resumed session keeps extending the same trace.
+
+TRACE_FILENAME = "trace.jsonl"
+_write_lock = threading.Lock()
+
+class SessionTrace:
+    def __init__(self, session_dir: str):
+        self.path = os.path.join(session_dir, TRACE_FILENAME)
+
+    def record(self, name: str, duration_s: float, ts: float = None, **attrs):
+        span = {"ts": round(ts if ts is not None else time.time() - duration_s, 3), "name": name,
+                "duration_s": round(duration_s, 4), **{k: v for k, v in attrs.items() if v is not None}}
+        line = json.dumps(span, ensure_ascii=False) + "\n"
+        with _write_lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time the enclosed block as one span. The yielded dict can be filled with extra attributes."""
+        ts = time.time()
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.record(name, time.perf_counter() - start, ts=ts, **attrs)
+
+    def spans(self) -> list:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def summary(self) -> dict:
+        """Per-stage totals plus LLM latency figures over every span in the trace file."""
+        spans = self.spans()
+        stages = {}
+        for span in spans:
+            stage = stages.setdefault(span["name"], {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            stage["count"] += 1
+            stage["total_s"] += span["duration_s"]
+            stage["max_s"] = max(stage["max_s"], span["duration_s"])
+        for stage in stages.values():
+            stage["total_s"] = round(stage["total_s"], 3)
+            stage["max_s"] = round(stage["max_s"], 3)
+
+        summary = {"trace_file": TRACE_FILENAME, "stages": stages}
+        calls = [s for s in spans if s["name"] == "llm_stream" and s.get("ttft_s") is not None]
+        if calls:
+            generation_s = sum(s["generation_s"] for s in calls)
+            completion_tokens = sum(s.get("completion_tokens") or 0 for s in calls)
+            summary["llm"] = {
+                "calls": len(calls),
+                "ttft_s_mean": round(sum(s["ttft_s"] for s in calls) / len(calls), 3),
+                "ttft_s_max": round(max(s["ttft_s"] for s in calls), 3),
+                "inter_chunk_gap_s_max": round(max(s.get("gap_max_s") or 0.0 for s in calls), 3),
+                "limiter_wait_s": round(sum(s.get("limiter_wait_s") or 0.0 for s in calls), 3),
+                "completion_tokens_per_s": round(completion_tokens / generation_s, 2) if generation_s > 0 else None
+            }
+        return summary
+
+def timed_stream(stream_generator, timings: dict):
+    """
+    Pass chunks through while recording time to first chunk, inter-chunk gaps and total
+    stream time into `timings`. Gaps include the consumer's own rendering time.
+    """
+    start = time.perf_counter()
+    last = None
+    gaps = []
+    try:
+        for chunk in stream_generator:
+            now = time.perf_counter()
+            if last is None:
+                timings["ttft_s"] = round(now - start, 4)
+            else:
+                gaps.append(now - last)
+            last = now
+            yield chunk
+    finally:
+        end = time.perf_counter()
+        timings["stream_s"] = round(end - start, 4)
+        timings["chunks"] = len(gaps) + (last is not None)
+        if last is not None:
+            timings["generation_s"] = round(last - start - timings["ttft_s"], 4)
+        if gaps:
+            gaps.sort()
+            timings["gap_mean_s"] = round(sum(gaps) / len(gaps), 4)
+            timings["gap_p95_s"] = round(gaps[min(len(gaps) - 1, int(len(gaps) * 0.95))], 4)
+            timings["gap_max_s"] = round(gaps[-1], 4)
+
+# ------------------------------------------------------------------
+# METRICS TEXT EXPOSITION
+# ------------------------------------------------------------------
+# With METRICS_TEXTFILE set, every finished session is folded into running
+# totals (kept in <file>.json) and the file is rewritten in the Prometheus
+# text format, e.g. for node_exporter's textfile collector.
+
+_metrics_lock = threading.Lock()
+
+def _metric_lines(state: dict) -> list:
+    lines = []
+    for name, (kind, help_text) in (
+        ("reviewer_sessions_total", ("counter", "Finished review sessions")),
+        ("reviewer_stage_seconds_total", ("counter", "Time spent per pipeline stage")),
+        ("reviewer_stage_spans_total", ("counter", "Spans recorded per pipeline stage")),
+        ("reviewer_llm_ttft_seconds_total", ("counter", "Sum of LLM time to first token")),
+        ("reviewer_llm_calls_total", ("counter", "LLM calls with a first token")),
+        ("reviewer_tokens_total", ("counter", "Prompt and completion tokens")),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(state.get(name, {}).items()):
+            lines.append(f"{name}{{{labels}}} {value}")
+    return lines
+
+def _add(state: dict, name: str, labels: str, value: float):
+    series = state.setdefault(name, {})
+    series[labels] = round(series.get(labels, 0) + value, 4)
+
+def update_metrics_textfile(session_dir: str, session_metadata: dict, status: str, path: str = None) -> str:
+    """
+    Add one session run's spans and token counts to the METRICS_TEXTFILE totals. Only work
+    not exported before is added (tracked in session_metadata["metrics_exported"]), so a
+    resumed session is not counted twice. Returns the path, or None if disabled.
+    """
+    path = path or os.getenv("METRICS_TEXTFILE")
+    if not path:
+        return None
+    exported = session_metadata.setdefault("metrics_exported", {"spans": 0, "iterations": 0})
+    all_spans = SessionTrace(session_dir).spans()
+    spans = all_spans[exported["spans"]:]
+    iterations = session_metadata.get("iterations", [])[exported["iterations"]:]
+    mode = session_metadata.get("mode", "")
+    model = session_metadata.get("model", "")
+    state_path = path + ".json"
+    with _metrics_lock:
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+
+        _add(state, "reviewer_sessions_total", f'mode="{mode}",status="{status}"', 1)
+        for span in spans:
+            _add(state, "reviewer_stage_seconds_total", f'stage="{span["name"]}"', span["duration_s"])
+            _add(state, "reviewer_stage_spans_total", f'stage="{span["name"]}"', 1)
+            if span["name"] == "llm_stream" and span.get("ttft_s") is not None:
+                _add(state, "reviewer_llm_ttft_seconds_total", f'model="{model}"', span["ttft_s"])
+                _add(state, "reviewer_llm_calls_total", f'model="{model}"', 1)
+        for it in iterations:
+            for kind in ("prompt", "completion"):
+                _add(state, "reviewer_tokens_total", f'model="{model}",kind="{kind}"', it["tokens"].get(f"{kind}_tokens", 0))
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(state_path + ".tmp", state_path)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(_metric_lines(state)) + "\n")
+        os.replace(path + ".tmp", path)
+
+    exported.update({"spans": len(all_spans), "iterations": len(session_metadata.get("iterations", []))})
+    return path
@@ -0,0 +1,198 @@
+import os
+import re
+from tokens import count_text_tokens, model_context_window
+
+# ------------------------------------------------------------------
+# SECTION-AWARE, TOKEN-BUDGETED PAPER TRUNCATION
+# ------------------------------------------------------------------
+
+# Tokens kept free for system prompt, template, draft/feedback and the completion
+DEFAULT_RESERVE_TOKENS = 12000
+MIN_PAPER_TOKENS = 2000
+# Generous chars-per-token bound used to size the early-stop limit for PDF extraction
+EXTRACTION_CHARS_PER_TOKEN = 12
+
+# Higher priority sections are kept longest; the lowest priority is dropped first
+SECTION_PRIORITY = {
+    "abstract": 100,
+    "method": 85,
+    "experiments": 80,
+    "body": 70,
+    "introduction": 60,
+    "conclusion": 50,
+    "front_matter": 40,
+    "related_work": 30,
+    "appendix": 10,
+    "acknowledgements": 5,
+    "references": 0,
+}
+
+SECTION_KEYWORDS = [
+    ("abstract", r"abstract"),
+    ("introduction", r"introduction"),
+    ("related_work", r"related\s+work|background|preliminar(?:y|ies)|prior\s+work|literature\s+review"),
+    ("method", r"methods?|methodology|approach|proposed|our\s+method|framework|problem\s+(?:formulation|definition|setup)|model"),
+    ("experiments", r"experiments?|experimental|evaluation|results|empirical|ablations?|analysis"),
+    ("conclusion", r"conclusions?|discussion|limitations?|future\s+work|broader\s+impacts?"),
+    ("acknowledgements", r"acknowledge?ments?"),
+    ("references", r"references|bibliography"),
+    ("appendix", r"appendi(?:x|ces)|supplementary"),
+]
+
+_NUMBERING = r"(?P<numbering>(?:\d{1,2}(?:\.\d{1,2})*|[IVX]{1,4}|[A-H])\.?\s+)?"
+_KEYWORD = r"(?P<keyword>" + "|".join(p for _, p in SECTION_KEYWORDS) + r")\b"
+_KEYWORD_HEADING = re.compile(r"^\s*" + _NUMBERING + r"(?P<title>" + _KEYWORD + r".{0,60})$", re.IGNORECASE)
+# Wrapped body text ("references cited and to", "Appendix B for details. We then") also starts with
+# keywords, so a keyword line only counts as a heading if it is shaped like one (see _heading_shaped)
+_SENTENCE_PUNCTUATION = re.compile(r"[,;!?]|\.\s|\.$")
+_SMALL_WORDS = {"a", "an", "and", "as", "at", "by", "for", "from", "in", "of", "on", "or", "the", "to", "via", "vs", "with"}
+# Only a standalone bibliography heading starts the back matter
+_REFERENCES_HEADING = re.compile(r"^(?:references?|bibliography)$", re.IGNORECASE)
+# Top-level numbered headings with custom titles, e.g. "3 Diffusion Transformers"
+_NUMBERED_HEADING = re.compile(r"^\s*(?P<num>\d{1,2})\.?\s+(?P<title>[A-Z][A-Za-z\-]+(?:\s+[A-Za-z\-:]+){0,7})\s*$")
+# Lettered appendix headings after the bibliography, e.g. "A Additional Experiments"
+_LETTERED_HEADING = re.compile(r"^\s*[A-H]\.?\s+(?P<title>[A-Z][A-Za-z\-]+(?:\s+[A-Za-z\-:]+){0,7})\s*$")
+
+def _classify(title: str) -> str:
+    for category, pattern in SECTION_KEYWORDS:
+        if re.match(pattern, title.strip(), re.IGNORECASE):
+            return category
+    return "body"
+
+def _heading_shaped(match: re.Match) -> bool:
+    """
+    A keyword line is a heading if it starts with a capital, has no sentence punctuation and is
+    either numbered, just the keyword ("Related work"), ALL CAPS, or Title Case ("Experimental Setup").
+    """
+    title = match.group("title").strip()
+    if not title[0].isupper() or _SENTENCE_PUNCTUATION.search(title):
+        return False
+    if match.group("numbering") or title == match.group("keyword") or title.isupper():
+        return True
+    words = title.split()
+    return len(words) <= 8 and all(w[0].isupper() or w[0].isdigit() or w in _SMALL_WORDS for w in words) \
+        and words[-1] not in _SMALL_WORDS
+
+def split_sections(text: str) -> list:
+    """
+    Split extracted paper text into sections at detected headings.
+    Returns a list of {"title", "category", "text"} dicts in document order;
+    the concatenation of all section texts equals the input.
+    """
+    sections = [{"title": "Front Matter", "category": "front_matter", "lines": []}]
+    next_number = 1
+    after_references = False
+
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        title = None
+        if 0 < len(stripped) <= 80:
+            match = _KEYWORD_HEADING.match(stripped)
+            if match and _heading_shaped(match):
+                title = match.group("title")
+            else:
+                match = _NUMBERED_HEADING.match(stripped)
+                # Only accept the next expected top-level number, to avoid matching list items or table rows
+                if match and int(match.group("num")) == next_number:
+                    title = match.group("title")
+                elif after_references:
+                    match = _LETTERED_HEADING.match(stripped)
+                    if match:
+                        title = match.group("title")
+
+        if title is not None:
+            number = re.match(r"(\d{1,2})\b", stripped)
+            if number and int(number.group(1)) == next_number:
+                next_number += 1
+            category = _classify(title)
+            if after_references and category != "references":
+                # Everything following the bibliography is supplementary material
+                category = "appendix"
+            after_references = after_references or bool(_REFERENCES_HEADING.match(title.strip()))
+            sections.append({"title": title.strip(), "category": category, "lines": [line]})
+        else:
+            sections[-1]["lines"].append(line)
+
+    result = []
+    for section in sections:
+        section_text = "".join(section["lines"])
+        if section_text:
+            result.append({"title": section["title"], "category": section["category"], "text": section_text})
+    return result
+
+def paper_token_budget(model_name: str, reserve_tokens: int = DEFAULT_RESERVE_TOKENS) -> int:
+    """
+    Tokens available for the paper: the model's context window minus `reserve_tokens`,
+    optionally capped by PAPER_MAX_TOKENS.
+    """
+    budget = max(MIN_PAPER_TOKENS, model_context_window(model_name) - reserve_tokens)
+    cap = os.getenv("PAPER_MAX_TOKENS")
+    if cap:
+        budget = min(budget, int(cap))
+    return budget
+
+def extraction_char_limit(model_name: str) -> int:
+    """Early-stop limit for PDF extraction, loose enough that section selection still sees the main body."""
+    return paper_token_budget(model_name) * EXTRACTION_CHARS_PER_TOKEN
+
+def truncate_paper(text: str, model_name: str, budget_tokens: int = None) -> tuple:
+    """
+    Fit the paper into a token budget for `model_name`, dropping the lowest
+    priority sections first (references, acknowledgements, appendix, ...) and
+    trimming the tail of the section that crosses the budget.
+    Returns (truncated_text, truncation_metadata).
+    """
+    if budget_tokens is None:
+        budget_tokens = paper_token_budget(model_name)
+
+    sections = split_sections(text)
+    estimated = False
+    for section in sections:
+        section["tokens"], section_estimated = count_text_tokens(model_name, section["text"])
+        estimated = estimated or section_estimated
+        section["status"] = "kept"
+        section["kept_tokens"] = section["tokens"]
+
+    paper_tokens = sum(s["tokens"] for s in sections)
+    total = paper_tokens
+    # Stable sort: among equal priorities, later sections are dropped first
+    drop_order = sorted(reversed(sections), key=lambda s: SECTION_PRIORITY[s["category"]])
+    for section in drop_order:
+        if total <= budget_tokens:
+            break
+        overflow = total - budget_tokens
+        if section["tokens"] > overflow and section["category"] != "references":
+            # Keeping a head of this section is enough to fit the budget
+            keep_ratio = (section["tokens"] - overflow) / section["tokens"]
+            section["text"] = section["text"][:int(len(section["text"]) * keep_ratio * 0.98)]
+            section["text"] += "\n...[Section truncated due to length limitations]...\n"
+            section["status"] = "trimmed"
+            section["kept_tokens"], _ = count_text_tokens(model_name, section["text"])
+        else:
+            section["status"] = "dropped"
+            section["kept_tokens"] = 0
+        total -= section["tokens"] - section["kept_tokens"]
+
+    parts = []
+    for section in sections:
+        if section["status"] == "dropped":
+            parts.append(f"\n...[Section '{section['title']}' omitted due to length limitations]...\n")
+        else:
+            parts.append(section["text"])
+    truncated_text = "".join(parts)
+
+    kept_tokens = sum(s["kept_tokens"] for s in sections)
+    truncation_meta = {
+        "strategy": "section_token_budget",
+        "model": model_name,
+        "budget_tokens": budget_tokens,
+        "paper_tokens": paper_tokens,
+        "kept_tokens": kept_tokens,
+        "token_counts": "estimated" if estimated else "measured",
+        "sections": [
+            {"title": s["title"], "category": s["category"], "status": s["status"],
+             "tokens": s["tokens"], "kept_tokens": s["kept_tokens"]}
+            for s in sections
+        ]
+    }
+    return truncated_text, truncation_meta
@@ -2,10 +2,13 @@ import os
 import io
 import json
 from datetime import datetime
-import fitz  # PyMuPDF
-import docx
 import re
 import shutil
+import secrets
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from session_index import index_session, index_review
 
 def strip_think_tags(text: str) -> str:
     """
@@ -18,35 +21,206 @@ def strip_think_tags(text: str) -> str:
     clean_text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
     return clean_text.strip()
 
-def extract_text_from_pdf(file_stream: io.BytesIO) -> str:
-    """Extract text from a PDF file stream using PyMuPDF."""
-    try:
-        doc = fitz.open(stream=file_stream.read(), filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    """Length of the longest end of `text` that is a proper prefix of `tag` (a tag cut by a chunk boundary)."""
+    for k in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:k]):
+            return k
+    return 0
+
+class ThinkTagFilter:
+    """
+    Streaming counterpart of strip_think_tags. feed() splits each chunk into
+    (answer_text, reasoning_text) as it arrives; a tag cut across chunk boundaries
+    is held back until the next chunk decides it. An unclosed <think> block is
+    treated as reasoning to the end of the stream.
+    """
+    OPEN_TAG, CLOSE_TAG = "<think>", "</think>"
+
+    def __init__(self):
+        self.in_think = False
+        self.pending = ""
+        # Leading whitespace of the answer is dropped, as strip_think_tags does
+        self.answer_started = False
+
+    def _answer(self, text: str) -> str:
+        if not self.answer_started:
+            text = text.lstrip()
+            self.answer_started = bool(text)
         return text
+
+    def feed(self, chunk: str) -> tuple:
+        text, self.pending = self.pending + chunk, ""
+        answer, reasoning = [], []
+        while text:
+            tag = self.CLOSE_TAG if self.in_think else self.OPEN_TAG
+            channel = reasoning if self.in_think else answer
+            idx = text.find(tag)
+            if idx >= 0:
+                channel.append(text[:idx])
+                text = text[idx + len(tag):]
+                self.in_think = not self.in_think
+                continue
+            keep = _partial_tag_suffix(text, tag)
+            channel.append(text[:len(text) - keep])
+            self.pending = text[len(text) - keep:]
+            break
+        return self._answer("".join(answer)), "".join(reasoning)
+
+    def flush(self) -> tuple:
+        """Releases the held-back tail at the end of the stream."""
+        text, self.pending = self.pending, ""
+        if self.in_think:
+            return "", text
+        return self._answer(text), ""
+
+# Documents with at least this many pages are split into page ranges across a process pool
+PARALLEL_MIN_PAGES = 48
+PAGES_PER_TASK = 8
+
+def _open_pdf(pdf_source):
+    """Open a PDF from a path (MuPDF reads it from disk as needed) or from bytes."""
+    # Parser libraries are imported on first use so the UI starts without loading them
+    import fitz  # PyMuPDF
+    if isinstance(pdf_source, str):
+        return fitz.open(pdf_source, filetype="pdf")
+    return fitz.open(stream=pdf_source, filetype="pdf")
+
+# MuPDF caches decoded page resources (mostly images) in a process-wide store of up to 256 MB that
+# text extraction never reuses; emptying it every few pages stops image-heavy PDFs from keeping
+# roughly their own size resident per concurrent session (0 = never)
+DEFAULT_STORE_TRIM_PAGES = 8
+
+def _page_texts(doc, start: int, end: int):
+    """Text of pages [start, end), one string per page."""
+    import fitz  # PyMuPDF
+    trim_every = int(os.getenv("PDF_STORE_TRIM_PAGES", DEFAULT_STORE_TRIM_PAGES))
+    has_images = False
+    for i in range(start, end):
+        page = doc[i]
+        yield page.get_text()
+        if trim_every:
+            # Text-only spans are not trimmed: the store then holds little but fonts worth keeping
+            has_images = has_images or bool(page.get_images())
+            if has_images and (i + 1 - start) % trim_every == 0:
+                fitz.TOOLS.store_shrink(100)
+                has_images = False
+
+def _extract_page_range(pdf_source, start: int, end: int) -> list:
+    """Worker: extract the text of pages [start, end) as a list of strings."""
+    with _open_pdf(pdf_source) as doc:
+        return list(_page_texts(doc, start, end))
+
+def _collect_pages(page_texts, parts: list, collected: int, max_chars: int) -> tuple:
+    """Append page texts until more than max_chars are collected. Returns (collected, budget_reached)."""
+    for page_text in page_texts:
+        parts.append(page_text)
+        collected += len(page_text)
+        if max_chars is not None and collected > max_chars:
+            return collected, True
+    return collected, False
+
+def _extract_pages_parallel(pdf_source, page_count: int, max_chars: int, workers: int) -> list:
+    ranges = [(s, min(s + PAGES_PER_TASK, page_count)) for s in range(0, page_count, PAGES_PER_TASK)]
+    # With a character budget keep one range per worker in flight, so few pages past the budget are parsed
+    window = workers if max_chars is not None else len(ranges)
+    parts = []
+    collected = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        pending = deque(executor.submit(_extract_page_range, pdf_source, s, e) for s, e in ranges[:window])
+        next_idx = len(pending)
+        while pending:
+            collected, budget_reached = _collect_pages(pending.popleft().result(), parts, collected, max_chars)
+            if budget_reached:
+                for future in pending:
+                    future.cancel()
+                break
+            if next_idx < len(ranges):
+                s, e = ranges[next_idx]
+                pending.append(executor.submit(_extract_page_range, pdf_source, s, e))
+                next_idx += 1
+    return parts
+
+def extract_text_from_pdf(source, max_pages: int = None, max_chars: int = None, workers: int = None) -> str:
+    """
+    Extract text from a PDF file path or file stream using PyMuPDF.
+    A path is parsed from disk and only the path is sent to parallel workers; a stream is read into bytes first.
+    Stops after `max_pages` pages, or once more than `max_chars` characters are collected
+    (so truncating the result to max_chars is identical to truncating the full text).
+    Large documents are extracted in parallel page ranges; page texts are joined once at the end.
+    """
+    try:
+        pdf_source = os.fspath(source) if isinstance(source, (str, os.PathLike)) else source.read()
+        with _open_pdf(pdf_source) as doc:
+            page_count = doc.page_count if max_pages is None else min(doc.page_count, max_pages)
+            workers = workers or int(os.getenv("PDF_EXTRACT_WORKERS", 0)) or min(4, os.cpu_count() or 1)
+            if workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+                parts = _extract_pages_parallel(pdf_source, page_count, max_chars, workers)
+            else:
+                parts = []
+                _collect_pages(_page_texts(doc, 0, page_count), parts, 0, max_chars)
+        return "".join(parts)
     except Exception as e:
         raise Exception(f"Failed to parse PDF: {str(e)}")
 
-def extract_text_from_docx(file_stream: io.BytesIO) -> str:
-    """Extract text from a DOCX file stream."""
+def extract_text_from_docx(source) -> str:
+    """Extract text from a DOCX file path or file stream."""
+    import docx
     try:
-        doc = docx.Document(file_stream)
+        doc = docx.Document(source)
         text = "\n".join([para.text for para in doc.paragraphs])
         return text
     except Exception as e:
         raise Exception(f"Failed to parse DOCX: {str(e)}")
 
-def extract_text_from_txt(file_stream: io.BytesIO) -> str:
-    """Extract text from a TXT or Markdown file stream."""
+def extract_text_from_txt(source) -> str:
+    """Extract text from a TXT or Markdown file path or file stream."""
     try:
-        return file_stream.read().decode("utf-8")
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                return f.read().decode("utf-8")
+        return source.read().decode("utf-8")
     except Exception as e:
         raise Exception(f"Failed to read text file: {str(e)}")
 
-def parse_uploaded_file(uploaded_file) -> str:
-    """Router to parse uploaded Streamlit file objects based on their extension."""
+# Bump whenever extraction output changes, so cached text from older extractors is not reused
+EXTRACTOR_VERSION = "v1"
+
+def _extract_by_extension(filename: str, source, max_chars: int = None) -> str:
+    if filename.endswith(".pdf"):
+        return extract_text_from_pdf(source, max_chars=max_chars)
+    elif filename.endswith(".docx"):
+        return extract_text_from_docx(source)
+    elif filename.endswith(".md") or filename.endswith(".txt"):
+        return extract_text_from_txt(source)
+    else:
+        raise ValueError(f"Unsupported file type: {filename}")
+
+def _cache_version(filename: str, max_chars: int = None) -> str:
+    ext = os.path.splitext(filename)[1].lstrip(".")
+    version = f"{ext}_{EXTRACTOR_VERSION}"
+    if max_chars is not None and ext == "pdf":
+        # Budgeted extractions hold partial text, so they must not be shared with full ones
+        version += f"_c{max_chars}"
+    return version
+
+def _cached_extract(cache, key: str, cache_stats: dict, extract) -> str:
+    text = cache.get(key)
+    if cache_stats is not None:
+        outcome = "hits" if text is not None else "misses"
+        cache_stats[outcome] = cache_stats.get(outcome, 0) + 1
+    if text is None:
+        text = extract()
+        cache.put(key, text)
+    return text
+
+def parse_uploaded_file(uploaded_file, cache=None, cache_stats: dict = None, max_chars: int = None) -> str:
+    """
+    Router to parse uploaded Streamlit file objects based on their extension.
+    With a TextCache, previously extracted text is returned without re-parsing;
+    hit/miss counts are accumulated into `cache_stats` if given.
+    `max_chars` lets PDF extraction stop early once the truncation budget is covered.
+    """
     if uploaded_file is None:
         return ""
     
@@ -54,16 +228,28 @@ def parse_uploaded_file(uploaded_file) -> str:
     # Reset pointer before reading
     uploaded_file.seek(0)
     
-    if filename.endswith(".pdf"):
-        return extract_text_from_pdf(uploaded_file)
-    elif filename.endswith(".docx"):
-        return extract_text_from_docx(uploaded_file)
-    elif filename.endswith(".md") or filename.endswith(".txt"):
-        return extract_text_from_txt(uploaded_file)
-    else:
-        raise ValueError(f"Unsupported file type: {filename}")
+    if cache is None:
+        return _extract_by_extension(filename, uploaded_file, max_chars)
+
+    data = uploaded_file.read()
+    key = cache.make_key(data, _cache_version(filename, max_chars))
+    return _cached_extract(cache, key, cache_stats, lambda: _extract_by_extension(filename, io.BytesIO(data), max_chars))
 
-def truncate_text(text: str, max_chars: int = 40000) -> str:
+def parse_file(path: str, cache=None, cache_stats: dict = None, max_chars: int = None, sha256_hex: str = None) -> str:
+    """
+    parse_uploaded_file for a file on disk, e.g. a saved origin file. Parsers read from the path,
+    so the document is never held in memory as one byte string; the cache key is hashed in blocks
+    (or taken from `sha256_hex` when the caller already has it).
+    """
+    filename = path.lower()
+    if cache is None:
+        return _extract_by_extension(filename, path, max_chars)
+    key = cache.make_digest_key(sha256_hex or file_sha256(path), _cache_version(filename, max_chars))
+    return _cached_extract(cache, key, cache_stats, lambda: _extract_by_extension(filename, path, max_chars))
+
+DEFAULT_MAX_CHARS = 40000
+
+def truncate_text(text: str, max_chars: int = DEFAULT_MAX_CHARS) -> str:
     """
     Simple truncation strategy based on character count.
     """
@@ -71,34 +257,76 @@ def truncate_text(text: str, max_chars: int = 40000) -> str:
         return text[:max_chars] + "\n\n...[Content truncated due to length limitations]..."
     return text
 
-def create_session_folder(base_dir: str = "review_outputs") -> tuple:
+def new_session_id() -> str:
+    """Timestamp plus a random suffix, so runs started in the same second never share a folder."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(3)}"
+
+def create_session_folder(base_dir: str = "review_outputs", session_id: str = None) -> tuple:
     """
     Creates a new session folder and an origin_files subfolder.
+    `session_id` defaults to new_session_id(); batch runs and job workers pass their own.
     Returns (session_id, session_dir, origin_dir)
     """
-    session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    session_dir = os.path.join(os.getcwd(), base_dir, session_id)
+    if session_id:
+        session_dir = os.path.join(os.getcwd(), base_dir, session_id)
+        os.makedirs(session_dir, exist_ok=True)
+    else:
+        # exist_ok=False makes the claim atomic; retry on the (unlikely) suffix clash
+        while True:
+            session_id = new_session_id()
+            session_dir = os.path.join(os.getcwd(), base_dir, session_id)
+            try:
+                os.makedirs(session_dir)
+                break
+            except FileExistsError:
+                continue
     origin_dir = os.path.join(session_dir, "origin_files")
-    
-    os.makedirs(session_dir, exist_ok=True)
     os.makedirs(origin_dir, exist_ok=True)
     
     return session_id, session_dir, origin_dir
 
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file, read in 1 MiB blocks. Used as the paper key in the session index."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Uploads are written to disk in blocks of this size
+COPY_CHUNK_BYTES = 1 << 20
+
+def iter_file_chunks(file_obj, chunk_size: int = COPY_CHUNK_BYTES):
+    """
+    Yields a file object's content from the start in chunks. In-memory uploads
+    (BytesIO, e.g. Streamlit's UploadedFile) are sliced as memoryviews, without copying.
+    """
+    if hasattr(file_obj, "getbuffer"):
+        with file_obj.getbuffer() as view:
+            for start in range(0, len(view), chunk_size):
+                yield view[start:start + chunk_size]
+        return
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(chunk_size), b""):
+        yield block
+
+def write_file_chunks(file_obj, filepath: str):
+    """Streams a file object to `filepath` in COPY_CHUNK_BYTES chunks and rewinds it."""
+    with open(filepath, "wb") as f:
+        for chunk in iter_file_chunks(file_obj):
+            f.write(chunk)
+    file_obj.seek(0)
+
 def save_origin_file(uploaded_file, origin_dir: str) -> str:
     """
-    Saves an uploaded file to the origin_dir.
+    Saves an uploaded file to the origin_dir, streamed in chunks. Parse the saved copy with parse_file.
     """
     if uploaded_file is None:
         return None
     
-    filepath = os.path.join(origin_dir, uploaded_file.name)
-    # Reset pointer before reading bytes to save
-    uploaded_file.seek(0)
-    with open(filepath, "wb") as f:
-        f.write(uploaded_file.read())
-    # Reset pointer again for downstream parsers just in case
-    uploaded_file.seek(0)
+    # Plain file objects (headless runs) carry a full path as their name
+    filepath = os.path.join(origin_dir, os.path.basename(uploaded_file.name))
+    write_file_chunks(uploaded_file, filepath)
     return filepath
 
 def generate_output_filename(mode_name: str, paper_name: str, agent_role: str, round_num: int) -> str:
@@ -115,6 +343,7 @@ def save_review(session_dir: str, filename: str, content: str) -> str:
     filepath = os.path.join(session_dir, filename)
     with open(filepath, "w", encoding="utf-8") as f:
         f.write(content)
+    index_review(session_dir, filename, content)
     return filepath
 
 def format_file_link(filepath: str) -> str:
@@ -149,5 +378,68 @@ def save_metadata(session_dir: str, metadata: dict) -> str:
     json_filepath = os.path.join(session_dir, "metadata.json")
     with open(json_filepath, "w", encoding="utf-8") as f:
         json.dump(metadata, f, indent=4, ensure_ascii=False)
-        
+
+    index_session(session_dir, metadata)
     return filepath
+
+CHECKPOINT_FILENAME = "checkpoint.json"
+# Small summary written next to every checkpoint, so listing sessions never loads the full state
+CHECKPOINT_STATUS_FILENAME = "checkpoint_status.json"
+CHECKPOINT_STATUS_KEYS = ("mode", "status", "next_round", "next_agent", "paper_title", "max_iters")
+
+def _atomic_json_dump(filepath: str, data: dict):
+    """Written via a temp file + rename so a crash mid-write never leaves a corrupt file."""
+    tmp_filepath = filepath + ".tmp"
+    with open(tmp_filepath, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_filepath, filepath)
+
+def save_checkpoint(session_dir: str, checkpoint: dict) -> str:
+    """
+    Saves the resumable state of a session to checkpoint.json, and its status summary
+    to checkpoint_status.json.
+    """
+    filepath = os.path.join(session_dir, CHECKPOINT_FILENAME)
+    _atomic_json_dump(filepath, checkpoint)
+    save_checkpoint_status(session_dir, checkpoint)
+    return filepath
+
+def save_checkpoint_status(session_dir: str, checkpoint: dict):
+    _atomic_json_dump(
+        os.path.join(session_dir, CHECKPOINT_STATUS_FILENAME),
+        {k: checkpoint[k] for k in CHECKPOINT_STATUS_KEYS if k in checkpoint}
+    )
+
+def close_checkpoint(session_dir: str, checkpoint: dict):
+    """
+    A session reached a terminal status: only the status summary is kept and the full
+    checkpoint (paper text, prompts, metadata) is deleted, as it can no longer be resumed.
+    """
+    save_checkpoint_status(session_dir, checkpoint)
+    try:
+        os.remove(os.path.join(session_dir, CHECKPOINT_FILENAME))
+    except FileNotFoundError:
+        pass
+
+def load_checkpoint(session_dir: str) -> dict:
+    """Loads checkpoint.json from a session folder, or returns None if there is none."""
+    filepath = os.path.join(session_dir, CHECKPOINT_FILENAME)
+    if not os.path.isfile(filepath):
+        return None
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_checkpoint_status(session_dir: str) -> dict:
+    """
+    The checkpoint's status summary, or None if the session has no checkpoint. Sessions
+    checkpointed before summaries existed get theirs written on first read.
+    """
+    filepath = os.path.join(session_dir, CHECKPOINT_STATUS_FILENAME)
+    if os.path.isfile(filepath):
+        with open(filepath, "r", encoding="utf-8") as f:
+            return json.load(f)
+    checkpoint = load_checkpoint(session_dir)
+    if checkpoint is None:
+        return None
+    save_checkpoint_status(session_dir, checkpoint)
+    return {k: checkpoint[k] for k in CHECKPOINT_STATUS_KEYS if k in checkpoint}